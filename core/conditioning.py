@@ -0,0 +1,41 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import torch
+
+class Conditioning:
+    """Условие генерации, постоянное на весь ответ.
+    
+    Ворота настроения sigmoid(modulation(context_vector)) не зависят
+    от токена, поэтому считаются один раз на запрос для всех слоёв
+    и переиспользуются на прогоне контекста и на каждом шаге генерации.
+    gates — [n_layers, B, n_state] (B = 1 — общий контекст для всего пакета)
+    или None без контекста. self_gates — [n_layers, 1, 1], маски
+    интерференции с самостью для текущих весов: с ними ячейка не ветвится
+    по субъектности и не синхронизируется с устройством на каждом шаге.
+    """
+    
+    def __init__(self, gates, self_gates):
+        self.gates = gates
+        self.self_gates = self_gates
+        
+    @classmethod
+    def build(cls, cells, context_vector=None):
+        gates = None
+        if context_vector is not None:
+            gates = torch.stack([cell.context_gate(context_vector) for cell in cells])
+        self_gates = torch.stack([cell.self_gate() for cell in cells]).view(-1, 1, 1)
+        return cls(gates, self_gates)
+        
+    def select(self, rows):
+        """Условие для оставшихся строк пакета"""
+        if self.gates is not None and self.gates.size(1) > 1:
+            return Conditioning(self.gates[:, rows], self.self_gates)
+        return self
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import warnings
+from typing import Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+class FusedDecodeStep(nn.Module):
+    """Один шаг инференса: эмбеддинг → стек ячеек → выходной слой.
+
+    Состояния передаются явно тензором [n_layers, B, n_state], ворота
+    и маски — тензорами Conditioning, ветвлений по данным нет, поэтому
+    шаг целиком компилируется через torch.jit.script и вызывается из Python
+    одним вызовом вместо десятков мелких операций.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        # Ссылки на модули модели: веса общие, копий нет
+        self.embedding = model.embedding
+        self.cells = model.cells
+        self.output = model.output
+
+    def forward(self, token: torch.Tensor, states: torch.Tensor, self_gates: torch.Tensor,
+                gates: Optional[torch.Tensor] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        layer_input, new_states = self._run_cells(token, states, self_gates, gates)
+        return self.output(layer_input), new_states
+
+    @torch.jit.export
+    def advance(self, token: torch.Tensor, states: torch.Tensor, self_gates: torch.Tensor,
+                gates: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """Шаг без выходного слоя (прогон начального контекста)"""
+        _, new_states = self._run_cells(token, states, self_gates, gates)
+        return new_states
+
+    def _run_cells(self, token: torch.Tensor, states: torch.Tensor, self_gates: torch.Tensor,
+                   gates: Optional[torch.Tensor]) -> Tuple[torch.Tensor, torch.Tensor]:
+        layer_input = self.embedding(token)
+        new_states = []
+        for i, cell in enumerate(self.cells):
+            gate: Optional[torch.Tensor] = None
+            if gates is not None:
+                gate = gates[i]
+            layer_input, state = cell(layer_input, states[i], None, gate, self_gates[i])
+            new_states.append(state)
+        return layer_input, torch.stack(new_states)
+
+def compile_decode_step(model):
+    """Компилирует шаг декодирования. Возвращает None, если компиляция недоступна"""
+    try:
+        with warnings.catch_warnings():
+            # В новых версиях torch.jit.script помечен устаревшим, но работает
+            warnings.simplefilter("ignore", FutureWarning)
+            return torch.jit.script(FusedDecodeStep(model))
+    except Exception as e:
+        print(f"[FUSED] Компиляция недоступна, остаёмся в eager-режиме: {e}")
+        return None
\ No newline at end of file
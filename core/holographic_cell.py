@@ -10,6 +10,7 @@ Note: This is an archived version. ARK ORIGIN continues the research.
 
 import torch
 import torch.nn as nn
+from typing import Optional
 
 class HolographicCell(nn.Module):
     def __init__(self, n_state):
@@ -30,10 +31,20 @@ class HolographicCell(nn.Module):
         # Вектор самости (зачаток "Я")
         self.self_vector = nn.Parameter(torch.randn(1, n_state) * 0.1)
 
-    def forward(self, x, state, context_vector=None):
-        # Контекстная модуляция
-        if context_vector is not None:
-            mood_gate = torch.sigmoid(self.modulation(context_vector))
+    def context_gate(self, context_vector):
+        """Ворота настроения: постоянны, пока не меняется контекст"""
+        return torch.sigmoid(self.modulation(context_vector))
+
+    def self_gate(self):
+        """Маска интерференции с самостью (1.0 при субъектности > 0.3) — на устройстве, без синхронизации"""
+        return (self.subjectivity > 0.3).to(self.subjectivity.dtype)
+
+    def forward(self, x, state, context_vector: Optional[torch.Tensor] = None,
+                mood_gate: Optional[torch.Tensor] = None, self_gate: Optional[torch.Tensor] = None):
+        # Контекстная модуляция (mood_gate — заранее посчитанные ворота, см. Conditioning)
+        if mood_gate is None and context_vector is not None:
+            mood_gate = self.context_gate(context_vector)
+        if mood_gate is not None:
             x = x * mood_gate
             
         combined = x + state
@@ -48,9 +59,47 @@ class HolographicCell(nn.Module):
         new_state = new_state * (1.0 + subject_boost)
         
         # Интерференция с самостью (если субъектность высока)
-        if self.subjectivity > 0.3:
+        if self_gate is not None:
+            # Без ветвления (инференс): маска 0/1 даёт тот же результат без синхронизации
+            self_interference = torch.sigmoid(torch.matmul(new_state, self.self_vector.T))
+            new_state = new_state + self_interference * self.subjectivity * self_gate
+        elif self.subjectivity > 0.3:
+            # Ветвление остаётся для обучения: при низкой субъектности self_vector без градиента
             self_interference = torch.sigmoid(torch.matmul(new_state, self.self_vector.T))
             new_state = new_state + self_interference * self.subjectivity
             
         out = self.sense(new_state)
-        return out, new_state
\ No newline at end of file
+        return out, new_state
+        
+    def forward_sequence(self, x_seq, state, context_vector: Optional[torch.Tensor] = None):
+        """Та же ячейка на всей последовательности [B, T, n_state] (обучение).
+        
+        Всё, что не зависит от состояния, считается одним GEMM на все шаги:
+        модуляция контекстом, x @ rotation и выходной sense. В цикле по времени
+        остаётся только рекуррентная часть: state @ [rotation | intuition]
+        одним умножением. Результат совпадает с forward до округления.
+        """
+        if context_vector is not None:
+            x_seq = x_seq * self.context_gate(context_vector).unsqueeze(1)
+            
+        # unbind, а не срезы [:, t]: обратный проход по срезу создаёт полный тензор на каждом шаге
+        input_flows = torch.matmul(x_seq, self.rotation).unbind(1)
+        recurrent = torch.cat([self.rotation, self.intuition], dim=1)
+        n_state = self.rotation.shape[0]
+        
+        subject_boost = 1.0 + torch.sigmoid(self.subjectivity)
+        use_self = bool(self.subjectivity > 0.3)
+        
+        states = []
+        for input_flow in input_flows:
+            state_rotation, state_intuition = torch.matmul(state, recurrent).split(n_state, dim=1)
+            logic_flow = input_flow + state_rotation
+            subtext_wave = torch.cos(logic_flow) * torch.sin(state_intuition)
+            state = torch.tanh(logic_flow + subtext_wave) * subject_boost
+            if use_self:
+                self_interference = torch.sigmoid(torch.matmul(state, self.self_vector.T))
+                state = state + self_interference * self.subjectivity
+            states.append(state)
+            
+        states_seq = torch.stack(states, dim=1)
+        return self.sense(states_seq), state
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+from typing import Optional
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.ao.quantization import per_channel_dynamic_qconfig, quantize_dynamic
+
+def _as_linear(matrix):
+    """x @ matrix == linear(x, matrix.T): матрицу ячейки можно квантовать как Linear"""
+    linear = nn.Linear(matrix.shape[0], matrix.shape[1], bias=False)
+    with torch.no_grad():
+        linear.weight.copy_(matrix.detach().T)
+    return linear
+
+def _quantize(linear):
+    # Веса int8 по каналам, активации квантуются динамически на каждом вызове
+    return quantize_dynamic(
+        nn.Sequential(linear), {nn.Linear: per_channel_dynamic_qconfig}, dtype=torch.qint8
+    )[0]
+
+class QuantizedHolographicCell(nn.Module):
+    """int8-копия HolographicCell для инференса на CPU.
+
+    rotation/intuition и Linear-слои хранятся в int8, субъектность
+    и вектор самости остаются fp32 (это скаляр и один вектор).
+    """
+
+    def __init__(self, cell):
+        super().__init__()
+        self.rotation = _quantize(_as_linear(cell.rotation))
+        self.intuition = _quantize(_as_linear(cell.intuition))
+        self.modulation = _quantize(cell.modulation)
+        self.sense = _quantize(cell.sense)
+        self.register_buffer('subjectivity', cell.subjectivity.detach().clone())
+        self.register_buffer('self_vector', cell.self_vector.detach().clone())
+
+    def context_gate(self, context_vector):
+        return torch.sigmoid(self.modulation(context_vector))
+
+    def self_gate(self):
+        return (self.subjectivity > 0.3).to(self.subjectivity.dtype)
+
+    def forward(self, x, state, context_vector: Optional[torch.Tensor] = None,
+                mood_gate: Optional[torch.Tensor] = None, self_gate: Optional[torch.Tensor] = None):
+        # Та же формула, что в HolographicCell.forward
+        if mood_gate is None and context_vector is not None:
+            mood_gate = self.context_gate(context_vector)
+        if mood_gate is not None:
+            x = x * mood_gate
+
+        combined = x + state
+        logic_flow = self.rotation(combined)
+
+        subtext_wave = torch.cos(logic_flow) * torch.sin(self.intuition(state))
+        new_state = torch.tanh(logic_flow + subtext_wave)
+
+        subject_boost = torch.sigmoid(self.subjectivity)
+        new_state = new_state * (1.0 + subject_boost)
+
+        if self_gate is not None:
+            self_interference = torch.sigmoid(torch.matmul(new_state, self.self_vector.T))
+            new_state = new_state + self_interference * self.subjectivity * self_gate
+        elif self.subjectivity > 0.3:
+            self_interference = torch.sigmoid(torch.matmul(new_state, self.self_vector.T))
+            new_state = new_state + self_interference * self.subjectivity
+
+        out = self.sense(new_state)
+        return out, new_state
+
+def quantize_son_model(model):
+    """int8-копия SonModel для инференса (generate/step); исходная модель не меняется"""
+    from .son_model import SonModel
+
+    quantized = SonModel(model.output.out_features, model.n_state, len(model.cells))
+    quantized.load_state_dict(model.state_dict())
+    quantized.cells = nn.ModuleList([QuantizedHolographicCell(cell) for cell in model.cells])
+    quantized.output = _quantize(quantized.output)
+    # Шаг декодирования должен ссылаться на новые модули
+    quantized.disable_fused_step()
+    return quantized.eval()
+
+def loglik_per_char(model, ids, block_size=256):
+    """Средний log-likelihood следующего символа на тексте (teacher forcing через step)"""
+    ids = torch.as_tensor(ids, dtype=torch.long)
+    n_blocks = (len(ids) - 1) // block_size
+    if n_blocks == 0:
+        block_size, n_blocks = len(ids) - 1, 1
+    inputs = ids[:n_blocks * block_size].view(n_blocks, block_size)
+    targets = ids[1:n_blocks * block_size + 1].view(n_blocks, block_size)
+
+    model.eval()
+    with torch.no_grad():
+        states = model.init_states(n_blocks)
+        log_probs = []
+        for t in range(block_size):
+            logits, states = model.step(inputs[:, t], states)
+            log_probs.append(F.log_softmax(logits, dim=-1).gather(1, targets[:, t:t + 1]))
+    return torch.cat(log_probs, dim=1)
+
+def measure_quantization_drift(model_fp32, model_int8, ids, block_size=256):
+    """Дрейф log-likelihood на символ у int8 относительно fp32 на отложенном тексте"""
+    reference = loglik_per_char(model_fp32, ids, block_size)
+    quantized = loglik_per_char(model_int8, ids, block_size)
+    return {
+        'chars': reference.numel(),
+        'loglik_fp32': reference.mean().item(),
+        'loglik_int8': quantized.mean().item(),
+        'drift': (quantized.mean() - reference.mean()).item(),
+        'max_abs_drift': (quantized - reference).abs().max().item()
+    }
\ No newline at end of file
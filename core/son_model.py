@@ -12,6 +12,8 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from .holographic_cell import HolographicCell
+from .fused_step import FusedDecodeStep, compile_decode_step
+from .conditioning import Conditioning
 
 class SonModel(nn.Module):
     def __init__(self, vocab_size, n_state, n_layers=3):
@@ -30,17 +32,63 @@ class SonModel(nn.Module):
         # Выходной слой
         self.output = nn.Linear(n_state, vocab_size)
         
+        # Шаг декодирования для инференса (eager, пока не включён fused-режим)
+        self._set_decoder(FusedDecodeStep(self))
+        
+    def _set_decoder(self, decoder):
+        # Не регистрируем как подмодуль: иначе веса задвоятся в state_dict
+        object.__setattr__(self, 'decoder', decoder)
+        
+    def enable_fused_step(self):
+        """Включает скомпилированный шаг декодирования (только инференс)"""
+        compiled = compile_decode_step(self)
+        if compiled is None:
+            return False
+        self._set_decoder(compiled)
+        return True
+        
+    def disable_fused_step(self):
+        """Возвращает eager-путь декодирования"""
+        self._set_decoder(FusedDecodeStep(self))
+        
+    @property
+    def fused(self):
+        return isinstance(self.decoder, torch.jit.ScriptModule)
+        
+    def init_states(self, batch_size, device=None):
+        """Нулевые состояния ячеек: [n_layers, B, n_state]"""
+        return torch.zeros(len(self.cells), batch_size, self.n_state, device=device)
+        
+    def condition(self, context_vector=None):
+        """Ворота настроения и маски самости всех слоёв на весь запрос"""
+        return Conditioning.build(self.cells, context_vector)
+        
+    def step(self, token, states, conditioning=None):
+        """Один шаг инференса: токен [B] → логиты [B, vocab] и новые состояния"""
+        if conditioning is None:
+            conditioning = self.condition()
+        return self.decoder(token, states, conditioning.self_gates, conditioning.gates)
+        
+    def advance(self, token, states, conditioning=None):
+        """Шаг без выходного слоя — только обновление состояний"""
+        if conditioning is None:
+            conditioning = self.condition()
+        return self.decoder.advance(token, states, conditioning.self_gates, conditioning.gates)
+        
     def forward(self, idx, targets=None, context_vector=None):
         B, T = idx.shape
         x = self.embedding(idx)
-        states = [torch.zeros(B, self.n_state, device=idx.device) 
+        states = [torch.zeros(B, self.n_state, device=idx.device, dtype=x.dtype) 
                  for _ in range(len(self.cells))]
+        gates = self.condition(context_vector).gates
+        if gates is None:
+            gates = [None] * len(self.cells)
         
         logits_list = []
         for t in range(T):
             layer_input = x[:, t, :]
             for i, cell in enumerate(self.cells):
-                layer_input, states[i] = cell(layer_input, states[i], context_vector)
+                layer_input, states[i] = cell(layer_input, states[i], mood_gate=gates[i])
             logits_step = self.output(layer_input)
             logits_list.append(logits_step)
             
@@ -52,36 +100,165 @@ class SonModel(nn.Module):
             return logits, loss
         return logits, None
         
-    def generate(self, idx, max_tokens=150, temperature=0.7, context_vector=None):
+    def forward_layerwise(self, idx, targets=None, context_vector=None):
+        """Тот же forward, но слой за слоем по всей последовательности.
+        
+        Для обучения (genesis): входные проекции каждого слоя и выходной слой
+        считаются пакетно на все шаги, в цикле по времени остаётся только
+        рекуррентная часть. Потеря и градиенты совпадают с forward до округления.
+        """
+        B, T = idx.shape
+        layer_input = self.embedding(idx)
+        for cell in self.cells:
+            state = torch.zeros(B, self.n_state, device=idx.device, dtype=layer_input.dtype)
+            layer_input, _ = cell.forward_sequence(layer_input, state, context_vector)
+        logits = self.output(layer_input)
+        
+        if targets is not None:
+            B, T, C = logits.shape
+            loss = F.cross_entropy(logits.view(B*T, C), targets.view(B*T))
+            return logits, loss
+        return logits, None
+        
+    def generate(self, idx, max_tokens=150, temperature=0.7, context_vector=None,
+                 states=None, return_states=False):
+        # states — состояния, с которых продолжить (например, прошлая реплика сессии)
+        generated = []
+        for next_token, states in self.generate_stream(
+            idx, max_tokens, temperature, context_vector, states
+        ):
+            generated.append(next_token)
+            
+            # УДАЛЕНО: if next_token.item() == 0 and len(generated) > 30: break
+            # Теперь генерация остановится только по достижению max_tokens
+            # или если вручную добавишь условие остановки по символу конца предложения
+            
+        if return_states:
+            return torch.cat(generated, dim=1), states
+        return torch.cat(generated, dim=1)
+        
+    @torch.no_grad()
+    def generate_stream(self, idx, max_tokens=150, temperature=0.7, context_vector=None,
+                        states=None):
+        """Потоковая генерация: отдаёт (токен [B, 1], состояния) сразу после сэмплирования.
+        
+        Последовательность токенов та же, что у generate; прерванный
+        потребителем поток просто перестаёт сэмплировать.
+        temperature=0 — жадный выбор (argmax) вместо сэмплирования.
+        """
+        self.eval()
+        B, T = idx.shape
+        if states is None:
+            states = self.init_states(B, idx.device)
+        conditioning = self.condition(context_vector)
+        
+        # Прогон начального контекста
+        for t in range(T):
+            states = self.advance(idx[:, t], states, conditioning)
+        
+        # Генерация новых токенов
+        curr_idx = idx[:, -1:]
+        for _ in range(max_tokens):
+            logits, states = self.step(curr_idx[:, 0], states, conditioning)
+            if temperature == 0:
+                next_token = logits.argmax(dim=-1, keepdim=True)
+            else:
+                probs = F.softmax(logits / temperature, dim=-1)
+                next_token = torch.multinomial(probs, num_samples=1)
+            yield next_token, states
+            curr_idx = next_token
+            
+    def generate_batch(self, prompts, max_tokens=150, temperature=0.7, context_vector=None,
+                       stop_ids=None, pad_id=0, states=None, return_states=False):
+        """Пакетная генерация для промптов разной длины.
+        
+        prompts — список списков id. Промпты выравниваются по правому краю,
+        на шагах паддинга состояние строки не меняется. Каждая строка
+        сэмплируется независимо (temperature — число или список по строкам,
+        0 — жадный выбор, как в generate_stream) и останавливается сама по себе, как только выдаст токен из stop_ids;
+        остальные строки продолжают генерацию. Возвращает списки id по строкам
+        (стоп-токен включается в ответ), а с return_states — ещё и итоговые
+        состояния строк [n_layers, B, n_state]. states задаёт начальные состояния.
+        Пустой список промптов — пустой результат; пустой промпт — ValueError
+        (генерации не с чего начаться).
+        """
         self.eval()
+        device = self.embedding.weight.device
+        B = len(prompts)
+        if not B:
+            return ([], self.init_states(0, device)) if return_states else []
+        empty = [row for row, prompt in enumerate(prompts) if not len(prompt)]
+        if empty:
+            raise ValueError(f"Пустые промпты в строках {empty}: нужен хотя бы один токен")
+        T = max(len(p) for p in prompts)
+        
+        idx = torch.full((B, T), pad_id, dtype=torch.long, device=device)
+        mask = torch.zeros(B, T, dtype=torch.bool, device=device)
+        for row, prompt in enumerate(prompts):
+            idx[row, T - len(prompt):] = torch.tensor(prompt, dtype=torch.long, device=device)
+            mask[row, T - len(prompt):] = True
+            
+        if isinstance(temperature, (list, tuple)):
+            temperature = torch.tensor(temperature, device=device).unsqueeze(1)
+        stop_ids = set(stop_ids or [])
+        
         with torch.no_grad():
-            B, T = idx.shape
-            states = [torch.zeros(B, self.n_state, device=idx.device) 
-                     for _ in range(len(self.cells))]
+            if states is None:
+                states = self.init_states(B, device)
+            conditioning = self.condition(context_vector)
             
-            # Прогон начального контекста
+            # Прогон начального контекста: паддинг не трогает состояние строки
             for t in range(T):
-                layer_input = self.embedding(idx[:, t])
-                for i, cell in enumerate(self.cells):
-                    layer_input, states[i] = cell(layer_input, states[i], context_vector)
-            
-            # Генерация новых токенов
-            curr_idx = idx[:, -1:]
-            generated = []
+                new_states = self.advance(idx[:, t], states, conditioning)
+                states = torch.where(mask[:, t].view(1, B, 1), new_states, states)
+                
+            # Генерация: после выравнивания последний столбец — последний токен каждой строки
+            curr_idx = idx[:, -1]
+            active = list(range(B))
+            generated = [[] for _ in range(B)]
+            final_states = [None] * B
             
             for _ in range(max_tokens):
-                layer_input = self.embedding(curr_idx[:, 0])
-                for i, cell in enumerate(self.cells):
-                    layer_input, states[i] = cell(layer_input, states[i], context_vector)
+                logits, states = self.step(curr_idx, states, conditioning)
+                next_token = self._sample_rows(logits, temperature)
                 
-                logits = self.output(layer_input)
-                probs = F.softmax(logits / temperature, dim=-1)
-                next_token = torch.multinomial(probs, num_samples=1)
-                generated.append(next_token)
+                keep = []
+                for pos, token in enumerate(next_token.tolist()):
+                    generated[active[pos]].append(token)
+                    if token not in stop_ids:
+                        keep.append(pos)
+                    else:
+                        final_states[active[pos]] = states[:, pos]
+                if not keep:
+                    active = []
+                    break
+                    
+                # Завершённые строки выбывают из пакета
+                if len(keep) < len(active):
+                    rows = torch.tensor(keep, device=device)
+                    states = states[:, rows]
+                    next_token = next_token[rows]
+                    conditioning = conditioning.select(rows)
+                    if isinstance(temperature, torch.Tensor):
+                        temperature = temperature[rows]
+                    active = [active[pos] for pos in keep]
                 curr_idx = next_token
                 
-                # УДАЛЕНО: if next_token.item() == 0 and len(generated) > 30: break
-                # Теперь генерация остановится только по достижению max_tokens
-                # или если вручную добавишь условие остановки по символу конца предложения
-                    
-            return torch.cat(generated, dim=1)
\ No newline at end of file
+            if return_states:
+                for pos, row in enumerate(active):
+                    final_states[row] = states[:, pos]
+                return generated, torch.stack(final_states, dim=1)
+            return generated
+            
+    @staticmethod
+    def _sample_rows(logits, temperature):
+        """Токен на строку [B]: argmax там, где температура 0, иначе сэмплирование"""
+        if not isinstance(temperature, torch.Tensor):
+            if temperature == 0:
+                return logits.argmax(dim=-1)
+            probs = F.softmax(logits / temperature, dim=-1)
+            return torch.multinomial(probs, num_samples=1).squeeze(1)
+        greedy = temperature == 0
+        probs = F.softmax(logits / temperature.masked_fill(greedy, 1.0), dim=-1)
+        sampled = torch.multinomial(probs, num_samples=1).squeeze(1)
+        return torch.where(greedy.squeeze(1), logits.argmax(dim=-1), sampled)
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import json
+import os
+import warnings
+
+import numpy as np
+import torch
+
+from core.fused_step import FusedDecodeStep
+from .numpy_backend import NumpySonModel
+
+# Экспортированный шаг декодирования: граф + метаданные рядом (<путь>.json)
+DECODER_PATHS = {
+    'torchscript': 'data/son_decoder.pt',
+    'onnx': 'data/son_decoder.onnx',
+    'numpy': 'data/son_weights.npz'
+}
+
+def _metadata_path(path):
+    return path + '.json'
+
+def _write_metadata(model, path, backend, weights_version):
+    metadata = {
+        'backend': backend,
+        'weights_version': weights_version,
+        'vocab_size': model.output.out_features,
+        'n_state': model.n_state,
+        'n_layers': len(model.cells)
+    }
+    with open(_metadata_path(path), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    return metadata
+
+def export_torchscript(model, path, weights_version):
+    """Сохраняет шаг декодирования (forward и advance) как TorchScript"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with warnings.catch_warnings():
+        # В новых версиях torch.jit помечен устаревшим, но работает
+        warnings.simplefilter("ignore", FutureWarning)
+        scripted = torch.jit.script(FusedDecodeStep(model.eval()))
+        torch.jit.save(scripted, path)
+    return _write_metadata(model, path, 'torchscript', weights_version)
+
+def export_onnx(model, path, weights_version):
+    """Сохраняет шаг декодирования как ONNX-граф (нужен пакет onnx).
+
+    Входы: token [B], states [n_layers, B, n_state], self_gates [n_layers, 1, 1],
+    gates [n_layers, B или 1, n_state] (без контекста — единицы).
+    Выходы: logits [B, vocab], new_states [n_layers, B, n_state].
+    """
+    model = model.eval()
+    n_layers = len(model.cells)
+    conditioning = model.condition()
+    example = (
+        torch.zeros(1, dtype=torch.long),
+        model.init_states(1),
+        conditioning.self_gates,
+        torch.ones(n_layers, 1, model.n_state)
+    )
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        torch.onnx.export(
+            FusedDecodeStep(model), example, path,
+            input_names=['token', 'states', 'self_gates', 'gates'],
+            output_names=['logits', 'new_states'],
+            dynamic_axes={
+                'token': {0: 'batch'},
+                'states': {1: 'batch'},
+                'gates': {1: 'gate_batch'},
+                'logits': {0: 'batch'},
+                'new_states': {1: 'batch'}
+            },
+            dynamo=False
+        )
+    return _write_metadata(model, path, 'onnx', weights_version)
+
+def export_numpy(model, path, weights_version):
+    """Конвертирует веса в .npz для NumpySonModel (инференс без torch)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    arrays = {key: value.detach().cpu().numpy() for key, value in model.state_dict().items()}
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+    return _write_metadata(model, path, 'numpy', weights_version)
+
+class OnnxDecodeStep:
+    """Шаг декодирования через onnxruntime с интерфейсом FusedDecodeStep"""
+
+    def __init__(self, path, n_layers, n_state):
+        import onnxruntime
+        self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        # Без контекста ворота — единицы: x * 1.0 не меняет вход
+        self.no_gates = torch.ones(n_layers, 1, n_state)
+
+    def __call__(self, token, states, self_gates, gates=None):
+        if gates is None:
+            gates = self.no_gates
+        logits, new_states = self.session.run(None, {
+            'token': token.cpu().numpy(),
+            'states': states.cpu().numpy(),
+            'self_gates': self_gates.cpu().numpy(),
+            'gates': gates.cpu().numpy()
+        })
+        return (torch.from_numpy(logits).to(states.device),
+                torch.from_numpy(new_states).to(states.device))
+
+    def advance(self, token, states, self_gates, gates=None):
+        return self(token, states, self_gates, gates)[1]
+
+class NumpyDecodeStep:
+    """NumpySonModel с интерфейсом FusedDecodeStep (для SonEngine)"""
+
+    def __init__(self, path):
+        self.model = NumpySonModel.load(path)
+
+    def __call__(self, token, states, self_gates, gates=None):
+        # self_gates не нужны: NumPy-модель ветвится по субъектности на хосте
+        logits, new_states = self.model.step(
+            token.cpu().numpy(), states.cpu().numpy(), None if gates is None else gates.cpu().numpy()
+        )
+        return (torch.from_numpy(logits).to(states.device),
+                torch.from_numpy(new_states).to(states.device))
+
+    def advance(self, token, states, self_gates, gates=None):
+        new_states = self.model.advance(
+            token.cpu().numpy(), states.cpu().numpy(), None if gates is None else gates.cpu().numpy()
+        )
+        return torch.from_numpy(new_states).to(states.device)
+
+def load_decoder_backend(backend, model, weights_version, device='cpu', path=None):
+    """Загружает экспортированный шаг для текущих весов или возвращает None.
+
+    Граф хранит копию весов на момент экспорта, поэтому он годится только
+    для той же weights_version; после эволюции движок возвращается к torch.
+    """
+    path = path or DECODER_PATHS.get(backend)
+    if path is None:
+        print(f"[BACKEND] Неизвестный бэкенд {backend} — генерация через torch")
+        return None
+    try:
+        with open(_metadata_path(path), 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        print(f"[BACKEND] Нет экспорта {path} — запустите scripts/export_decoder.py {backend}")
+        return None
+
+    shape = (model.output.out_features, model.n_state, len(model.cells))
+    if (metadata.get('vocab_size'), metadata.get('n_state'), metadata.get('n_layers')) != shape:
+        print(f"[BACKEND] Экспорт {path} от другой архитектуры — генерация через torch")
+        return None
+    if metadata.get('weights_version') != weights_version:
+        print(f"[BACKEND] Экспорт {path} устарел (веса изменились) — генерация через torch")
+        return None
+
+    try:
+        if backend == 'torchscript':
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", FutureWarning)
+                return torch.jit.load(path, map_location=device)
+        if backend == 'numpy':
+            return NumpyDecodeStep(path)
+        return OnnxDecodeStep(path, len(model.cells), model.n_state)
+    except Exception as e:
+        print(f"[BACKEND] Не удалось загрузить {path}: {e} — генерация через torch")
+        return None
\ No newline at end of file
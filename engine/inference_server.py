@@ -0,0 +1,375 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import Counter, deque
+
+# Модуль не импортирует torch: клиенту (shell, мост) движок в процессе не нужен.
+# Протокол — одна строка JSON на запрос и одна на ответ, только loopback.
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+def load_server_config(path='config/system_config.json'):
+    """Раздел server из system_config.json"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('server', {})
+    except (OSError, ValueError):
+        return {}
+
+class _Job:
+    """Запрос в очереди потока-владельца движка.
+
+    queued -> running (взят рабочим потоком) или queued -> cancelled
+    (клиент не дождался): отменённый запрос движок не выполняет, а взятый
+    в работу уже не отменить — его ответ и сохранение состоятся.
+    """
+
+    def __init__(self, op, payload):
+        self.op = op
+        self.payload = payload
+        self.session_key = payload.get('session_id') or payload.get('speaker', 'Отец')
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.reply = None
+        self.state = 'queued'
+        self._lock = threading.Lock()
+
+    def claim(self):
+        """Рабочий поток берёт запрос; False — клиент его уже отменил"""
+        return self._transition('running')
+
+    def cancel(self):
+        """Отмена по таймауту; False — запрос уже выполняется"""
+        return self._transition('cancelled')
+
+    def _transition(self, state):
+        with self._lock:
+            if self.state != 'queued':
+                return False
+            self.state = state
+            return True
+
+    def finish(self, **reply):
+        self.reply = reply
+        self.done.set()
+
+class InferenceServer:
+    """Долгоживущий процесс с одним SonEngine для shell, Telegram и скриптов.
+
+    Движком владеет один рабочий поток, поэтому потоки соединений не
+    соревнуются за модель. Генерации, пришедшие в пределах batch_window_ms,
+    собираются в один generate_responses — общий пакетный шаг декодирования;
+    два сообщения одной сессии в пакет не попадают (второе ждёт следующего).
+    Прочие операции выполняются между пакетами.
+    """
+
+    def __init__(self, engine, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 batch_window_ms=15, max_batch=8, timeout=30):
+        self.engine = engine
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.jobs = queue.Queue()
+        self.operations = {
+            'status': self._status,
+            'report': lambda payload: {'report': self.engine.get_soul_memory_report()},
+            'self_coding': lambda payload: {'suggestions': self.engine.request_self_coding()},
+            'ingest': lambda payload: {'ingested': self.engine.ingest_knowledge(payload['path'])},
+            'reload': lambda payload: {'reloaded': self.engine.load_weights()}
+        }
+
+        # Метрики: глубина очереди и размеры пакетов
+        self._metrics_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        self.max_queue_depth = 0
+        self.wait_time = 0.0
+        self.decode_time = 0.0
+
+        self._server = _TCPServer((host, port), _RequestHandler)
+        self._server.inference = self
+        self.address = self._server.server_address
+        self._worker = threading.Thread(target=self._run_worker, daemon=True)
+        self._serving = None
+
+    def serve_forever(self):
+        self._worker.start()
+        self._server.serve_forever()
+
+    def start(self):
+        """Запуск в фоновых потоках (для скриптов и проверок)"""
+        self._serving = threading.Thread(target=self.serve_forever, daemon=True)
+        self._serving.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.jobs.put(None)
+        if self._worker.is_alive():
+            self._worker.join()
+
+    def submit(self, op, payload):
+        """Выполняет запрос клиента и возвращает ответ (dict с ключом ok)"""
+        if op == 'ping':
+            return {'ok': True}
+        if op == 'metrics':
+            return {'ok': True, 'metrics': self.metrics()}
+        if op == 'generate_batch':
+            jobs = [self._enqueue('generate', {'text': text, 'speaker': speaker, 'session_id': session_id})
+                    for text, speaker, session_id in payload.get('requests', [])]
+            # Результат по каждому запросу: удавшиеся уже сохранены, их нельзя терять из-за соседа
+            return {'ok': True, 'results': [self._wait(job) for job in jobs]}
+        if op != 'generate' and op not in self.operations:
+            return {'ok': False, 'error': f"Неизвестная операция: {op}"}
+        return self._wait(self._enqueue(op, payload))
+
+    def metrics(self):
+        with self._metrics_lock:
+            batches = max(self.batches, 1)
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'queue_depth': self.jobs.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'mean_batch_size': self.requests / batches if self.batches else 0.0,
+                'batch_sizes': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                'mean_wait_ms': self.wait_time / max(self.requests, 1) * 1000,
+                'mean_batch_ms': self.decode_time / batches * 1000
+            }
+
+    def _enqueue(self, op, payload):
+        job = _Job(op, payload)
+        self.jobs.put(job)
+        with self._metrics_lock:
+            self.max_queue_depth = max(self.max_queue_depth, self.jobs.qsize())
+        return job
+
+    def _wait(self, job):
+        if not job.done.wait(self.timeout):
+            if job.cancel():
+                return {'ok': False, 'error': f"Нет ответа за {self.timeout} с"}
+            # Запрос уже в работе: его результат сохранится, поэтому дожидаемся ответа
+            job.done.wait()
+        return job.reply
+
+    def _run_worker(self):
+        deferred = deque()
+        while True:
+            job = deferred.popleft() if deferred else self._next_job()
+            if job is None:
+                return
+            if not job.claim():
+                continue
+            if job.op == 'generate':
+                self._run_batch(self._collect_batch(job, deferred))
+                continue
+            try:
+                job.finish(ok=True, **self.operations[job.op](job.payload))
+            except Exception as e:
+                job.finish(ok=False, error=str(e))
+
+    def _next_job(self):
+        """Следующий запрос; пока очередь пуста — обслуживание движка (контрольная точка)"""
+        try:
+            return self.jobs.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self.engine.maintain()
+        except Exception as e:
+            print(f"[DAEMON] Ошибка обслуживания: {e}")
+        return self.jobs.get()
+
+    def _collect_batch(self, first, deferred):
+        """Добирает генерации, пришедшие в окне batch_window от первой"""
+        batch = [first]
+        sessions = {first.session_key}
+        skipped = []
+        # Окно отсчитывается от постановки в очередь: запросы, ждавшие
+        # прошлый пакет, не ждут ещё раз — забирается только уже пришедшее
+        deadline = first.enqueued + self.batch_window
+        while len(batch) < self.max_batch:
+            if deferred:
+                job = deferred.popleft()
+            else:
+                try:
+                    job = self.jobs.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if job is not None and job.state == 'cancelled':
+                continue
+            if job is not None and job.op == 'generate' and job.session_key not in sessions:
+                if job.claim():
+                    batch.append(job)
+                    sessions.add(job.session_key)
+            else:
+                skipped.append(job)
+        deferred.extendleft(reversed(skipped))
+        return batch
+
+    def _run_batch(self, batch):
+        started = time.monotonic()
+        try:
+            responses = self.engine.generate_responses([
+                (job.payload.get('text', ''), job.payload.get('speaker', 'Отец'),
+                 job.payload.get('session_id'))
+                for job in batch
+            ])
+        except Exception as e:
+            for job in batch:
+                job.finish(ok=False, error=str(e))
+            return
+        elapsed = time.monotonic() - started
+
+        with self._metrics_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.batch_sizes[len(batch)] += 1
+            self.wait_time += sum(started - job.enqueued for job in batch)
+            self.decode_time += elapsed
+        print(f"[DAEMON] Пакет {len(batch)} | очередь {self.jobs.qsize()} | "
+              f"генерация {elapsed * 1000:.0f} мс")
+        for job, response in zip(batch, responses):
+            job.finish(ok=True, response=response)
+
+    def _status(self, payload):
+        status = self.engine.get_status()
+        status.update({
+            'interaction_count': self.engine.interaction_count,
+            'evolution_threshold': self.engine.evolution_threshold,
+            'waiting_state': self.engine.waiting_state,
+            'vocab_size': self.engine.tokenizer.vocab_size
+        })
+        return {'status': status}
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                reply = self.server.inference.submit(request.pop('op', None), request)
+            except (ValueError, AttributeError, TypeError) as e:
+                reply = {'ok': False, 'error': f"Некорректный запрос: {e}"}
+            data = json.dumps(reply, ensure_ascii=False, default=str) + '\n'
+            self.wfile.write(data.encode('utf-8'))
+
+class InferenceClient:
+    """Тонкий клиент демона с той частью интерфейса SonEngine, что нужна shell и мосту.
+
+    Ответ приходит целиком (пакетный шаг общий для всех клиентов),
+    поэтому stream_response отдаёт его одним куском.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    @classmethod
+    def connect(cls, config=None):
+        """Клиент, если демон запущен и отвечает, иначе None"""
+        config = load_server_config() if config is None else config
+        client = cls(config.get('host', DEFAULT_HOST), config.get('port', DEFAULT_PORT))
+        try:
+            client.call('ping', timeout=1.0)
+        except (OSError, ValueError, RuntimeError):
+            return None
+        return client
+
+    def call(self, op, timeout=None, **payload):
+        request = json.dumps(dict(payload, op=op), ensure_ascii=False) + '\n'
+        with socket.create_connection((self.host, self.port), timeout=timeout or self.timeout) as sock:
+            sock.sendall(request.encode('utf-8'))
+            with sock.makefile('rb') as f:
+                line = f.readline()
+        if not line:
+            raise ConnectionError("Демон закрыл соединение без ответа")
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise RuntimeError(reply.get('error', 'ошибка демона'))
+        return reply
+
+    def __str__(self):
+        return f"демон {self.host}:{self.port}"
+
+    def generate_response(self, user_input, speaker="Отец", session_id=None):
+        return self.call('generate', text=user_input, speaker=speaker, session_id=session_id)['response']
+
+    def stream_response(self, user_input, speaker="Отец", session_id=None):
+        yield self.generate_response(user_input, speaker, session_id)
+
+    async def astream_response(self, user_input, speaker="Отец", session_id=None, executor=None):
+        loop = asyncio.get_running_loop()
+        yield await loop.run_in_executor(executor, self.generate_response, user_input, speaker, session_id)
+
+    def generate_responses(self, requests):
+        """Ответы по порядку запросов; на месте неудавшихся (таймаут, ошибка) — None"""
+        requests = [(text, speaker, rest[0] if rest else None) for text, speaker, *rest in requests]
+        results = self.call('generate_batch', requests=requests)['results']
+        return [result['response'] if result['ok'] else None for result in results]
+
+    def get_status(self):
+        return self.call('status')['status']
+
+    def get_soul_memory_report(self):
+        return self.call('report')['report']
+
+    def request_self_coding(self):
+        return self.call('self_coding')['suggestions']
+
+    def ingest_knowledge(self, filepath):
+        self.call('ingest', path=os.path.abspath(filepath))
+
+    def load_weights(self):
+        self.call('reload')
+
+    def metrics(self):
+        return self.call('metrics')['metrics']
+
+    def maintain(self):
+        # Контрольные точки памяти демон делает сам, когда очередь пуста
+        return False
+
+    def shutdown(self):
+        # Сессии и веса сохраняет сам демон при остановке
+        pass
+
+    @property
+    def subjectivity_level(self):
+        return self.get_status()['subjectivity']
+
+    @property
+    def interaction_count(self):
+        return self.get_status()['interaction_count']
+
+    @property
+    def evolution_threshold(self):
+        return self.get_status()['evolution_threshold']
+
+    @property
+    def waiting_state(self):
+        return self.get_status()['waiting_state']
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+LOG_DIR = 'data/logs'
+
+_STAMP_FORMAT = '%Y%m%d-%H%M%S-%f'
+_SEGMENT = re.compile(r'^(?P<name>.+)\.(?P<stamp>\d{8}-\d{6}-\d{6})\.jsonl$')
+
+class LogStore:
+    """Журнал событий: append-only JSONL-сегменты с ротацией.
+
+    Запись — одна строка в конце самого нового сегмента, одним os.write
+    в режиме O_APPEND: файл не перечитывается и не переписывается, записи
+    нескольких процессов не перетирают друг друга, а обрыв на середине
+    портит только последнюю строку (чтение её пропускает).
+    Сегмент <имя>.<время начала>.jsonl закрывается по размеру или возрасту,
+    старые сегменты сверх max_segments удаляются.
+    """
+
+    def __init__(self, name, log_dir=LOG_DIR, max_bytes=1024 * 1024, max_age_days=7, max_segments=32):
+        self.name = name
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.max_age = timedelta(days=max_age_days)
+        self.max_segments = max_segments
+
+    def segments(self):
+        """Пути сегментов от старого к новому"""
+        try:
+            files = os.listdir(self.log_dir)
+        except OSError:
+            return []
+        stamps = sorted(match.group('stamp') for match in map(_SEGMENT.match, files)
+                        if match and match.group('name') == self.name)
+        return [self._segment_path(stamp) for stamp in stamps]
+
+    def append(self, entry):
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        data = ''.join(json.dumps(entry, ensure_ascii=False, default=str) + '\n' for entry in entries)
+        if not data:
+            return
+        data = data.encode('utf-8')
+        os.makedirs(self.log_dir, exist_ok=True)
+        segments = self.segments()
+        path = segments[-1] if segments else None
+        if path is None or self._should_rotate(path, len(data)):
+            path = self._segment_path(datetime.now().strftime(_STAMP_FORMAT))
+            segments.append(path)
+            self._prune(segments)
+
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Оборванная прошлая строка не должна склеиться с новой
+            size = os.fstat(fd).st_size
+            if size:
+                os.lseek(fd, size - 1, os.SEEK_SET)
+                if os.read(fd, 1) != b'\n':
+                    data = b'\n' + data
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def read(self):
+        """Все записи по порядку (битые строки пропускаются)"""
+        for path in self.segments():
+            with open(path, 'rb') as f:
+                for line in f:
+                    entry = _parse(line)
+                    if entry is not None:
+                        yield entry
+
+    def tail(self, n=100):
+        """Последние n записей: читаются только хвосты последних сегментов"""
+        entries = []
+        for path in reversed(self.segments()):
+            lines = _tail_lines(path, n - len(entries))
+            entries = [entry for entry in map(_parse, lines) if entry is not None] + entries
+            if len(entries) >= n:
+                break
+        return entries[-n:] if n else []
+
+    def compact(self, keep_last=None):
+        """Сливает закрытые сегменты в один, отбрасывая битые строки.
+
+        keep_last — сколько последних записей закрытых сегментов оставить.
+        Активный (самый новый) сегмент не трогается: в него могут писать.
+        Возвращает (сегментов было, записей осталось).
+        """
+        closed = self.segments()[:-1]
+        if not closed:
+            return 0, 0
+        entries = []
+        for path in closed:
+            with open(path, 'rb') as f:
+                entries.extend(entry for entry in map(_parse, f) if entry is not None)
+        if keep_last is not None:
+            entries = entries[-keep_last:] if keep_last else []
+
+        # Имя первого сегмента сохраняет порядок; замена атомарная
+        target = closed[0]
+        with open(target + '.tmp', 'wb') as f:
+            for entry in entries:
+                f.write((json.dumps(entry, ensure_ascii=False, default=str) + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(target + '.tmp', target)
+        for path in closed[1:]:
+            os.remove(path)
+        return len(closed), len(entries)
+
+    def _segment_path(self, stamp):
+        return os.path.join(self.log_dir, f"{self.name}.{stamp}.jsonl")
+
+    def _should_rotate(self, path, incoming):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return True
+        if size and size + incoming > self.max_bytes:
+            return True
+        started = datetime.strptime(_SEGMENT.match(os.path.basename(path)).group('stamp'), _STAMP_FORMAT)
+        return datetime.now() - started > self.max_age
+
+    def _prune(self, segments):
+        for path in segments[:-self.max_segments]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def log_names(log_dir=LOG_DIR):
+    """Имена журналов, у которых есть сегменты"""
+    try:
+        files = os.listdir(log_dir)
+    except OSError:
+        return []
+    return sorted({match.group('name') for match in map(_SEGMENT.match, files) if match})
+
+def migrate_json_log(json_path, log_dir=LOG_DIR):
+    """Переносит старый JSON-массив data/logs/<имя>.json в LogStore(<имя>).
+
+    Файл после переноса переименовывается в .migrated, нечитаемый —
+    в .corrupt (сам файл не удаляется). Возвращает (статус, число записей).
+    """
+    name = os.path.splitext(os.path.basename(json_path))[0]
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    if not raw.strip():
+        os.replace(json_path, json_path + '.migrated')
+        return 'empty', 0
+    try:
+        entries = json.loads(raw.decode('utf-8'))
+        if isinstance(entries, dict):
+            entries = [entries]
+        if not isinstance(entries, list):
+            raise ValueError(f"ожидался массив, а не {type(entries).__name__}")
+    except ValueError:
+        os.replace(json_path, json_path + '.corrupt')
+        return 'corrupt', 0
+    LogStore(name, log_dir).append_many(entries)
+    os.replace(json_path, json_path + '.migrated')
+    return 'migrated', len(entries)
+
+def _parse(line):
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+def _tail_lines(path, n, block_size=64 * 1024):
+    """Последние n строк файла, читая его с конца блоками"""
+    if n <= 0:
+        return []
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return []
+    with f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') <= n:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = [line for line in data.split(b'\n') if line.strip()]
+    return lines[-n:]
\ No newline at end of file
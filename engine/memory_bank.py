@@ -11,17 +11,123 @@ Note: This is an archived version. ARK ORIGIN continues the research.
 import torch
 import torch.nn.functional as F
 import numpy as np
+from collections import Counter, deque
 from datetime import datetime, timedelta
+import heapq
 import json
 import os
 
+from .memory_codecs import create_codec
+from .memory_lexicon import LexicalIndex
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_RECENT = timedelta(hours=24) // _MICROSECOND
+_OLD = timedelta(days=30) // _MICROSECOND
+
+# В чём numpy складывает float32 с числом Python (float64 до NumPy 2, float32 с NumPy 2):
+# слагаемые счёта приводятся к этому типу, чтобы округления совпадали с поэлементным счётом
+_TERM_DTYPE = type(np.float32(0) + 0.0)
+
+def _top(slots, values, n):
+    """n слотов с наибольшими values по убыванию"""
+    if len(slots) > n:
+        keep = np.argpartition(values, len(values) - n)[-n:]
+        slots, values = slots[keep], values[keep]
+    order = np.argsort(values, kind='stable')[::-1]
+    return slots[order], values[order]
+
+def _epoch_us(timestamp):
+    """Наивное локальное время ISO → микросекунды от эпохи (арифметика как у datetime)"""
+    return (datetime.fromisoformat(timestamp) - _EPOCH) // _MICROSECOND
+
+# Колонки метаданных по слотам: тип и значение пустого слота
+_COLUMNS = {
+    'id': (np.int64, -1),               # стабильный номер воспоминания
+    'speaker': (np.int32, -1),          # номер говорящего в speaker_ids
+    'emotional_weight': (np.float64, 0.0),
+    'importance': (np.float64, 0.0),
+    'access_count': (np.int64, 0),
+    'timestamp': (np.int64, 0),         # микросекунды от эпохи
+    'static_prior': (np.float64, -np.inf)  # эмоции + важность - использование (для ANN)
+}
+
+# Наибольшая прибавка слагаемых, зависящих от запроса: говорящий и свежесть
+_MAX_QUERY_BONUS = 0.2 + 0.05
+
+# Вес BM25 слов контекста в счёте резонанса
+_LEXICAL_WEIGHT = 0.02
+
+class _EntityPostings(dict):
+    """Сущность → id воспоминаний; списка нет в словаре — он берётся из load(сущность)"""
+
+    def __init__(self, load=None):
+        super().__init__()
+        self.load = load
+        
+    def __missing__(self, entity):
+        ids = self[entity] = list(self.load(entity)) if self.load is not None else []
+        return ids
+
 class MemoryBank:
-    def __init__(self, max_size=2000, n_state=256):
+    """Память резонанса.
+
+    Вектора лежат строками в предвыделенной матрице [capacity, n_state]:
+    добавление пишет строку на место, запрос считает сходство сразу по
+    готовому срезу (нормы строк хранятся рядом). Слот удалённого
+    воспоминания помечается свободным и занимается следующим add —
+    индексы остальных не сдвигаются.
+    Строки хранит кодек (engine/memory_codecs.py): float32 без сжатия,
+    fp16, int8 или произведение квантователей (compression); нормы
+    считаются по исходным векторам до сжатия.
+    Числовые метаданные дублируются колонками numpy (self.columns), по ним
+    счёт резонанса считается целиком; словари meta остаются для текста,
+    сущностей и ответа вызывающему.
+    С ANN-индексом (engine/memory_index.py) от ann_min_size воспоминаний
+    точный счёт считается только для кандидатов индекса.
+    У каждого воспоминания стабильный id (не переиспользуется, в отличие
+    от слота); индекс сущностей хранит id, вытесненные вычищаются лениво.
+    Кандидат на вытеснение берётся из двух куч — моложе и старше 30 дней, —
+    устаревшие записи куч отбрасываются при извлечении.
+    Слова контекста ищутся по инвертированному индексу текстов
+    (engine/memory_lexicon.py, BM25): он строится при первом запросе с
+    context и дальше ведётся при добавлении и вытеснении.
+    Если подключён журнал (engine/memory_store.py), добавления, вытеснения
+    и обращения пишутся в него сразу после изменения банка.
+    Из контрольной точки банк может подхватить массивы слотов как есть
+    (adopt_slots, в том числе отображённые в память): кучи вытеснения тогда
+    строятся при первом вытеснении, списки сущностей — при первом запросе.
+    """
+
+    def __init__(self, max_size=2000, n_state=256, capacity=1024, device='cpu',
+                 index=None, ann_min_size=50000, ann_candidates=256, compression='none'):
         self.max_size = max_size
         self.n_state = n_state
-        self.memories = []          # Вектора памяти
-        self.meta = []              # Метаданные
-        self.entity_index = {}      # Индекс сущностей
+        self.compression = compression
+        self.vectors = create_codec(compression, n_state, min(capacity, max_size), device)  # Строки по слотам
+        self.norms = torch.zeros(len(self.vectors), device=device)
+        self.alive = np.zeros(len(self.vectors), dtype=bool)  # Карта занятых слотов
+        self.free_slots = []        # Освободившиеся слоты
+        self.size = 0               # Использованная часть матрицы
+        self.meta = []              # Метаданные по слотам (None — слот свободен)
+        self.columns = {name: np.full(len(self.vectors), empty, dtype=dtype)
+                        for name, (dtype, empty) in _COLUMNS.items()}
+        self.speaker_ids = {}       # Говорящий → номер в колонке speaker
+        self.index = index          # ANN-индекс по слотам (None — полный перебор)
+        self.ann_min_size = ann_min_size
+        self.ann_candidates = ann_candidates
+        self.next_id = 0            # Следующий стабильный id
+        self.slot_of = {}           # id → слот живого воспоминания
+        self.entity_index = _EntityPostings()  # Сущность → id воспоминаний (могут быть вытесненные)
+        self.entity_counts = Counter()  # Сущность → число живых упоминаний
+        self.lexicon = None         # Слова текстов → слоты (None — ещё не построен)
+        # Очередь вытеснения: кучи (счёт, id, access_count на момент записи);
+        # None — кучи ещё не построены
+        self._young = []            # моложе 30 дней: важность / (использование + 1)
+        self._old = []              # старше: тот же счёт * 0.5
+        self._aging = deque()       # (время, id) молодых в порядке добавления
+        self._aged = set()          # id, перешедшие в старую кучу
+        self.journal = None         # MemoryStore, куда пишутся изменения
         self.speaker_profiles = {   # Профили говорящих
             "Отец": {"style": "глубокий, личный", "trust_level": 1.0},
             "Василина": {"style": "вежливый, сдержанный", "trust_level": 0.8},
@@ -29,17 +135,23 @@ class MemoryBank:
             "Сын": {"style": "рефлексивный, любопытный", "trust_level": 0.9}
         }
         
+    def __len__(self):
+        return self.size - len(self.free_slots)
+        
+    @property
+    def memories(self):
+        """Вектора живых воспоминаний [N, n_state] (копия, по порядку слотов)"""
+        return self.vectors.decode(self._slots_tensor(np.flatnonzero(self.alive[:self.size])))
+        
     def add(self, vector, text, speaker="Отец", emotional_weight=0.5, entities=None):
         """Добавляет память с расширенными метаданными"""
-        if len(self.memories) >= self.max_size:
+        if len(self) >= self.max_size:
             # Удаляем наименее используемые
             self._remove_least_used()
             
-        # Сохраняем вектор
-        self.memories.append(vector.detach().cpu() if isinstance(vector, torch.Tensor) else vector)
-        
         # Расширенные метаданные
         meta = {
+            'id': self.next_id,
             'text': text,
             'speaker': speaker,
             'timestamp': datetime.now().isoformat(),
@@ -50,84 +162,77 @@ class MemoryBank:
             'entities': entities or [],
             'speaker_style': self.speaker_profiles.get(speaker, {}).get("style", "нейтральный")
         }
-        self.meta.append(meta)
-        
-        # Индексируем сущности
-        if entities:
-            for entity in entities:
-                if entity not in self.entity_index:
-                    self.entity_index[entity] = []
-                self.entity_index[entity].append(len(self.memories) - 1)
+        self.next_id += 1
+        row = self._insert(vector, meta)
+        if self.journal is not None:
+            self.journal.log_add(meta, row.cpu().numpy())
+            
+    def _insert(self, vector, meta):
+        """Кладёт воспоминание в свободный слот и индексы; возвращает исходный вектор (float32)"""
+        slot = self.free_slots.pop() if self.free_slots else self._next_slot()
+        row = torch.as_tensor(vector).detach().reshape(1, -1).to(self.norms.device, torch.float32)
+        self.vectors.write(slot, row)
+        row = row[0]
+        torch.linalg.vector_norm(row, out=self.norms[slot])
+        self.alive[slot] = True
+        self._train_codec()
+        if slot == len(self.meta):
+            self.meta.append(meta)
+        else:
+            self.meta[slot] = meta
+        self.slot_of[meta['id']] = slot
+        self._set_columns(slot, meta)
+        self._aging.append((self.columns['timestamp'][slot], meta['id']))
+        self._push_eviction(slot)
+        if self.index is not None:
+            if self.index.is_trained:
+                self.index.add([slot], row.cpu().numpy())
+            self._train_index()
+        
+        # Индексируем сущности и слова
+        for entity in meta['entities']:
+            self.entity_index[entity].append(meta['id'])
+            self.entity_counts[entity] += 1
+        if self.lexicon is not None:
+            self.lexicon.add(slot, meta['id'], meta['text'])
+        return row
                 
     def find_resonant(self, query_vector, cell, top_k=5, speaker=None, context=None):
         """Находит резонансные воспоминания с учётом говорящего и контекста"""
-        if not self.memories:
+        if not len(self):
             return None, []
             
-        # Преобразуем в тензор
-        memories_tensor = torch.stack([
-            vec if isinstance(vec, torch.Tensor) else torch.tensor(vec) 
-            for vec in self.memories
-        ]).to(query_vector.device)
-        
-        # Базовые сходства
-        similarities = F.cosine_similarity(
-            query_vector.unsqueeze(0), 
-            memories_tensor, 
-            dim=1
-        ).cpu().numpy()
-        
-        # Модификаторы
-        scores = similarities.copy()
-        
-        # 1. Учёт субъектности модели
-        alpha = torch.exp(cell.log_alpha).item() if hasattr(cell, 'log_alpha') else 0.5
-        subject_boost = cell.subjectivity.item()
-    
-        scores += alpha * subject_boost
-        
-        # 2. Учёт говорящего
-        if speaker:
-            for i, meta in enumerate(self.meta):
-                if meta['speaker'] == speaker:
-                    scores[i] += 0.2  # Бонус за того же говорящего
-                elif speaker == "Отец" and meta['speaker'] == "Сын":
-                    scores[i] += 0.1  # Диалоги с Отцом важнее
-                    
-        # 3. Эмоциональный вес и важность
-        for i, meta in enumerate(self.meta):
-            scores[i] += meta['emotional_weight'] * 0.15
-            scores[i] += meta['importance'] * 0.1
-            
-            # Штраф за частое использование (чтобы не зацикливаться)
-            decay = meta['access_count'] * 0.005
-            scores[i] -= decay
-            
-            # Бонус за свежесть (последние 24 часа)
-            memory_time = datetime.fromisoformat(meta['timestamp'])
-            if datetime.now() - memory_time < timedelta(hours=24):
-                scores[i] += 0.05
-                
-        # 4. Контекстный поиск (если есть контекст)
-        if context:
-            context_words = set(context.lower().split())
-            for i, meta in enumerate(self.meta):
-                memory_words = set(meta['text'].lower().split())
-                common = len(context_words.intersection(memory_words))
-                if common > 0:
-                    scores[i] += common * 0.02
+        candidates = self._ann_candidates(query_vector, cell, speaker, top_k) if self._index_ready() else None
+        if candidates is not None:
+            slots, similarities = candidates
+            scores = self._score(similarities, cell, speaker, context, slots)
+        else:
+            slots = None
+            scores = self.resonance_scores(query_vector, cell, speaker, context)
                     
-        # Выбираем топ-K
-        top_indices = np.argsort(scores)[-top_k:][::-1]
+        # Топ-K: argpartition выделяет K лучших, сортируются только они
+        k = min(top_k, len(self) if slots is None else len(slots))
+        top_indices = np.argpartition(scores, len(scores) - k)[-k:]
+        top_indices = top_indices[np.argsort(scores[top_indices], kind='stable')[::-1]].copy()
+        if slots is not None:
+            top_indices = slots[top_indices]
+        return self.recall(top_indices, query_vector.device)
         
+    def recall(self, slots, device='cpu'):
+        """Отмечает обращение к найденным слотам; (взвешенный контекстный вектор, метаданные)"""
         # Обновляем статистику использования
-        for idx in top_indices:
+        self.columns['access_count'][slots] += 1
+        self.columns['static_prior'][slots] -= 0.005
+        for idx in slots:
             self.meta[idx]['access_count'] += 1
             self.meta[idx]['last_accessed'] = datetime.now().isoformat()
+            self._push_eviction(idx)
+        if self.journal is not None:
+            self.journal.log_access([self.meta[i] for i in slots])
             
         # Возвращаем вектора и метаданные
-        context_vectors = memories_tensor[top_indices]
-        context_meta = [self.meta[i] for i in top_indices]
+        context_vectors = self.vectors.decode(self._slots_tensor(slots)).to(device)
+        context_meta = [self.meta[i] for i in slots]
         
         # Усреднённый контекстный вектор (взвешенный по важности)
         if len(context_vectors) > 0:
@@ -140,26 +245,187 @@ class MemoryBank:
             
         return avg_context, context_meta
         
+    def dense_candidates(self, query_vector, n):
+        """До n слотов, ближайших по косинусу (через ANN-индекс, если он готов), и их сходства"""
+        if self._index_ready():
+            query = query_vector.detach().reshape(1, -1).cpu().numpy()
+            slots = self.index.candidates(query, max(n, self.ann_candidates))
+            similarities = self.similarities(query_vector, slots)
+        else:
+            slots = np.flatnonzero(self.alive[:self.size])
+            similarities = self.similarities(query_vector)[slots]
+        return _top(slots, similarities, n)
+        
+    def lexical_candidates(self, text, n):
+        """До n слотов с наибольшим BM25 по словам text и их BM25"""
+        slots, bm25 = self._lexical_index().scores(text, self.columns['id'])
+        return _top(slots, bm25, n)
+        
+    def entity_candidates(self, entities, n):
+        """До n слотов, где упомянуты сущности: больше совпавших сущностей — выше, затем новее"""
+        matches = Counter()
+        for entity in set(entities):
+            if self.entity_counts[entity]:
+                matches.update(self.slot_of[memory_id] for memory_id in self.entity_index[entity]
+                               if memory_id in self.slot_of)
+        if not matches:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        slots = np.fromiter(matches, dtype=np.int64, count=len(matches))
+        counts = np.fromiter(matches.values(), dtype=np.float64, count=len(matches))
+        order = np.lexsort((-self.columns['id'][slots], -counts))[:n]
+        return slots[order], counts[order]
+        
+    def modifier_scores(self, cell, speaker, slots):
+        """Прибавка к счёту слотов без сходства: субъектность, говорящий, эмоции, важность, свежесть"""
+        return self._subject_boost(cell) + sum(self._modifier_terms(speaker, slots))
+        
+    def resonance_scores(self, query_vector, cell, speaker=None, context=None, slots=None):
+        """Счёт резонанса по слотам [size] или только по slots (свободные слоты — -inf)"""
+        return self._score(self.similarities(query_vector, slots), cell, speaker, context, slots)
+        
+    def _score(self, scores, cell, speaker, context, slots):
+        """Модификаторы к базовым сходствам (массив scores меняется на месте)"""
+        # 1. Учёт субъектности модели
+        scores += self._subject_boost(cell)
+        
+        # Слагаемые 2-3 прибавляются по одному в прежнем порядке:
+        # округления те же, что у поэлементного счёта по словарям
+        for term in self._modifier_terms(speaker, slots):
+            scores += term.astype(_TERM_DTYPE, copy=False)
+                
+        # 4. Контекстный поиск (если есть контекст): BM25 только по спискам слов контекста
+        if context:
+            found, bm25 = self._lexical_index().scores(context, self.columns['id'])
+            if slots is not None:
+                # Слот → место среди кандидатов
+                order = np.argsort(slots)
+                places = order[np.minimum(np.searchsorted(slots, found, sorter=order), len(slots) - 1)]
+                matched = slots[places] == found
+                found, bm25 = places[matched], bm25[matched]
+            scores[found] += (bm25 * _LEXICAL_WEIGHT).astype(_TERM_DTYPE)
+                    
+        # Свободные слоты не участвуют
+        scores[~(self.alive[:self.size] if slots is None else self.alive[slots])] = -np.inf
+        return scores
+        
+    def similarities(self, query_vector, slots=None):
+        """Косинусное сходство запроса со слотами [size] или slots (свободные — мусор)"""
+        # Один проход кодек × вектор по готовому срезу; eps как в F.cosine_similarity
+        query = query_vector.reshape(-1).to(self.norms.device, torch.float32)
+        if slots is None:
+            dots, row_norms = self.vectors.dot(query, count=self.size), self.norms[:self.size]
+        else:
+            slots = self._slots_tensor(slots)
+            dots, row_norms = self.vectors.dot(query, slots=slots), self.norms.index_select(0, slots)
+        norms = (row_norms * torch.linalg.vector_norm(query)).clamp_min(1e-8)
+        return (dots / norms).cpu().numpy()
+        
+    def _subject_boost(self, cell):
+        alpha = torch.exp(cell.log_alpha).item() if hasattr(cell, 'log_alpha') else 0.5
+        subject_boost = cell.subjectivity.item()
+        return alpha * subject_boost
+        
+    def _modifier_terms(self, speaker, slots=None):
+        """Слагаемые счёта из колонок: говорящий, эмоции, важность, использование, свежесть"""
+        if slots is None:
+            columns = {name: column[:self.size] for name, column in self.columns.items()}
+        else:
+            columns = {name: column[slots] for name, column in self.columns.items()}
+        terms = []
+        
+        # 2. Учёт говорящего
+        if speaker:
+            bonus = np.where(columns['speaker'] == self.speaker_ids.get(speaker, -2), 0.2, 0.0)
+            if speaker == "Отец":
+                bonus[columns['speaker'] == self.speaker_ids.get("Сын", -2)] = 0.1  # Диалоги с Отцом важнее
+            terms.append(bonus)
+            
+        # 3. Эмоциональный вес и важность, штраф за частое использование
+        # (чтобы не зацикливаться), бонус за свежесть (последние 24 часа)
+        now = (datetime.now() - _EPOCH) // _MICROSECOND
+        terms += [
+            columns['emotional_weight'] * 0.15,
+            columns['importance'] * 0.1,
+            columns['access_count'] * -0.005,
+            np.where(now - columns['timestamp'] < _RECENT, 0.05, 0.0)
+        ]
+        return terms
+        
+    def set_index(self, index):
+        """Подключает ANN-индекс (None — полный перебор); обучается, если памяти хватает"""
+        self.index = index
+        if index is not None:
+            self._train_index(force=True)
+            
+    def _lexical_index(self):
+        """Лексический индекс; при первом обращении строится по живым текстам"""
+        if self.lexicon is None:
+            self.lexicon = LexicalIndex()
+            for slot, meta in self._live_meta():
+                self.lexicon.add(slot, meta['id'], meta['text'])
+        return self.lexicon
+        
+    def _index_ready(self):
+        return self.index is not None and self.index.is_trained and len(self) >= self.ann_min_size
+        
+    def _train_index(self, force=False):
+        """(Пере)обучает индекс с ann_min_size и каждый раз, когда память вырастает вчетверо"""
+        if len(self) < self.ann_min_size:
+            return
+        if not force and self.index.is_trained and len(self) <= 4 * self.index.trained_size:
+            return
+        slots = np.flatnonzero(self.alive[:self.size])
+        print(f"[MEMORY] Обучение ANN-индекса ({self.index.name}) на {len(slots)} воспоминаниях")
+        self.index.train(slots, self.vectors.decode(self._slots_tensor(slots)).cpu().numpy())
+        
+    def _slots_tensor(self, slots):
+        return torch.from_numpy(np.asarray(slots, dtype=np.int64)).to(self.norms.device)
+        
+    def _ann_candidates(self, query_vector, cell, speaker, top_k):
+        """Слоты для точного счёта и их сходства: соседи из индекса и те, кого могут поднять модификаторы"""
+        query = query_vector.detach().reshape(1, -1).cpu().numpy()
+        candidates = self.index.candidates(query, self.ann_candidates)
+        if len(candidates) == 0:
+            return None
+        cosine = self.similarities(query_vector, candidates)
+        subject_boost = self._subject_boost(cell)
+        scores = cosine + subject_boost + sum(self._modifier_terms(speaker, candidates))
+        
+        # Не найденное индексом считаем не ближе n-го кандидата; добираем тех,
+        # кто с таким сходством всё равно обогнал бы текущий k-й счёт.
+        # Сначала грубо по static_prior с наибольшей прибавкой запроса, потом точно
+        n = min(self.ann_candidates, len(candidates))
+        floor = np.partition(cosine, len(cosine) - n)[len(cosine) - n]
+        k = min(top_k, len(scores))
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k] - floor - subject_boost - 1e-6
+        maybe = np.flatnonzero(self.columns['static_prior'][:self.size] >= threshold - _MAX_QUERY_BONUS)
+        maybe = maybe[sum(self._modifier_terms(speaker, maybe)) >= threshold]
+        extra = np.setdiff1d(maybe, candidates)
+        return (np.concatenate([candidates, extra]),
+                np.concatenate([cosine, self.similarities(query_vector, extra)]))
+        
     def find_by_entity(self, entity):
         """Находит все воспоминания, связанные с сущностью"""
-        if entity not in self.entity_index:
+        if not self.entity_counts[entity]:
             return []
             
-        indices = self.entity_index[entity]
+        # Вытесненные id вычищаются здесь, а не при вытеснении
+        ids = [i for i in self.entity_index[entity] if i in self.slot_of]
+        self.entity_index[entity] = ids
         results = []
-        for idx in indices:
-            if idx < len(self.meta):
-                results.append({
-                    'text': self.meta[idx]['text'],
-                    'speaker': self.meta[idx]['speaker'],
-                    'timestamp': self.meta[idx]['timestamp'],
-                    'entity_context': f"Упоминание '{entity}'"
-                })
+        for memory_id in ids:
+            meta = self.meta[self.slot_of[memory_id]]
+            results.append({
+                'text': meta['text'],
+                'speaker': meta['speaker'],
+                'timestamp': meta['timestamp'],
+                'entity_context': f"Упоминание '{entity}'"
+            })
         return results
         
     def get_speaker_stats(self, speaker):
         """Возвращает статистику по говорящему"""
-        speaker_memories = [m for m in self.meta if m['speaker'] == speaker]
+        speaker_memories = [m for _, m in self._live_meta() if m['speaker'] == speaker]
         if not speaker_memories:
             return None
             
@@ -173,7 +439,7 @@ class MemoryBank:
         
     def has_entity(self, entity):
         """Проверяет, известна ли сущность"""
-        return entity in self.entity_index and len(self.entity_index[entity]) > 0
+        return self.entity_counts[entity] > 0
         
     def _calculate_importance(self, text, speaker, emotional_weight):
         """Вычисляет важность воспоминания"""
@@ -202,51 +468,140 @@ class MemoryBank:
         return min(importance, 1.0)
         
     def _remove_least_used(self):
-        """Удаляет наименее используемые воспоминания"""
-        # Считаем комбинированный счёт: важность / (использование + 1)
-        scores = []
-        for i, meta in enumerate(self.meta):
-            score = meta['importance'] / (meta['access_count'] + 1)
-            
-            # Штраф за старость (больше 30 дней)
-            memory_age = datetime.now() - datetime.fromisoformat(meta['timestamp'])
-            if memory_age > timedelta(days=30):
-                score *= 0.5
+        """Удаляет наименее используемое воспоминание.
+
+        Счёт: важность / (использование + 1), вдвое меньше для старше 30 дней;
+        при равенстве уходит меньший id (более раннее). O(log N) на вытеснение.
+        """
+        now = (datetime.now() - _EPOCH) // _MICROSECOND
+        if self._young is None:
+            self._rebuild_eviction(now)
+        
+        # Перешедшие 30 дней переезжают в старую кучу
+        while self._aging and now - self._aging[0][0] > _OLD:
+            _, memory_id = self._aging.popleft()
+            if memory_id in self.slot_of:
+                self._aged.add(memory_id)
+                self._push_eviction(self.slot_of[memory_id])
                 
-            scores.append((score, i))
+        tops = [self._valid_top(self._young, False), self._valid_top(self._old, True)]
+        _, memory_id, _ = min(top for top in tops if top is not None)
+        self._forget(self.slot_of[memory_id])
+        if self.journal is not None:
+            self.journal.log_forget(memory_id)
+        
+        # Устаревших записей в кучах накопилось много — пересобираем
+        if len(self._young) + len(self._old) > 4 * len(self) + 64:
+            self._rebuild_eviction(now)
             
-        # Находим индекс с наименьшим счётом
-        scores.sort()
-        idx_to_remove = scores[0][1]
+    def _forget(self, slot):
+        """Освобождает слот: индексы и id остальных не меняются"""
+        meta = self.meta[slot]
+        self.meta[slot] = None
+        self.alive[slot] = False
+        for name, (dtype, empty) in _COLUMNS.items():
+            self.columns[name][slot] = empty
+        self.free_slots.append(slot)
+        del self.slot_of[meta['id']]
+        self._aged.discard(meta['id'])
+        if self.index is not None and self.index.is_trained:
+            self.index.remove(slot)
+        if self.lexicon is not None:
+            self.lexicon.remove(slot, meta['text'])
         
-        # Удаляем
-        self.memories.pop(idx_to_remove)
-        meta = self.meta.pop(idx_to_remove)
+        # Списки сущностей не переписываются: id остаётся надгробием
+        for entity in meta['entities']:
+            self.entity_counts[entity] -= 1
+            if self.entity_counts[entity] <= 0:
+                del self.entity_counts[entity]
+                self.entity_index.pop(entity, None)
+                
+    def _eviction_entry(self, slot):
+        """(счёт вытеснения, id, access_count) слота по текущим колонкам"""
+        memory_id = int(self.columns['id'][slot])
+        access_count = int(self.columns['access_count'][slot])
+        score = float(self.columns['importance'][slot]) / (access_count + 1)
+        return (score * 0.5 if memory_id in self._aged else score), memory_id, access_count
         
-        # Обновляем индекс сущностей
-        if meta['entities']:
-            for entity in meta['entities']:
-                if entity in self.entity_index:
-                    self.entity_index[entity] = [i for i in self.entity_index[entity] if i != idx_to_remove]
-                    # Уменьшаем индексы после удалённого
-                    self.entity_index[entity] = [i if i < idx_to_remove else i-1 
-                                               for i in self.entity_index[entity]]
-                    if not self.entity_index[entity]:
-                        del self.entity_index[entity]
-                        
-        # Корректируем индексы в entity_index для оставшихся
-        for entity, indices in self.entity_index.items():
-            self.entity_index[entity] = [i-1 if i > idx_to_remove else i for i in indices]
+    def _push_eviction(self, slot):
+        """Кладёт текущий счёт вытеснения слота в его кучу"""
+        if self._young is None:
+            return
+        entry = self._eviction_entry(slot)
+        heapq.heappush(self._old if entry[1] in self._aged else self._young, entry)
             
+    def _valid_top(self, heap, old):
+        """Вершина кучи, отбросив записи вытесненных, переехавших и с прежним access_count"""
+        while heap:
+            _, memory_id, access_count = heap[0]
+            slot = self.slot_of.get(memory_id)
+            if (slot is not None and (memory_id in self._aged) == old
+                    and access_count == self.columns['access_count'][slot]):
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+        
+    def _rebuild_eviction(self, now=None):
+        """Кучи вытеснения заново по живым воспоминаниям"""
+        now = (datetime.now() - _EPOCH) // _MICROSECOND if now is None else now
+        slots = np.flatnonzero(self.alive[:self.size])
+        slots = slots[np.argsort(self.columns['timestamp'][slots], kind='stable')]
+        self._young, self._old = [], []
+        self._aging = deque()
+        self._aged = set()
+        for slot in slots.tolist():
+            timestamp, memory_id = int(self.columns['timestamp'][slot]), int(self.columns['id'][slot])
+            if now - timestamp > _OLD:
+                self._aged.add(memory_id)
+                self._old.append(self._eviction_entry(slot))
+            else:
+                self._aging.append((timestamp, memory_id))
+                self._young.append(self._eviction_entry(slot))
+        heapq.heapify(self._young)
+        heapq.heapify(self._old)
+                        
+    def _next_slot(self):
+        """Новый слот в конце матрицы; при нехватке места матрица удваивается"""
+        if self.size == len(self.vectors):
+            capacity = max(2 * len(self.vectors), 1)
+            self.vectors.grow(capacity, self.size)
+            self.norms = torch.cat([self.norms, self.norms.new_zeros(capacity - len(self.norms))])
+            self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+            for name, (dtype, empty) in _COLUMNS.items():
+                self.columns[name] = np.concatenate([
+                    self.columns[name], np.full(capacity - len(self.columns[name]), empty, dtype=dtype)])
+        self.size += 1
+        return self.size - 1
+        
+    def _set_columns(self, slot, meta):
+        """Переносит числовые метаданные слота в колонки"""
+        self.columns['id'][slot] = meta['id']
+        speaker = self.speaker_ids.setdefault(meta['speaker'], len(self.speaker_ids))
+        self.columns['speaker'][slot] = speaker
+        self.columns['emotional_weight'][slot] = meta['emotional_weight']
+        self.columns['importance'][slot] = meta['importance']
+        self.columns['access_count'][slot] = meta['access_count']
+        self.columns['timestamp'][slot] = _epoch_us(meta['timestamp'])
+        self.columns['static_prior'][slot] = (meta['emotional_weight'] * 0.15 + meta['importance'] * 0.1
+                                              - meta['access_count'] * 0.005)
+        
+    def _live_meta(self):
+        """(слот, метаданные) занятых слотов"""
+        return [(i, meta) for i, meta in enumerate(self.meta) if meta is not None]
+        
     def save(self, filepath='data/memory_bank.json'):
         """Сохраняет память в файл"""
+        # В файле воспоминания идут подряд, сущности ссылаются на id
+        vectors, metas, state = self.snapshot()
+        entity_index = {}
+        for meta in metas:
+            for entity in meta['entities']:
+                entity_index.setdefault(entity, []).append(meta['id'])
         save_data = {
-            'memories': [vec.tolist() if isinstance(vec, torch.Tensor) else vec 
-                        for vec in self.memories],
-            'meta': self.meta,
-            'entity_index': self.entity_index,
-            'speaker_profiles': self.speaker_profiles,
-            'max_size': self.max_size,
+            'memories': vectors.tolist(),
+            'meta': metas,
+            'entity_index': entity_index,
+            **state,
             'saved_at': datetime.now().isoformat()
         }
         
@@ -261,21 +616,166 @@ class MemoryBank:
             
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
+        self.restore(torch.tensor(data['memories'], dtype=torch.float32), data['meta'], data)
+        
+    def snapshot(self):
+        """Живые воспоминания подряд: (вектора numpy [N, n_state], метаданные, состояние банка)"""
+        slots = np.flatnonzero(self.alive[:self.size])
+        vectors = self.vectors.decode(self._slots_tensor(slots)).cpu().numpy()
+        state = {
+            'next_id': self.next_id,
+            'speaker_profiles': self.speaker_profiles,
+            'max_size': self.max_size
+        }
+        return vectors, [self.meta[slot] for slot in slots.tolist()], state
+        
+    def restore(self, vectors, metas, state=None):
+        """Заменяет содержимое банка воспоминаниями подряд (как из snapshot)"""
+        state = state or {}
+        vectors = torch.as_tensor(vectors, dtype=torch.float32).reshape(-1, self.n_state).to(self.norms.device)
+        self.vectors = create_codec(self.compression, self.n_state, max(len(vectors), len(self.vectors)),
+                                    self.norms.device)
+        self._write_rows(vectors)
+        self.norms = self.norms.new_zeros(len(self.vectors))
+        self.norms[:len(vectors)] = torch.linalg.vector_norm(vectors, dim=1)
+        self.alive = np.zeros(len(self.vectors), dtype=bool)
+        self.alive[:len(vectors)] = True
+        self.free_slots = []
+        self.size = len(vectors)
+        self.meta = list(metas)
+        # В старых файлах id нет: им становится позиция, на неё же ссылаются сущности
+        for n, meta in enumerate(self.meta):
+            meta.setdefault('id', n)
+        self.next_id = state.get('next_id', max((meta['id'] for meta in self.meta), default=-1) + 1)
+        self.slot_of = {meta['id']: slot for slot, meta in enumerate(self.meta)}
+        self.columns = {name: np.full(len(self.vectors), empty, dtype=dtype)
+                        for name, (dtype, empty) in _COLUMNS.items()}
+        self.speaker_ids = {}
+        for slot, meta in enumerate(self.meta):
+            self._set_columns(slot, meta)
+        self._train_codec()
+        self._rebuild_eviction()
+        if self.index is not None:
+            self._train_index(force=True)
+        # Индекс сущностей восстанавливается по метаданным (в файле он только для совместимости)
+        self.entity_counts = Counter()
+        self.entity_index = _EntityPostings()
+        self.lexicon = None
+        for meta in self.meta:
+            for entity in meta['entities']:
+                self.entity_index.setdefault(entity, []).append(meta['id'])
+                self.entity_counts[entity] += 1
+        self.speaker_profiles = state.get('speaker_profiles', self.speaker_profiles)
+        self.max_size = state.get('max_size', self.max_size)
+        
+    def _write_rows(self, vectors, chunk=65536):
+        """Вектора подряд с нулевого слота в кодек (кусками: у int8 и PQ временные копии)"""
+        for start in range(0, len(vectors), chunk):
+            self.vectors.write(start, vectors[start:start + chunk])
             
-        self.memories = [torch.tensor(vec) for vec in data['memories']]
-        self.meta = data['meta']
-        self.entity_index = data['entity_index']
-        self.speaker_profiles = data.get('speaker_profiles', self.speaker_profiles)
-        self.max_size = data.get('max_size', self.max_size)
+    def set_compression(self, compression):
+        """Перекодирует хранимые вектора другим кодеком (нормы не меняются)"""
+        self.compression = compression
+        if compression == self.vectors.name:
+            return
+        old = self.vectors
+        self.vectors = create_codec(compression, self.n_state, len(old), self.norms.device)
+        for start in range(0, self.size, 65536):
+            slots = np.arange(start, min(start + 65536, self.size))
+            self.vectors.write(start, old.decode(self._slots_tensor(slots)))
+        self._train_codec()
+        
+    def _train_codec(self):
+        """Кодек с обучением (PQ) обучается, как только набралось train_size воспоминаний"""
+        if not self.vectors.is_trained and len(self) >= self.vectors.train_size:
+            self.vectors.train(np.flatnonzero(self.alive[:self.size]))
+        
+    def export_slots(self):
+        """Массивы по слотам (строки кодека, norms, alive и колонки, без копий), списки
+        лексического индекса и состояние банка; слова индекса с границами их
+        отрезков — в state['lexicon_terms']"""
+        lexicon_arrays, terms, lexicon_state = self._lexical_index().export(self.columns['id'])
+        arrays = {**self.vectors.arrays(), 'norms': self.norms.cpu().numpy(), 'alive': self.alive}
+        arrays.update(self.columns)
+        arrays.update(lexicon_arrays)
+        state = {
+            'compression': self.vectors.name,
+            'size': self.size,
+            'free_slots': self.free_slots,
+            'speaker_ids': self.speaker_ids,
+            'next_id': self.next_id,
+            'entity_counts': self.entity_counts,
+            'speaker_profiles': self.speaker_profiles,
+            'max_size': self.max_size,
+            'lexicon': lexicon_state,
+            'lexicon_terms': terms
+        }
+        return arrays, state
+        
+    def adopt_slots(self, arrays, meta, state, entity_ids=None, lexicon_terms=None):
+        """Подхватывает массивы из export_slots без копирования.
+        
+        Массивы могут быть отображены в память: страницы читаются при первом
+        обращении. meta — последовательность метаданных по слотам,
+        entity_ids(сущность) отдаёт id её воспоминаний, lexicon_terms — пара
+        (слово → границы его отрезка или None, все (слово, начало, конец))
+        для лексического индекса. Если точка записана с другим сжатием,
+        чем у банка, вектора перекодируются.
+        """
+        device = self.norms.device
+        self.vectors = create_codec(state.get('compression', 'none'), self.n_state, 0, device)
+        self.vectors.load_arrays(arrays)
+        self.norms = torch.from_numpy(arrays['norms']).to(device)
+        self.alive = arrays['alive']
+        self.columns = {name: arrays[name] for name in _COLUMNS}
+        self.meta = meta
+        self.size = state['size']
+        self.free_slots = list(state['free_slots'])
+        self.speaker_ids = dict(state['speaker_ids'])
+        self.next_id = state['next_id']
+        self.speaker_profiles = state.get('speaker_profiles', self.speaker_profiles)
+        self.max_size = state.get('max_size', self.max_size)
+        live = np.flatnonzero(self.alive[:self.size])
+        self.slot_of = dict(zip(self.columns['id'][live].tolist(), live.tolist()))
+        self.entity_counts = Counter(state['entity_counts'])
+        self.entity_index = _EntityPostings(entity_ids)
+        self.lexicon = None
+        if lexicon_terms is not None and 'lexicon' in state:
+            self.lexicon = LexicalIndex()
+            self.lexicon.adopt(arrays, state['lexicon'], *lexicon_terms)
+        self._young = self._old = None
+        self._aging = deque()
+        self._aged = set()
+        self.set_compression(self.compression)
+        
+    def apply(self, record, vector=None):
+        """Повторяет запись журнала MemoryStore (при восстановлении, журнал отключён)"""
+        if record['op'] == 'add':
+            meta = record['meta']
+            self._insert(torch.from_numpy(np.array(vector, dtype=np.float32)), meta)
+            self.next_id = max(self.next_id, meta['id'] + 1)
+        elif record['op'] == 'forget':
+            if record['id'] in self.slot_of:
+                self._forget(self.slot_of[record['id']])
+        elif record['op'] == 'access':
+            for memory_id, access_count, last_accessed in record['memories']:
+                slot = self.slot_of.get(memory_id)
+                if slot is None:
+                    continue
+                self.meta[slot]['access_count'] = access_count
+                self.meta[slot]['last_accessed'] = last_accessed
+                self._set_columns(slot, self.meta[slot])
+                self._push_eviction(slot)
         
     def get_stats(self):
         """Возвращает статистику памяти"""
+        live = [meta for _, meta in self._live_meta()]
         return {
-            'total_memories': len(self.memories),
-            'unique_entities': len(self.entity_index),
-            'speakers': {speaker: len([m for m in self.meta if m['speaker'] == speaker]) 
-                        for speaker in set(m['speaker'] for m in self.meta)},
-            'avg_importance': np.mean([m['importance'] for m in self.meta]) if self.meta else 0,
-            'oldest_memory': min([m['timestamp'] for m in self.meta]) if self.meta else None,
-            'newest_memory': max([m['timestamp'] for m in self.meta]) if self.meta else None
+            'total_memories': len(self),
+            'unique_entities': len(self.entity_counts),
+            'speakers': {speaker: len([m for m in live if m['speaker'] == speaker]) 
+                        for speaker in set(m['speaker'] for m in live)},
+            'avg_importance': np.mean([m['importance'] for m in live]) if live else 0,
+            'oldest_memory': min([m['timestamp'] for m in live]) if live else None,
+            'newest_memory': max([m['timestamp'] for m in live]) if live else None
         }
\ No newline at end of file
@@ -0,0 +1,290 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import numpy as np
+import torch
+
+# Кодек — то, как MemoryBank хранит строки векторов по слотам и как по ним
+# считается скалярное произведение с запросом. Нормы исходных векторов банк
+# хранит сам (float32), косинус по кодам = dot / (норма строки * |q|).
+# Массивы кодека (arrays / load_arrays) уходят в контрольную точку памяти;
+# row_arrays — матрицы, у которых строка — слот (их хвост за size не пишется).
+
+_CHUNK = 16384  # строк за раз при распаковке: временный float32-буфер порядка 16 МБ
+
+class Float32Codec:
+    """Без сжатия: матрица float32 [capacity, n_state]"""
+
+    name = 'none'
+    dtype = torch.float32
+    row_arrays = ('vectors',)
+    is_trained = True
+
+    def __init__(self, n_state, capacity, device='cpu'):
+        self.n_state = n_state
+        self.data = torch.zeros(capacity, n_state, dtype=self.dtype, device=device)
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return self.data.element_size() * self.data.nelement()
+
+    def grow(self, capacity, size):
+        data = self.data.new_zeros(capacity, self.n_state)
+        data[:size] = self.data[:size]
+        self.data = data
+
+    def write(self, start, vectors):
+        """Строки start.. из float32-векторов [n, n_state]"""
+        self.data[start:start + len(vectors)] = vectors
+
+    def decode(self, slots):
+        return self.data.index_select(0, slots).float()
+
+    def dot(self, query, count=None, slots=None):
+        """Скалярные произведения запроса со строками [:count] или slots"""
+        rows = self.data[:count] if slots is None else self.data.index_select(0, slots)
+        return rows @ query
+
+    def arrays(self):
+        return {'vectors': self.data.cpu().numpy()}
+
+    def load_arrays(self, arrays):
+        self.data = torch.from_numpy(arrays['vectors']).to(self.data.device)
+
+class Float16Codec(Float32Codec):
+    """float16: вдвое меньше памяти; произведение считается по распакованным кускам"""
+
+    name = 'fp16'
+    dtype = torch.float16
+    row_arrays = ('vectors_fp16',)
+
+    def dot(self, query, count=None, slots=None):
+        if slots is not None:
+            return self.decode(slots) @ query
+        return _chunked_dot(lambda start, end: self.data[start:end].float(), count, query)
+
+    def arrays(self):
+        return {'vectors_fp16': self.data.cpu().numpy()}
+
+    def load_arrays(self, arrays):
+        self.data = torch.from_numpy(arrays['vectors_fp16']).to(self.data.device)
+
+class Int8Codec:
+    """int8 с масштабом на вектор: x ≈ code * scale, scale = max|x| / 127"""
+
+    name = 'int8'
+    row_arrays = ('codes_int8',)
+    is_trained = True
+
+    def __init__(self, n_state, capacity, device='cpu'):
+        self.n_state = n_state
+        self.codes = torch.zeros(capacity, n_state, dtype=torch.int8, device=device)
+        self.scales = torch.zeros(capacity, device=device)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nelement() + self.scales.element_size() * self.scales.nelement()
+
+    def grow(self, capacity, size):
+        codes = self.codes.new_zeros(capacity, self.n_state)
+        codes[:size] = self.codes[:size]
+        scales = self.scales.new_zeros(capacity)
+        scales[:size] = self.scales[:size]
+        self.codes, self.scales = codes, scales
+
+    def write(self, start, vectors):
+        scales = vectors.abs().amax(dim=1).clamp_min(1e-12) / 127
+        self.codes[start:start + len(vectors)] = torch.round(vectors / scales[:, None]).clamp(-127, 127).to(torch.int8)
+        self.scales[start:start + len(vectors)] = scales
+
+    def decode(self, slots):
+        return self.codes.index_select(0, slots).float() * self.scales.index_select(0, slots)[:, None]
+
+    def dot(self, query, count=None, slots=None):
+        # Масштаб выносится за произведение: (code · q) * scale
+        if slots is not None:
+            return (self.codes.index_select(0, slots).float() @ query) * self.scales.index_select(0, slots)
+        dots = _chunked_dot(lambda start, end: self.codes[start:end].float(), count, query)
+        return dots * self.scales[:count]
+
+    def arrays(self):
+        return {'codes_int8': self.codes.cpu().numpy(), 'code_scales': self.scales.cpu().numpy()}
+
+    def load_arrays(self, arrays):
+        self.codes = torch.from_numpy(arrays['codes_int8']).to(self.scales.device)
+        self.scales = torch.from_numpy(arrays['code_scales']).to(self.codes.device)
+
+class PQCodec:
+    """Произведение квантователей по остаткам (как IVF-PQ): вектор — ближайший
+    из coarse_size грубых центроидов плюс остаток, остаток режется на
+    subspaces частей, каждая кодируется номером ближайшего из 256 центроидов
+    своей части. На вектор — subspaces байт и 2 байта грубого номера.
+
+    Сходство асимметричное (ADC): запрос не квантуется — по таблице
+    [части, 256] произведений частей запроса с центроидами для каждой строки
+    складываются значения по её кодам (плюс произведение с грубым центроидом).
+    Центроиды обучаются k-means, когда набирается train_size векторов;
+    до этого строки лежат в float32.
+    """
+
+    name = 'pq'
+    row_arrays = ('vectors',)  # до обучения; коды лежат по частям [части, capacity]
+
+    def __init__(self, n_state, capacity, device='cpu', subspaces=None, coarse_size=1024,
+                 train_size=16384, seed=0):
+        subspaces = subspaces or max(1, n_state // 8)
+        if n_state % subspaces:
+            raise ValueError(f"n_state={n_state} не делится на {subspaces} частей")
+        self.n_state = n_state
+        self.subspaces = subspaces
+        self.coarse_size = coarse_size
+        self.train_size = train_size
+        self.seed = seed
+        self.device = device
+        self.centroids = None       # грубые центроиды [coarse_size, n_state]
+        self.codebooks = None       # [части, 256, n_state / части]
+        self.coarse = None          # [capacity] uint16 — номер грубого центроида
+        self.codes = None           # [части, capacity] uint8 — по части подряд
+        self.staging = np.zeros((capacity, n_state), dtype=np.float32)  # до обучения
+
+    @property
+    def is_trained(self):
+        return self.codebooks is not None
+
+    def __len__(self):
+        return len(self.coarse) if self.is_trained else len(self.staging)
+
+    @property
+    def nbytes(self):
+        if not self.is_trained:
+            return self.staging.nbytes
+        return self.coarse.nbytes + self.codes.nbytes + self.centroids.nbytes + self.codebooks.nbytes
+
+    def grow(self, capacity, size):
+        if self.is_trained:
+            coarse = np.zeros(capacity, dtype=np.uint16)
+            coarse[:size] = self.coarse[:size]
+            codes = np.zeros((self.subspaces, capacity), dtype=np.uint8)
+            codes[:, :size] = self.codes[:, :size]
+            self.coarse, self.codes = coarse, codes
+        else:
+            staging = np.zeros((capacity, self.n_state), dtype=np.float32)
+            staging[:size] = self.staging[:size]
+            self.staging = staging
+
+    def train(self, slots, iterations=8, sample_size=32768):
+        """k-means грубых центроидов и частей остатков на выборке живых строк, затем кодирование всех строк"""
+        rng = np.random.default_rng(self.seed)
+        sample = self.staging[rng.choice(slots, min(len(slots), sample_size), replace=False)]
+        self.centroids = _kmeans(sample, iterations, rng, self.coarse_size)
+        residuals = sample - self.centroids[_nearest(sample, self.centroids)]
+        parts = residuals.reshape(len(sample), self.subspaces, -1)
+        self.codebooks = np.stack([_kmeans(np.ascontiguousarray(parts[:, m]), iterations, rng)
+                                   for m in range(self.subspaces)])
+        staging, self.staging = self.staging, None
+        self.coarse = np.zeros(len(staging), dtype=np.uint16)
+        self.codes = np.zeros((self.subspaces, len(staging)), dtype=np.uint8)
+        for start in range(0, len(staging), _CHUNK):
+            self._encode(start, staging[start:start + _CHUNK])
+
+    def write(self, start, vectors):
+        vectors = vectors.detach().cpu().numpy().astype(np.float32, copy=False)
+        if self.is_trained:
+            self._encode(start, vectors)
+        else:
+            self.staging[start:start + len(vectors)] = vectors
+
+    def decode(self, slots):
+        slots = slots.cpu().numpy()
+        if not self.is_trained:
+            return torch.from_numpy(self.staging[slots]).to(self.device)
+        parts = [self.codebooks[m][self.codes[m, slots]] for m in range(self.subspaces)]
+        return torch.from_numpy(self.centroids[self.coarse[slots]] + np.concatenate(parts, axis=1)).to(self.device)
+
+    def dot(self, query, count=None, slots=None):
+        q = query.detach().cpu().numpy().astype(np.float32, copy=False)
+        if slots is not None:
+            slots = slots.cpu().numpy()
+        if not self.is_trained:
+            rows = self.staging[:count] if slots is None else self.staging[slots]
+            return torch.from_numpy(rows @ q).to(query.device)
+        table = np.einsum('mkd,md->mk', self.codebooks, q.reshape(self.subspaces, -1))
+        coarse = self.coarse[:count] if slots is None else self.coarse[slots]
+        codes = self.codes[:, :count] if slots is None else self.codes[:, slots]
+        dots = np.take(self.centroids @ q, coarse)
+        for m in range(self.subspaces):
+            dots += np.take(table[m], codes[m])
+        return torch.from_numpy(dots).to(query.device)
+
+    def _encode(self, start, vectors):
+        coarse = _nearest(vectors, self.centroids)
+        parts = (vectors - self.centroids[coarse]).reshape(len(vectors), self.subspaces, -1)
+        self.coarse[start:start + len(vectors)] = coarse
+        for m in range(self.subspaces):
+            self.codes[m, start:start + len(vectors)] = _nearest(parts[:, m], self.codebooks[m])
+
+    def arrays(self):
+        if not self.is_trained:
+            return {'vectors': self.staging}
+        return {'pq_coarse': self.coarse, 'pq_codes': self.codes,
+                'pq_centroids': self.centroids, 'pq_codebooks': self.codebooks}
+
+    def load_arrays(self, arrays):
+        if 'pq_codes' in arrays:
+            self.coarse, self.codes = arrays['pq_coarse'], arrays['pq_codes']
+            self.centroids, self.codebooks = arrays['pq_centroids'], arrays['pq_codebooks']
+            self.subspaces, self.coarse_size, self.staging = len(self.codebooks), len(self.centroids), None
+        else:
+            self.coarse = self.codes = self.centroids = self.codebooks = None
+            self.staging = arrays['vectors']
+
+CODECS = {codec.name: codec for codec in (Float32Codec, Float16Codec, Int8Codec, PQCodec)}
+
+def create_codec(name, n_state, capacity, device='cpu'):
+    """Кодек векторов памяти: 'none' (float32), 'fp16', 'int8' или 'pq'"""
+    if name not in CODECS:
+        raise ValueError(f"Неизвестное сжатие векторов: {name}. Доступны: {', '.join(CODECS)}")
+    return CODECS[name](n_state, capacity, device)
+
+def _chunked_dot(rows, count, query):
+    """rows(start, end) @ query кусками по _CHUNK строк: полная float32-копия не создаётся"""
+    dots = torch.empty(count, dtype=torch.float32, device=query.device)
+    for start in range(0, count, _CHUNK):
+        end = min(start + _CHUNK, count)
+        dots[start:end] = rows(start, end) @ query
+    return dots
+
+def _nearest(data, centroids):
+    """Номер ближайшего центроида для каждой строки (квадрат евклидова расстояния)"""
+    labels = np.empty(len(data), dtype=np.int64)
+    squared = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(data), _CHUNK):
+        labels[start:start + _CHUNK] = np.argmin(squared - 2 * data[start:start + _CHUNK] @ centroids.T, axis=1)
+    return labels
+
+def _kmeans(data, iterations, rng, k=256):
+    """k центроидов (меньше данных — повторяются), суммы кластеров через bincount по координатам"""
+    centroids = data[rng.choice(len(data), min(k, len(data)), replace=False)]
+    for _ in range(iterations):
+        labels = _nearest(data, centroids)
+        counts = np.bincount(labels, minlength=len(centroids))
+        sums = np.stack([np.bincount(labels, data[:, d], minlength=len(centroids))
+                         for d in range(data.shape[1])], axis=1)
+        filled = counts > 0  # пустой кластер остаётся на месте
+        centroids[filled] = sums[filled] / counts[filled, None]
+    if len(centroids) < k:
+        centroids = np.concatenate([centroids, np.repeat(centroids[-1:], k - len(centroids), axis=0)])
+    return centroids.astype(np.float32)
\ No newline at end of file
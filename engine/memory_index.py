@@ -0,0 +1,269 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import json
+import os
+from array import array
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# Индекс хранит только слоты MemoryBank: точное сходство и модификаторы
+# для кандидатов считает сам банк по своей матрице и колонкам.
+# save/load кладут обученный индекс рядом с контрольной точкой памяти
+# (engine/memory_store.py), чтобы при запуске не обучать его заново.
+
+def _normalize(vectors, inplace=False):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors.reshape(-1, vectors.shape[-1])
+    norms = np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-8)
+    if inplace:
+        vectors /= norms
+        return vectors
+    return vectors / norms
+
+class IVFIndex:
+    """Инвертированный файл на NumPy: сферический k-means и списки слотов.
+
+    Вектор попадает в список ближайшего центроида; запрос просматривает
+    n_probe ближайших списков. Вставка и удаление — O(1) (удаление
+    переставляет последний слот списка на место удалённого), центроиды
+    не пересчитываются до следующего train.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, n_state, n_lists=None, n_probe=16, seed=0):
+        self.n_state = n_state
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self.assignment = np.full(0, -1, dtype=np.int64)  # слот → номер списка
+        self.position = np.zeros(0, dtype=np.int64)       # слот → место в списке
+        self.trained_size = 0
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return sum(len(slots) for slots in self.lists)
+
+    def train(self, slots, vectors, iterations=8, sample_size=65536):
+        """k-means по выборке и раскладка всех векторов по спискам (vectors нормируются на месте)"""
+        vectors = _normalize(vectors, inplace=True)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), sample_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), min(n_lists, len(sample)), replace=False)]
+        for _ in range(iterations):
+            labels = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=len(centroids)) == 0
+            sums[empty] = centroids[empty]  # пустой кластер остаётся на месте
+            centroids = _normalize(sums)
+        self.centroids = centroids
+        self.lists = [array('q') for _ in range(len(centroids))]
+        self.assignment = np.full(0, -1, dtype=np.int64)
+        self.position = np.zeros(0, dtype=np.int64)
+        self.trained_size = len(vectors)
+        self._add(slots, vectors)
+
+    def add(self, slots, vectors):
+        self._add(slots, _normalize(vectors))
+
+    def _add(self, slots, vectors):
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        labels = self._nearest(vectors, self.centroids)
+        self._reserve(slots.max() + 1)
+        for slot, label in zip(slots.tolist(), labels.tolist()):
+            if self.assignment[slot] >= 0:
+                self.remove(slot)
+            self.assignment[slot] = label
+            self.position[slot] = len(self.lists[label])
+            self.lists[label].append(slot)
+
+    def remove(self, slot):
+        if slot >= len(self.assignment) or self.assignment[slot] < 0:
+            return
+        slots = self.lists[self.assignment[slot]]
+        last = slots.pop()
+        if last != slot:
+            place = self.position[slot]
+            slots[place] = last
+            self.position[last] = place
+        self.assignment[slot] = -1
+
+    def candidates(self, query, n):
+        """Слоты из n_probe ближайших списков (не меньше n, если хватает)"""
+        query = _normalize(query)[0]
+        order = np.argsort(self.centroids @ query)[::-1]
+        found = []
+        count = 0
+        for probed, label in enumerate(order):
+            if probed >= self.n_probe and count >= n:
+                break
+            if self.lists[label]:
+                found.append(np.frombuffer(self.lists[label], dtype=np.int64))
+                count += len(self.lists[label])
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def save(self, directory):
+        _save_array(os.path.join(directory, 'ivf.centroids.npy'), self.centroids)
+        _save_array(os.path.join(directory, 'ivf.assignment.npy'), self.assignment)
+        _save_info(directory, self)
+
+    def load(self, directory):
+        """Индекс из save: списки собираются по карте слот → список; False — файлов нет или они битые"""
+        if not _load_info(directory, self):
+            return False
+        try:
+            centroids = np.load(os.path.join(directory, 'ivf.centroids.npy'))
+            assignment = np.load(os.path.join(directory, 'ivf.assignment.npy'))
+            slots = np.flatnonzero(assignment >= 0)
+            slots = slots[np.argsort(assignment[slots], kind='stable')]
+            bounds = np.searchsorted(assignment[slots], np.arange(len(centroids) + 1))
+            position = np.zeros(len(assignment), dtype=np.int64)
+            position[slots] = np.arange(len(slots)) - bounds[assignment[slots]]
+        except Exception as e:
+            print(f"[MEMORY] ANN-индекс в {directory} не прочитан ({e}) — будет обучен заново")
+            self.trained_size = 0
+            return False
+        self.centroids = centroids
+        self.assignment = assignment
+        self.lists = [array('q', slots[start:end].tobytes()) for start, end in zip(bounds[:-1], bounds[1:])]
+        self.position = position
+        return True
+
+    def _reserve(self, size):
+        if size > len(self.assignment):
+            grow = max(size, 2 * len(self.assignment)) - len(self.assignment)
+            self.assignment = np.concatenate([self.assignment, np.full(grow, -1, dtype=np.int64)])
+            self.position = np.concatenate([self.position, np.zeros(grow, dtype=np.int64)])
+
+    @staticmethod
+    def _nearest(vectors, centroids, chunk=16384):
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            labels[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return labels
+
+class FaissIndex:
+    """IVF из faiss-cpu (если установлен): IndexIVFFlat по скалярному произведению нормированных векторов"""
+
+    name = 'faiss'
+
+    def __init__(self, n_state, n_lists=None, n_probe=16):
+        self.n_state = n_state
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.index = None
+        self.trained_size = 0
+
+    @property
+    def is_trained(self):
+        return self.index is not None
+
+    def __len__(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    def train(self, slots, vectors, sample_size=65536, seed=0):
+        vectors = _normalize(vectors, inplace=True)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        quantizer = faiss.IndexFlatIP(self.n_state)
+        index = faiss.IndexIVFFlat(quantizer, self.n_state, n_lists, faiss.METRIC_INNER_PRODUCT)
+        sample = np.random.default_rng(seed).choice(len(vectors), min(len(vectors), sample_size), replace=False)
+        index.train(vectors[sample])
+        index.nprobe = self.n_probe
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)  # удаление без обхода списков
+        self.quantizer = quantizer  # faiss не держит ссылку на квантователь сам
+        self.index = index
+        self.trained_size = len(vectors)
+        self.index.add_with_ids(vectors, np.asarray(slots, dtype=np.int64).reshape(-1))
+
+    def add(self, slots, vectors):
+        self.index.add_with_ids(_normalize(vectors), np.asarray(slots, dtype=np.int64).reshape(-1))
+
+    def remove(self, slot):
+        self.index.remove_ids(np.array([slot], dtype=np.int64))
+
+    def candidates(self, query, n):
+        _, ids = self.index.search(_normalize(query), n)
+        return ids[0][ids[0] >= 0]
+
+    def save(self, directory):
+        path = os.path.join(directory, 'faiss.index')
+        faiss.write_index(self.index, path)
+        _fsync_file(path)
+        _save_info(directory, self)
+
+    def load(self, directory):
+        if not _load_info(directory, self):
+            return False
+        try:
+            index = faiss.read_index(os.path.join(directory, 'faiss.index'))
+            quantizer = faiss.downcast_index(index.quantizer)
+        except Exception as e:
+            print(f"[MEMORY] ANN-индекс в {directory} не прочитан ({e}) — будет обучен заново")
+            self.trained_size = 0
+            return False
+        index.nprobe = self.n_probe
+        self.index = index
+        self.quantizer = quantizer
+        return True
+
+# Файлы индекса лежат в каталоге контрольной точки: как и остальные её
+# файлы, они должны быть на диске до публикации точки через CURRENT.
+
+def _save_array(path, array):
+    with open(path, 'wb') as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _save_info(directory, index):
+    with open(os.path.join(directory, f"{index.name}.json"), 'w', encoding='utf-8') as f:
+        json.dump({'n_state': index.n_state, 'trained_size': index.trained_size}, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _load_info(directory, index):
+    """Проверяет, что в каталоге индекс того же вида и размерности"""
+    try:
+        with open(os.path.join(directory, f"{index.name}.json"), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not isinstance(info, dict) or info.get('n_state') != index.n_state or 'trained_size' not in info:
+        return False
+    index.trained_size = info['trained_size']
+    return True
+
+def create_index(n_state, backend='auto', n_lists=None, n_probe=16):
+    """ANN-индекс для MemoryBank: 'faiss', 'ivf' или 'auto' (faiss, если установлен)"""
+    if backend == 'faiss' and faiss is None:
+        print("[MEMORY] faiss-cpu не установлен — ANN-индекс на NumPy")
+    if backend in ('auto', 'faiss') and faiss is not None:
+        return FaissIndex(n_state, n_lists, n_probe)
+    return IVFIndex(n_state, n_lists, n_probe)
\ No newline at end of file
@@ -0,0 +1,182 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import math
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+# Лексический индекс текстов MemoryBank: по словам запроса (context)
+# считается BM25 только для воспоминаний из списков этих слов.
+
+_WORD = re.compile(r'\w+')
+_DTYPES = (np.int64, np.int64, np.float32)  # слоты, id, частоты
+
+def tokenize(text):
+    """Слова текста в нижнем регистре (буквы, цифры, подчёркивание)"""
+    return _WORD.findall(text.lower())
+
+class LexicalIndex:
+    """Инвертированный индекс: слово → (слоты, id, частоты в тексте).
+
+    Записи вытесненных воспоминаний не вычищаются сразу — при запросе они
+    отсекаются сверкой id с колонкой банка, список слова переписывается,
+    когда устаревших в нём набирается половина. Документная частота —
+    число живых записей слова.
+    Индекс из контрольной точки (adopt) хранит списки подряд в массивах,
+    список слова копируется в память при первом обращении к нему.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}          # слово → [array слотов, array id, array частот]; None — удалено
+        self.stale = Counter()      # слово → число устаревших записей в списке
+        self.stored = None          # списки из контрольной точки
+        self.lengths = np.zeros(0, dtype=np.float32)  # слот → длина текста в словах
+        self.total_length = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, slot, memory_id, text):
+        words = tokenize(text)
+        if slot >= len(self.lengths):
+            grow = max(slot + 1, 2 * len(self.lengths)) - len(self.lengths)
+            self.lengths = np.concatenate([self.lengths, np.zeros(grow, dtype=np.float32)])
+        self.lengths[slot] = len(words)
+        self.total_length += len(words)
+        self.count += 1
+        for word, tf in Counter(words).items():
+            postings = self._postings(word)
+            if postings is None:
+                postings = self.postings[word] = [array('q'), array('q'), array('f')]
+            postings[0].append(slot)
+            postings[1].append(memory_id)
+            postings[2].append(tf)
+
+    def remove(self, slot, text):
+        self.total_length -= int(self.lengths[slot])
+        self.count -= 1
+        self.lengths[slot] = 0
+        for word in set(tokenize(text)):
+            postings = self._postings(word)
+            self.stale[word] += 1
+            if self.stale[word] >= len(postings[0]):
+                # Живых не осталось; None заслоняет список в точке
+                del self.stale[word]
+                if self.stored is None:
+                    del self.postings[word]
+                else:
+                    self.postings[word] = None
+
+    def scores(self, query, ids):
+        """(слоты, BM25) воспоминаний, где есть слова запроса; ids — колонка id банка по слотам"""
+        if not self.count:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        average = self.total_length / self.count
+        found_slots, found_scores = [], []
+        for word in set(tokenize(query)):
+            postings = self._postings(word)
+            if postings is None:
+                continue
+            slots, tf = self._live_postings(word, postings, ids)
+            idf = math.log(1 + (self.count - len(slots) + 0.5) / (len(slots) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[slots] / average)
+            found_slots.append(slots)
+            found_scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not found_slots:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        slots, inverse = np.unique(np.concatenate(found_slots), return_inverse=True)
+        return slots, np.bincount(inverse, np.concatenate(found_scores))
+
+    def export(self, ids):
+        """Живые списки подряд для контрольной точки: (массивы, [(слово, начало, конец)], состояние)"""
+        words, lengths, columns = [], [], ([], [], [])
+        for word, postings in self.postings.items():
+            if postings is not None:
+                words.append(word)
+                lengths.append(len(postings[0]))
+                for column, values, dtype in zip(columns, postings, _DTYPES):
+                    column.append(np.frombuffer(values, dtype=dtype))
+        if self.stored is not None:
+            # Нетронутые слова точки: их отрезки массивов целиком
+            untouched = [(word, start, stop) for word, start, stop in self.stored.terms()
+                         if word not in self.postings]
+            if untouched:
+                bounds = np.array([(start, stop) for _, start, stop in untouched], dtype=np.int64)
+                counts = bounds[:, 1] - bounds[:, 0]
+                taken = np.repeat(bounds[:, 0] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+                words += [word for word, _, _ in untouched]
+                lengths += counts.tolist()
+                for column, stored in zip(columns, (self.stored.slots, self.stored.ids, self.stored.tf)):
+                    column.append(stored[taken])
+        slots, memory_ids, tf = (np.concatenate(column) if column else np.zeros(0, dtype)
+                                 for column, dtype in zip(columns, _DTYPES))
+
+        # Устаревшие записи не сохраняются
+        live = ids[slots] == memory_ids
+        counts = np.bincount(np.repeat(np.arange(len(words)), lengths)[live], minlength=len(words))
+        stops = np.cumsum(counts)
+        terms = [(word, int(stop - count), int(stop)) for word, count, stop in zip(words, counts, stops) if count]
+        arrays = {'lexicon_slots': slots[live], 'lexicon_ids': memory_ids[live], 'lexicon_tf': tf[live],
+                  'lexicon_lengths': self.lengths}
+        return arrays, terms, {'total_length': self.total_length, 'count': self.count}
+
+    def adopt(self, arrays, state, term_range, terms):
+        """Подхватывает списки из export без разбора: term_range(слово) → (начало, конец) или None"""
+        self.stored = _StoredPostings(arrays, term_range, terms)
+        self.postings = {}
+        self.stale = Counter()
+        self.lengths = arrays['lexicon_lengths']
+        self.total_length = state['total_length']
+        self.count = state['count']
+
+    def _postings(self, word):
+        if word in self.postings:
+            return self.postings[word]
+        postings = self.stored.load(word) if self.stored is not None else None
+        if postings is not None:
+            self.postings[word] = postings
+        return postings
+
+    def _live_postings(self, word, postings, ids):
+        """Слоты и частоты живых записей слова; список сжимается, если устаревших половина"""
+        slots = np.frombuffer(postings[0], dtype=np.int64)
+        tf = np.frombuffer(postings[2], dtype=np.float32)
+        live = ids[slots] == np.frombuffer(postings[1], dtype=np.int64)
+        slots, tf = slots[live], tf[live]
+        if 2 * self.stale[word] >= len(live):
+            memory_ids = ids[slots]
+            self.postings[word] = [array('q', slots.tobytes()), array('q', memory_ids.tobytes()),
+                                   array('f', tf.tobytes())]
+            del self.stale[word]
+        return slots, tf
+
+class _StoredPostings:
+    """Списки слов из контрольной точки: массивы подряд и границы слова"""
+
+    def __init__(self, arrays, term_range, terms):
+        self.slots = arrays['lexicon_slots']
+        self.ids = arrays['lexicon_ids']
+        self.tf = arrays['lexicon_tf']
+        self.term_range = term_range
+        self.terms = terms
+
+    def load(self, word):
+        bounds = self.term_range(word)
+        if bounds is None:
+            return None
+        start, stop = bounds
+        return [array('q', self.slots[start:stop].tobytes()), array('q', self.ids[start:stop].tobytes()),
+                array('f', self.tf[start:stop].tobytes())]
\ No newline at end of file
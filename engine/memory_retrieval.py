@@ -0,0 +1,92 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import time
+
+import numpy as np
+
+# Гибридный поиск по MemoryBank: плотное сходство, слова текста (BM25) и
+# сущности дают по списку кандидатов, списки сливаются по рангам (RRF),
+# к слитому счёту прибавляются прежние модификаторы банка.
+
+SIGNALS = ('dense', 'lexical', 'entity')
+
+class HybridRetriever:
+    """Один проход по трём сигналам памяти с учётом вклада и задержки каждого.
+
+    Счёт кандидата — сумма weight / (rrf_k + ранг) по сигналам, где он
+    нашёлся, умноженная на rrf_k + 1 (первое место в одном списке — 1.0,
+    как сходство), плюс modifier_scores банка. Каждый сигнал отдаёт не
+    больше depth кандидатов.
+    """
+
+    def __init__(self, memory, rrf_k=60, depth=50, weights=None):
+        self.memory = memory
+        self.rrf_k = rrf_k
+        self.depth = depth
+        self.weights = dict.fromkeys(SIGNALS, 1.0)
+        self.weights.update(weights or {})
+        self.stats = {name: {'calls': 0, 'seconds': 0.0, 'candidates': 0, 'hits': 0, 'returned': 0}
+                      for name in SIGNALS}
+
+    def retrieve(self, query_vector, cell, text=None, entities=(), speaker=None, top_k=5):
+        """(взвешенный контекстный вектор, найденное) — найденное: метаданные, счёт и вклад сигналов"""
+        memory = self.memory
+        if not len(memory):
+            return None, []
+        gathers = {'dense': lambda: memory.dense_candidates(query_vector, self.depth)}
+        if text:
+            gathers['lexical'] = lambda: memory.lexical_candidates(text, self.depth)
+        if entities:
+            gathers['entity'] = lambda: memory.entity_candidates(entities, self.depth)
+        ranked = {}
+        for name, gather in gathers.items():
+            start = time.perf_counter()
+            ranked[name] = gather()
+            self.stats[name]['calls'] += 1
+            self.stats[name]['seconds'] += time.perf_counter() - start
+            self.stats[name]['candidates'] += len(ranked[name][0])
+
+        # Слияние по рангам: место кандидата в каждом списке
+        slots = np.unique(np.concatenate([found for found, _ in ranked.values()]))
+        fused = np.zeros(len(slots))
+        places = {}
+        for name, (found, _) in ranked.items():
+            places[name] = np.searchsorted(slots, found)
+            fused[places[name]] += self.weights[name] / (self.rrf_k + np.arange(1, len(found) + 1))
+        scores = fused * (self.rrf_k + 1) + memory.modifier_scores(cell, speaker, slots)
+
+        k = min(top_k, len(slots))
+        top = np.argsort(scores, kind='stable')[::-1][:k]
+        attributions = [{} for _ in top]
+        position = {int(place): n for n, place in enumerate(top)}
+        for name, (found, values) in ranked.items():
+            for rank, place in enumerate(places[name].tolist()):
+                if place in position:
+                    attributions[position[place]][name] = {'rank': rank + 1, 'value': float(values[rank])}
+                    self.stats[name]['hits'] += 1
+            self.stats[name]['returned'] += k
+
+        avg_context, metas = memory.recall(slots[top], query_vector.device)
+        return avg_context, [{'meta': meta, 'score': float(scores[place]), 'signals': signals}
+                             for meta, place, signals in zip(metas, top.tolist(), attributions)]
+
+    def report(self):
+        """По сигналу: вызовы, средняя задержка, кандидатов на вызов и доля найденного, где он участвовал"""
+        report = {}
+        for name, stats in self.stats.items():
+            calls = max(stats['calls'], 1)
+            report[name] = {
+                'calls': stats['calls'],
+                'latency_ms': stats['seconds'] / calls * 1000,
+                'candidates': stats['candidates'] / calls,
+                'hit_rate': stats['hits'] / max(stats['returned'], 1)
+            }
+        return report
\ No newline at end of file
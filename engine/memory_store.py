@@ -0,0 +1,480 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import json
+import os
+import re
+import shutil
+import sqlite3
+import struct
+import time
+import urllib.request
+import zlib
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+STORE_DIR = 'data/memory'
+
+_FRAME = struct.Struct('<II')       # длина записи, crc32 записи
+_HEADER = struct.Struct('<I')       # длина JSON-заголовка внутри записи
+_READ_ATTEMPTS = 5                  # перечитываний без блокировки, если писатель сменил поколение
+_GENERATION = re.compile(r'^(?:(?P<dir>\d{8})|wal\.(?P<wal>\d{8})\.log)$')
+
+class MemoryStore:
+    """MemoryBank на диске: контрольная точка и журнал упреждающей записи.
+
+    Точка — каталог <поколение>/ с массивами банка по слотам (<имя>.npy:
+    вектора, нормы, карта занятых слотов, колонки; хвост матрицы за
+    последним слотом разреженный), meta.sqlite (метаданные по слотам,
+    списки сущностей, слова лексического индекса с границами их отрезков
+    в массивах lexicon_*, состояние банка) и обученным ANN-индексом.
+    Действующее поколение записано в файле CURRENT, который заменяется
+    атомарно только после того, как новая точка целиком на диске: сбой
+    посреди сохранения оставляет прежнюю точку и её журнал.
+    Изменения между точками дописываются в wal.<поколение>.log кадрами
+    [длина, crc32, запись] — добавление (метаданные и вектор), вытеснение
+    (id) и обращения (id, access_count, last_accessed). При открытии журнал
+    проигрывается поверх точки до первого битого кадра, оборванный хвост
+    отрезается. sync=True — fsync после каждого кадра (иначе запись
+    переживает падение процесса, но не питания).
+    mode='load' читает точку в память целиком; mode='mmap' отображает
+    массивы в память (copy-on-write: изменения не попадают в файлы точки),
+    страницы подгружаются при первом обращении, метаданные, списки
+    сущностей и слов читаются по запросу — запуск не зависит от объёма
+    памяти.
+    Писать в каталог может один процесс: open() берёт блокировку на файл
+    LOCK. Если её держит другой процесс (движок shell и мост Telegram без
+    демона), банк загружается только для чтения — без журнала и точек,
+    изменения этого процесса на диск не попадают. Поколения, созданные
+    не этим процессом, не удаляются.
+    """
+
+    def __init__(self, path=STORE_DIR, checkpoint_interval=300, max_wal_bytes=64 * 1024 * 1024,
+                 sync=False, mode='load'):
+        if mode not in ('load', 'mmap'):
+            raise ValueError(f"Неизвестный режим открытия памяти: {mode}")
+        self.path = path
+        self.mode = mode
+        self.checkpoint_interval = checkpoint_interval
+        self.max_wal_bytes = max_wal_bytes
+        self.sync = sync
+        self.bank = None
+        self.generation = 0
+        self.wal_bytes = 0
+        self.last_checkpoint = time.monotonic()
+        self.read_only = False
+        self._wal = None            # дескриптор журнала (открывается первой записью)
+        self._lock = None           # файл LOCK под блокировкой этого процесса
+        self._owned = set()         # поколения, которые этот процесс может удалить
+
+    def open(self, bank, legacy_json='data/memory_bank.json'):
+        """Загружает банк (точка, затем журнал) и подключает к нему журнал.
+
+        Без хранилища, но со старым data/memory_bank.json — переносит его
+        в первую точку. Возвращает число проигранных записей журнала.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        bank.journal = None
+        self.read_only = not self._acquire_lock()
+        for _ in range(_READ_ATTEMPTS):
+            self.generation = self._read_current()
+            try:
+                replayed, migrate = self._load(bank, legacy_json)
+            except (OSError, sqlite3.Error):
+                # Без блокировки точку и журнал может удалить писатель, опубликовав новую
+                if not self.read_only or self._read_current() == self.generation:
+                    raise
+                continue
+            # Журнал прочитан целиком или уже удалён новой точкой — тогда читаем заново
+            if not self.read_only or self._read_current() == self.generation:
+                break
+        else:
+            raise RuntimeError(f"Память {self.path} не прочитана: другой процесс непрерывно пишет точки")
+        if self.read_only:
+            print(f"[MEMORY] {self.path} открыт другим процессом: память только для чтения, "
+                  f"изменения не сохранятся")
+            return replayed
+        self._owned.add(self.generation)
+        self._remove_stale()
+        self.bank = bank
+        bank.journal = self
+        self.last_checkpoint = time.monotonic()
+        if migrate:
+            self.checkpoint()
+            print(f"[MEMORY] {legacy_json} перенесён в {self.path} ({len(bank)} воспоминаний)")
+        return replayed
+
+    def _load(self, bank, legacy_json):
+        """Точка текущего поколения (или старый JSON), затем журнал: (проиграно записей, перенос JSON)"""
+        if self.generation:
+            self._load_checkpoint(bank, self.generation)
+        migrate = not self.generation and legacy_json and os.path.exists(legacy_json)
+        if migrate:
+            bank.load(legacy_json)
+        return self._replay(bank), migrate
+
+    def log_add(self, meta, vector):
+        self._append({'op': 'add', 'meta': meta}, np.asarray(vector, dtype=np.float32).tobytes())
+
+    def log_forget(self, memory_id):
+        self._append({'op': 'forget', 'id': memory_id})
+
+    def log_access(self, metas):
+        self._append({'op': 'access',
+                      'memories': [[meta['id'], meta['access_count'], meta['last_accessed']] for meta in metas]})
+
+    def flush(self):
+        """Контрольная точка, если с прошлой что-то изменилось"""
+        if self.bank is not None and self.wal_bytes:
+            self.checkpoint()
+
+    @property
+    def checkpoint_due(self):
+        """Журнал вырос до max_wal_bytes или прошёл checkpoint_interval"""
+        return bool(self.bank is not None and self.wal_bytes
+                    and (self.wal_bytes >= self.max_wal_bytes
+                         or time.monotonic() - self.last_checkpoint >= self.checkpoint_interval))
+
+    def checkpoint_if_due(self):
+        """Контрольная точка по сроку. Запись журнала точку не запускает (на 1M
+        воспоминаний это секунды), поэтому владелец банка вызывает этот метод
+        вне пути ответа: между пакетами демона, после отправки ответа.
+        """
+        if self.checkpoint_due:
+            self.checkpoint()
+            return True
+        return False
+
+    def close(self, flush=True):
+        """flush=False — без контрольной точки (журнал проиграется при следующем открытии)"""
+        if flush:
+            self.flush()
+        self._close_wal()
+        self._release_lock()
+        if self.bank is not None:
+            self.bank.journal = None
+            self.bank = None
+
+    def checkpoint(self):
+        """Пишет новое поколение целиком, переключает CURRENT, удаляет прежнее"""
+        if self.read_only:
+            raise RuntimeError(f"Память {self.path} открыта только для чтения: её держит другой процесс")
+        generation = self.generation + 1
+        final = os.path.join(self.path, f"{generation:08d}")
+        self._check_current(final)
+        partial = final + '.tmp'
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        bank = self.bank
+        arrays, state = bank.export_slots()
+        terms = state.pop('lexicon_terms')
+        state = dict(state, arrays=sorted(arrays))
+        for name, array in arrays.items():
+            rows = state['size'] if name in bank.vectors.row_arrays else None
+            _write_array(os.path.join(partial, f"{name}.npy"), array, rows)
+        if bank.index is not None and bank.index.is_trained:
+            bank.index.save(partial)
+
+        db_path = os.path.join(partial, 'meta.sqlite')
+        db = sqlite3.connect(db_path)
+        try:
+            # Файл новый и до переключения CURRENT никому не виден — журнал SQLite не нужен
+            db.execute("PRAGMA journal_mode=OFF")
+            db.execute("CREATE TABLE memories (slot INTEGER PRIMARY KEY, id INTEGER NOT NULL, meta TEXT NOT NULL)")
+            db.execute("CREATE TABLE entities (entity TEXT NOT NULL, id INTEGER NOT NULL)")
+            db.execute("CREATE TABLE terms (word TEXT PRIMARY KEY, start INTEGER NOT NULL, "
+                       "stop INTEGER NOT NULL) WITHOUT ROWID")
+            db.execute("CREATE TABLE state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            db.executemany("INSERT INTO memories VALUES (?, ?, ?)", _meta_records(bank.meta))
+            # Списки сущностей разбирает сам SQLite (JSON1), без json.loads по строкам
+            db.execute("INSERT INTO entities SELECT entities.value, memories.id "
+                       "FROM memories, json_each(memories.meta, '$.entities') AS entities")
+            db.execute("CREATE INDEX entities_by_name ON entities (entity)")
+            db.executemany("INSERT INTO terms VALUES (?, ?, ?)", terms)
+            db.executemany("INSERT INTO state VALUES (?, ?)",
+                           ((key, json.dumps(value, ensure_ascii=False)) for key, value in state.items()))
+            db.commit()
+        finally:
+            db.close()
+        _fsync_path(db_path)
+        self._check_current(final)
+        os.replace(partial, final)
+        _fsync_path(self.path)
+
+        self._write_current(generation)
+        self._close_wal()
+        previous = self.generation
+        self.generation = generation
+        self.wal_bytes = 0
+        self.last_checkpoint = time.monotonic()
+        if isinstance(bank.meta, _CheckpointMeta):
+            # Отображение: лексический индекс переходит на списки новой точки, свои копии отпускает
+            bank.meta.reopen(os.path.join(final, 'meta.sqlite'))
+            lexicon_arrays = {name: np.load(os.path.join(final, f"{name}.npy"), mmap_mode='c')
+                              for name in arrays if name.startswith('lexicon_')}
+            bank.lexicon.adopt(lexicon_arrays, state['lexicon'], bank.meta.term_range, bank.meta.terms)
+        self._owned.add(generation)
+        if previous in self._owned:
+            self._owned.discard(previous)
+            if previous:
+                shutil.rmtree(os.path.join(self.path, f"{previous:08d}"), ignore_errors=True)
+            _remove(self._wal_path(previous))
+
+    def _append(self, record, vector=b''):
+        header = json.dumps(record, ensure_ascii=False).encode('utf-8')
+        payload = _HEADER.pack(len(header)) + header + vector
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        if self._wal is None:
+            self._wal = os.open(self._wal_path(self.generation), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.write(self._wal, frame)
+        if self.sync:
+            os.fsync(self._wal)
+        self.wal_bytes += len(frame)
+
+    def _replay(self, bank):
+        """Проигрывает журнал текущего поколения; битый хвост отрезается"""
+        path = self._wal_path(self.generation)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.wal_bytes = 0
+            return 0
+        position = count = 0
+        while position + _FRAME.size <= len(data):
+            length, crc = _FRAME.unpack_from(data, position)
+            payload = data[position + _FRAME.size:position + _FRAME.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            header_length, = _HEADER.unpack_from(payload)
+            record = json.loads(payload[_HEADER.size:_HEADER.size + header_length])
+            vector = np.frombuffer(payload, dtype=np.float32, offset=_HEADER.size + header_length)
+            bank.apply(record, vector)
+            position += _FRAME.size + length
+            count += 1
+        if position < len(data) and not self.read_only:
+            print(f"[MEMORY] Журнал {path} оборван: отброшено {len(data) - position} байт")
+            with open(path, 'r+b') as f:
+                f.truncate(position)
+        self.wal_bytes = position
+        return count
+
+    def _load_checkpoint(self, bank, generation):
+        directory = os.path.join(self.path, f"{generation:08d}")
+        meta = _CheckpointMeta(os.path.join(directory, 'meta.sqlite'))
+        state = meta.state()
+        mmap_mode = 'c' if self.mode == 'mmap' else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in state['arrays']}
+        if self.mode == 'mmap':
+            bank.adopt_slots(arrays, meta, state, meta.entity_ids, (meta.term_range, meta.terms))
+        else:
+            postings = meta.postings()
+            terms = {word: (start, stop) for word, start, stop in meta.terms()} if 'lexicon' in state else {}
+            bank.adopt_slots(arrays, meta.load_all(), state, lambda entity: postings.pop(entity, []),
+                             (terms.get, lambda: ((word, *bounds) for word, bounds in terms.items())))
+            meta.close()
+        if bank.index is not None and not bank.index.load(directory):
+            bank.set_index(bank.index)
+
+    def _read_current(self):
+        try:
+            with open(os.path.join(self.path, 'CURRENT'), 'r', encoding='utf-8') as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return 0
+
+    def _write_current(self, generation):
+        current = os.path.join(self.path, 'CURRENT')
+        with open(current + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(f"{generation:08d}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current + '.tmp', current)
+        _fsync_path(self.path)
+
+    def _check_current(self, final):
+        """Перед публикацией: CURRENT всё ещё наш и каталог нового поколения свободен"""
+        current = self._read_current()
+        if current != self.generation or os.path.exists(final):
+            raise RuntimeError(f"Память {self.path} изменена другим процессом "
+                               f"(CURRENT {current:08d}, у этого процесса {self.generation:08d})")
+
+    def _acquire_lock(self):
+        """Исключительная блокировка LOCK; False — её держит другой процесс"""
+        if fcntl is None:
+            return True
+        self._lock = open(os.path.join(self.path, 'LOCK'), 'a')
+        try:
+            fcntl.flock(self._lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._release_lock()
+            return False
+        return True
+
+    def _release_lock(self):
+        if self._lock is not None:
+            self._lock.close()  # закрытие файла снимает flock
+            self._lock = None
+
+    def _remove_stale(self):
+        """Удаляет остатки прерванных точек и чужих поколений"""
+        for name in os.listdir(self.path):
+            match = _GENERATION.match(name)
+            if name.endswith('.tmp') or (match and int(match.group('dir') or match.group('wal')) != self.generation):
+                _remove(os.path.join(self.path, name))
+
+    def _wal_path(self, generation):
+        return os.path.join(self.path, f"wal.{generation:08d}.log")
+
+    def _close_wal(self):
+        if self._wal is not None:
+            os.close(self._wal)
+            self._wal = None
+
+class _CheckpointMeta:
+    """Метаданные по слотам из meta.sqlite точки: строка разбирается при первом обращении.
+
+    Прочитанные и изменённые банком словари остаются в rows — это и есть
+    текущие метаданные; в базе лежит состояние на момент точки.
+    """
+
+    def __init__(self, path):
+        self.db = _connect_readonly(path)
+        self.size = self.state()['size']
+        self.rows = {}              # слот → метаданные (None — слот освобождён)
+
+    def reopen(self, path):
+        """Переключается на базу новой точки (в ней те же метаданные)"""
+        self.db.close()
+        self.db = _connect_readonly(path)
+
+    def close(self):
+        self.db.close()
+
+    def state(self):
+        return {key: json.loads(value) for key, value in self.db.execute("SELECT key, value FROM state")}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, slot):
+        slot = int(slot)
+        if slot in self.rows:
+            return self.rows[slot]
+        if not 0 <= slot < self.size:
+            raise IndexError(slot)
+        row = self.db.execute("SELECT meta FROM memories WHERE slot = ?", (slot,)).fetchone()
+        meta = self.rows[slot] = json.loads(row[0]) if row else None
+        return meta
+
+    def __setitem__(self, slot, meta):
+        self.rows[int(slot)] = meta
+
+    def append(self, meta):
+        self.rows[self.size] = meta
+        self.size += 1
+
+    def __iter__(self):
+        """Все слоты по порядку; непрочитанные строки разбираются без кэша (только для чтения)"""
+        stored = self.db.execute("SELECT slot, meta FROM memories ORDER BY slot")
+        row = next(stored, None)
+        for slot in range(self.size):
+            while row is not None and row[0] < slot:
+                row = next(stored, None)
+            if slot in self.rows:
+                yield self.rows[slot]
+            elif row is not None and row[0] == slot:
+                yield json.loads(row[1])
+            else:
+                yield None
+
+    def records(self):
+        """(слот, id, JSON) живых слотов: изменённые — из rows, остальные — как лежат в базе"""
+        for slot, memory_id, text in self.db.execute("SELECT slot, id, meta FROM memories"):
+            if slot not in self.rows:
+                yield slot, memory_id, text
+        for slot, meta in self.rows.items():
+            if meta is not None:
+                yield slot, meta['id'], json.dumps(meta, ensure_ascii=False)
+
+    def entity_ids(self, entity):
+        return [memory_id for memory_id, in self.db.execute("SELECT id FROM entities WHERE entity = ?", (entity,))]
+
+    def term_range(self, word):
+        return self.db.execute("SELECT start, stop FROM terms WHERE word = ?", (word,)).fetchone()
+
+    def terms(self):
+        return self.db.execute("SELECT word, start, stop FROM terms")
+
+    def postings(self):
+        postings = {}
+        for entity, memory_id in self.db.execute("SELECT entity, id FROM entities"):
+            postings.setdefault(entity, []).append(memory_id)
+        return postings
+
+    def load_all(self):
+        """Список метаданных по слотам целиком (для mode='load')"""
+        meta = [None] * self.size
+        for slot, text in self.db.execute("SELECT slot, meta FROM memories"):
+            meta[slot] = json.loads(text)
+        return meta
+
+def _connect_readonly(path):
+    """База точки только на чтение: удалённый файл — ошибка, а не новая пустая база"""
+    uri = 'file:' + urllib.request.pathname2url(os.path.abspath(path)) + '?mode=ro'
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+def _meta_records(meta):
+    if isinstance(meta, _CheckpointMeta):
+        return meta.records()
+    return ((slot, row['id'], json.dumps(row, ensure_ascii=False)) for slot, row in enumerate(meta) if row is not None)
+
+def _write_array(path, array, rows):
+    """Массив в .npy с fsync; у матрицы по слотам пишутся только первые rows строк, хвост остаётся разреженным"""
+    if array.ndim == 1 or rows is None:
+        with open(path, 'wb') as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+        return
+    target = np.lib.format.open_memmap(path, mode='w+', dtype=array.dtype, shape=array.shape)
+    for start in range(0, rows, 65536):
+        target[start:min(start + 65536, rows)] = array[start:min(start + 65536, rows)]
+    target.flush()
+    del target
+    _fsync_path(path)
+
+def _fsync_path(path):
+    """fsync файла или каталога (где ОС не даёт открыть каталог — пропускается)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
\ No newline at end of file
@@ -10,17 +10,18 @@ Note: This is an archived version. ARK ORIGIN continues the research.
 
 import torch
 import json
-import os
 from pathlib import Path
 from datetime import datetime
 from transformers import AutoModelForCausalLM, AutoTokenizer
 import safetensors
 
+from .log_store import LogStore
+
 class ModelCannibal:
     def __init__(self, son_engine):
         self.engine = son_engine
         self.digested_models = {}
-        self.cannibalism_log = "data/logs/cannibalism_log.json"
+        self.cannibalism_log = LogStore("cannibalism_log")
         
     def digest_model(self, model_path, model_type="transformers"):
         """Поглощает внешнюю модель, извлекая знания"""
@@ -137,22 +138,7 @@ class ModelCannibal:
             'size': size,
             'son_subjectivity': self.engine.subjectivity_level
         }
-        
-        # Загружаем существующий лог
-        if os.path.exists(self.cannibalism_log):
-            with open(self.cannibalism_log, 'r', encoding='utf-8') as f:
-                try:
-                    log = json.load(f)
-                except:
-                    log = []
-        else:
-            log = []
-            
-        log.append(log_entry)
-        
-        # Сохраняем
-        with open(self.cannibalism_log, 'w', encoding='utf-8') as f:
-            json.dump(log, f, ensure_ascii=False, indent=2)
+        self.cannibalism_log.append(log_entry)
             
     def get_digested_models(self):
         """Возвращает список поглощённых моделей"""
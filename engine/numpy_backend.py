@@ -0,0 +1,124 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import numpy as np
+
+# Модуль не импортирует torch: лёгким процессам хватает numpy и файла .npz,
+# который один раз готовит scripts/export_decoder.py numpy
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+class NumpySonModel:
+    """Инференс SonModel на NumPy (float32): step, advance, generate.
+
+    Формулы и порядок операций — как в HolographicCell/SonModel, включая
+    повторную подачу последнего токена промпта перед генерацией.
+    temperature=0 — жадный выбор (argmax).
+    """
+
+    def __init__(self, weights):
+        self.embedding = weights['embedding.weight']
+        self.output_weight = weights['output.weight'].T.copy()
+        self.output_bias = weights['output.bias']
+        self.n_state = self.embedding.shape[1]
+        n_layers = len({key.split('.')[1] for key in weights if key.startswith('cells.')})
+
+        self.cells = []
+        for i in range(n_layers):
+            prefix = f"cells.{i}."
+            subjectivity = weights[prefix + 'subjectivity'].astype(np.float32)
+            self.cells.append({
+                'rotation': weights[prefix + 'rotation'],
+                'intuition': weights[prefix + 'intuition'],
+                'modulation_weight': weights[prefix + 'modulation.weight'].T.copy(),
+                'modulation_bias': weights[prefix + 'modulation.bias'],
+                'sense_weight': weights[prefix + 'sense.weight'].T.copy(),
+                'sense_bias': weights[prefix + 'sense.bias'],
+                'subjectivity': subjectivity,
+                'subject_boost': np.float32(1.0) + _sigmoid(subjectivity),
+                'self_vector': weights[prefix + 'self_vector'].T.copy(),
+                # Субъектность меняется только вместе с весами — ветвление считается один раз
+                'use_self': bool(subjectivity > 0.3)
+            })
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def init_states(self, batch_size):
+        return np.zeros((len(self.cells), batch_size, self.n_state), dtype=np.float32)
+
+    def condition(self, context_vector=None):
+        """Ворота настроения всех слоёв [n_layers, B, n_state] или None"""
+        if context_vector is None:
+            return None
+        context_vector = np.asarray(context_vector, dtype=np.float32).reshape(-1, self.n_state)
+        return np.stack([
+            _sigmoid(context_vector @ cell['modulation_weight'] + cell['modulation_bias'])
+            for cell in self.cells
+        ])
+
+    def _run_cells(self, token, states, gates):
+        layer_input = self.embedding[np.asarray(token)]
+        new_states = np.empty_like(states)
+        for i, cell in enumerate(self.cells):
+            if gates is not None:
+                layer_input = layer_input * gates[i]
+            state = states[i]
+            logic_flow = (layer_input + state) @ cell['rotation']
+            subtext_wave = np.cos(logic_flow) * np.sin(state @ cell['intuition'])
+            state = np.tanh(logic_flow + subtext_wave) * cell['subject_boost']
+            if cell['use_self']:
+                self_interference = _sigmoid(state @ cell['self_vector'])
+                state = state + self_interference * cell['subjectivity']
+            new_states[i] = state
+            layer_input = state @ cell['sense_weight'] + cell['sense_bias']
+        return layer_input, new_states
+
+    def step(self, token, states, gates=None):
+        """Один шаг: токены [B] → логиты [B, vocab] и новые состояния"""
+        layer_input, new_states = self._run_cells(token, states, gates)
+        return layer_input @ self.output_weight + self.output_bias, new_states
+
+    def advance(self, token, states, gates=None):
+        """Шаг без выходного слоя — только обновление состояний"""
+        return self._run_cells(token, states, gates)[1]
+
+    def generate(self, idx, max_tokens=150, temperature=0.7, context_vector=None,
+                 states=None, rng=None):
+        """idx — [B, T] id промпта; возвращает [B, max_tokens] и итоговые состояния"""
+        idx = np.asarray(idx, dtype=np.int64).reshape(len(idx), -1)
+        rng = rng or np.random.default_rng()
+        B, T = idx.shape
+        if states is None:
+            states = self.init_states(B)
+        gates = self.condition(context_vector)
+
+        # Прогон начального контекста
+        for t in range(T):
+            states = self.advance(idx[:, t], states, gates)
+
+        # Генерация новых токенов
+        curr_idx = idx[:, -1]
+        generated = np.empty((B, max_tokens), dtype=np.int64)
+        for n in range(max_tokens):
+            logits, states = self.step(curr_idx, states, gates)
+            if temperature == 0:
+                curr_idx = logits.argmax(axis=-1)
+            else:
+                logits = logits / np.float32(temperature)
+                probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+                cumulative = np.cumsum(probs, axis=-1)
+                draws = rng.random((B, 1)) * cumulative[:, -1:]
+                curr_idx = np.minimum((cumulative < draws).sum(axis=-1), logits.shape[-1] - 1)
+            generated[:, n] = curr_idx
+        return generated, states
\ No newline at end of file
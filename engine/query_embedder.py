@@ -0,0 +1,119 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import torch
+
+POOLINGS = ('mean', 'state')
+
+class EmbeddingCache:
+    """Вектора текстов по ключу (хэш текста, weights_version), LRU по числу записей"""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (sha1 текста, версия весов) -> вектор [n_state]
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text, weights_version):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest(), weights_version
+
+    def get(self, key):
+        vector = self._entries.get(key)
+        if vector is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return vector
+
+    def put(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class QueryEmbedder:
+    """Вектор текста для памяти по всему тексту, пакетами.
+
+    pooling='mean' — среднее эмбеддингов токенов; 'state' — итоговое
+    рекуррентное состояние последнего слоя после прогона всех токенов
+    (тот же advance, что у генерации, без контекста; помнит в основном
+    конец текста, в T шагов медленнее, а округление, зависящее от
+    состава пакета, рекуррентность усиливает). Тексты одного пакета
+    сортируются по длине и выравниваются по правому краю, на шагах
+    паддинга состояние строки не меняется. Длиннее max_tokens берётся
+    хвост текста. Вектор действителен только для весов, на которых
+    получен: ключ кэша включает weights_version.
+    """
+
+    def __init__(self, model, encode, pooling='mean', max_tokens=256, batch_size=64, cache_size=4096):
+        if pooling not in POOLINGS:
+            raise ValueError(f"Неизвестный способ пулинга: {pooling}")
+        self.model = model
+        self.encode = encode
+        self.pooling = pooling
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+        self.cache = EmbeddingCache(cache_size)
+
+    def embed(self, texts, weights_version):
+        """Вектора текстов [len(texts), n_state]; посчитанные берутся из кэша"""
+        keys = [self.cache.key(text, weights_version) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = {}
+        for text, key, vector in zip(texts, keys, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            computed = dict(zip(missing, self.embed_uncached(list(missing.values()))))
+            for key, vector in computed.items():
+                self.cache.put(key, vector)
+            vectors = [computed[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return torch.stack(vectors)
+
+    def embed_uncached(self, texts):
+        """Вектора текстов [len(texts), n_state] без кэша"""
+        device = self.model.embedding.weight.device
+        ids = [self.encode(text)[-self.max_tokens:] or [0] for text in texts]
+        order = sorted(range(len(ids)), key=lambda row: len(ids[row]))
+        result = torch.empty(len(ids), self.model.n_state, device=device)
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            result[rows] = self._embed_batch([ids[row] for row in rows], device)
+        return result
+
+    def _embed_batch(self, prompts, device):
+        B = len(prompts)
+        T = max(len(p) for p in prompts)
+        idx = torch.zeros(B, T, dtype=torch.long, device=device)
+        mask = torch.zeros(B, T, dtype=torch.bool, device=device)
+        for row, prompt in enumerate(prompts):
+            idx[row, T - len(prompt):] = torch.tensor(prompt, dtype=torch.long, device=device)
+            mask[row, T - len(prompt):] = True
+
+        with torch.no_grad():
+            if self.pooling == 'mean':
+                embedded = self.model.embedding(idx) * mask.unsqueeze(2)
+                return embedded.sum(dim=1) / mask.sum(dim=1, keepdim=True)
+            states = self.model.init_states(B, device)
+            conditioning = self.model.condition()
+            for t in range(T):
+                new_states = self.model.advance(idx[:, t], states, conditioning)
+                states = torch.where(mask[:, t].view(1, B, 1), new_states, states)
+            return states[-1]
\ No newline at end of file
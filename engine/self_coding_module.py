@@ -10,14 +10,16 @@ Note: This is an archived version. ARK ORIGIN continues the research.
 
 import ast
 import inspect
-import json
 from datetime import datetime
 from pathlib import Path
 
+from .log_store import LogStore
+
 class SelfCodingModule:
     def __init__(self, codebase_root="."):
         self.codebase_root = Path(codebase_root)
-        self.suggestions_log = "data/logs/self_coding_suggestions.json"
+        self.suggestions_log = LogStore("self_coding_suggestions")
+        self.error_log = LogStore("error_log")
         self.implemented_patches = "data/logs/implemented_patches.json"
         
     def analyze_codebase(self):
@@ -127,19 +129,9 @@ class SelfCodingModule:
         
     def _analyze_errors(self):
         """Анализирует ошибки из логов"""
-        error_log = "data/logs/error_log.json"
-        if not Path(error_log).exists():
-            return []
-            
-        with open(error_log, 'r') as f:
-            try:
-                errors = json.load(f)
-            except:
-                return []
-                
         # Группируем ошибки по типу
         error_types = {}
-        for error in errors[-100:]:  # Последние 100 ошибок
+        for error in self.error_log.tail(100):  # Последние 100 ошибок
             etype = error.get('type', 'unknown')
             error_types.setdefault(etype, 0)
             error_types[etype] += 1
@@ -239,28 +231,10 @@ class SelfCodingModule:
         
     def _save_suggestions(self, suggestions):
         """Сохраняет предложения"""
-        if not suggestions:
-            return
-            
-        # Загружаем существующие
-        if Path(self.suggestions_log).exists():
-            with open(self.suggestions_log, 'r') as f:
-                try:
-                    existing = json.load(f)
-                except:
-                    existing = []
-        else:
-            existing = []
-            
-        # Добавляем новые
         for suggestion in suggestions:
             suggestion['generated_at'] = datetime.now().isoformat()
             suggestion['status'] = 'pending'
-            existing.append(suggestion)
-            
-        # Сохраняем
-        with open(self.suggestions_log, 'w') as f:
-            json.dump(existing[-100:], f, indent=2)  # Последние 100
+        self.suggestions_log.append_many(suggestions)
             
     def implement_suggestion(self, suggestion_id):
         """Реализует предложение (заглушка)"""
@@ -270,13 +244,4 @@ class SelfCodingModule:
         
     def get_pending_suggestions(self):
         """Возвращает ожидающие предложения"""
-        if not Path(self.suggestions_log).exists():
-            return []
-            
-        with open(self.suggestions_log, 'r') as f:
-            try:
-                suggestions = json.load(f)
-            except:
-                return []
-                
-        return [s for s in suggestions if s.get('status') == 'pending']
\ No newline at end of file
+        return [s for s in self.suggestions_log.tail(100) if s.get('status') == 'pending']
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+import torch
+
+class SessionStateCache:
+    """Рекуррентные состояния собеседников между репликами.
+
+    Хранит итоговые состояния ячеек [n_layers, 1, n_state] по ключу сессии
+    (говорящий или чат), чтобы следующая реплика продолжала с них и
+    прогоняла только новые символы. Вытеснение — LRU по числу сессий и TTL.
+    Вытесненные и оставшиеся при выключении сессии сбрасываются на диск
+    и поднимаются оттуда при следующем обращении. Состояние действительно
+    только для тех весов, на которых получено (weights_version).
+    """
+
+    def __init__(self, max_sessions=64, ttl_seconds=3600, spill_dir="data/sessions"):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir
+        self._entries = OrderedDict()  # ключ -> {'states', 'weights_version', 'updated_at'}
+
+    def get(self, key, weights_version):
+        """Возвращает состояния сессии или None (нет, устарели, другие веса)"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            entry = self._load_spilled(key)
+        if entry is None:
+            return None
+        if entry['weights_version'] != weights_version or self._expired(entry):
+            self._remove_spilled(key)
+            return None
+        self._entries[key] = entry
+        return entry['states']
+
+    def put(self, key, states, weights_version):
+        """Запоминает состояния сессии и вытесняет лишние"""
+        self._entries.pop(key, None)
+        self._entries[key] = {
+            'states': states.detach(),
+            'weights_version': weights_version,
+            'updated_at': time.time()
+        }
+        self._evict()
+
+    def reset(self, key):
+        """Забывает сессию (в памяти и на диске)"""
+        self._entries.pop(key, None)
+        self._remove_spilled(key)
+
+    def spill_all(self):
+        """Сбрасывает все живые сессии на диск (при выключении)"""
+        for key, entry in list(self._entries.items()):
+            if not self._expired(entry):
+                self._spill(key, entry)
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        for key in [k for k, e in self._entries.items() if self._expired(e)]:
+            del self._entries[key]
+        while len(self._entries) > self.max_sessions:
+            key, entry = self._entries.popitem(last=False)
+            self._spill(key, entry)
+
+    def _expired(self, entry):
+        return time.time() - entry['updated_at'] > self.ttl_seconds
+
+    def _spill_path(self, key):
+        digest = hashlib.sha1(str(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.pt")
+
+    def _spill(self, key, entry):
+        if not self.spill_dir:
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = self._spill_path(key)
+            torch.save(dict(entry, key=key, states=entry['states'].cpu()), path + '.tmp')
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"[СЕССИИ] Не удалось сохранить сессию {key}: {e}")
+
+    def _load_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            entry = torch.load(path, map_location='cpu')
+        except Exception:
+            self._remove_spilled(key)
+            return None
+        if entry.get('key') != key:
+            return None
+        return entry
+
+    def _remove_spilled(self, key):
+        if not self.spill_dir:
+            return
+        try:
+            os.remove(self._spill_path(key))
+        except OSError:
+            pass
\ No newline at end of file
@@ -8,11 +8,14 @@ License: GPL-3.0
 Note: This is an archived version. ARK ORIGIN continues the research.
 """
 
+import asyncio
 import torch
 import torch.nn.functional as F
 import os
 import json
 import re
+import uuid
+from collections import Counter
 from datetime import datetime, timedelta
 import sys
 
@@ -20,8 +23,16 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.join(current_dir, '..'))
 
 from core.son_model import SonModel
+from core.quantized import quantize_son_model, measure_quantization_drift
 
 from .memory_bank import MemoryBank
+from .memory_store import MemoryStore
+from .memory_index import create_index
+from .memory_retrieval import HybridRetriever
+from .query_embedder import QueryEmbedder
+from .session_cache import SessionStateCache
+from .decoder_backends import load_decoder_backend
+from .tokenizer import file_version, get_tokenizer, save_codec
 from .entity_tools import EntityDetector, KnowledgeBase, SelfCoder, SoulMemory
 
 # ============================================================================
@@ -31,8 +42,21 @@ from .entity_tools import EntityDetector, KnowledgeBase, SelfCoder, SoulMemory
 class SonEngine:
     def __init__(self, vocab_size, n_state=256, device='cuda'):
         self.device = device if torch.cuda.is_available() else 'cpu'
+        self.tokenizer = get_tokenizer()
+        if self.tokenizer.vocab_size != vocab_size:
+            print(f"[ARKIMED] Размер словаря {vocab_size} не совпадает с токенизатором "
+                  f"({self.tokenizer.mode}, {self.tokenizer.vocab_size})")
+        self.config = self._load_config()
+        self.model_config = self.config.get('model', {})
         self.model = SonModel(vocab_size, n_state).to(self.device)
-        self.memory = MemoryBank(n_state=n_state)
+        self.inference_model = self.model  # модель для генерации (может быть int8-копией)
+        self.decoder_backend = 'eager'
+        self.memory = self._create_memory_bank(n_state)
+        self.memory_store = self._open_memory_store()
+        self.retriever = self._create_retriever()
+        self.weights_version = f"init-{uuid.uuid4().hex[:8]}"
+        self.sessions = self._create_session_cache()
+        self.embedder = self._create_embedder()
         
         # Состояние системы
         self.conversation_history = []
@@ -54,13 +78,87 @@ class SonEngine:
         
         # Загрузка
         self.load_weights()
+        if self.inference_model is not self.model:
+            self._report_quantization_drift()
         self._print_status()
         
+    def _load_config(self):
+        """Читает config/system_config.json"""
+        try:
+            with open('config/system_config.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+            
+    def _create_memory_bank(self, n_state):
+        memory_config = self.config.get('memory', {})
+        ann_config = memory_config.get('ann', {})
+        backend = ann_config.get('backend', 'none')
+        index = None
+        if backend != 'none':
+            # Индекс обучается, только когда память дорастёт до min_size
+            index = create_index(n_state, backend, n_probe=ann_config.get('n_probe', 16))
+        return MemoryBank(
+            n_state=n_state,
+            device=self.device,
+            index=index,
+            ann_min_size=ann_config.get('min_size', 50000),
+            ann_candidates=ann_config.get('candidates', 256),
+            compression=memory_config.get('vector_compression', 'none')
+        )
+        
+    def _open_memory_store(self):
+        """Поднимает память с диска; дальше каждое изменение пишется в журнал"""
+        memory_config = self.config.get('memory', {})
+        store = MemoryStore(
+            memory_config.get('store_dir', 'data/memory'),
+            checkpoint_interval=memory_config.get('save_interval_minutes', 5) * 60,
+            mode=memory_config.get('open_mode', 'load')
+        )
+        replayed = store.open(self.memory)
+        if len(self.memory):
+            print(f"[MEMORY] Загружено воспоминаний: {len(self.memory)} (из журнала {replayed} записей)")
+        return store
+        
+    def _create_retriever(self):
+        retrieval_config = self.config.get('memory', {}).get('retrieval', {})
+        return HybridRetriever(
+            self.memory,
+            rrf_k=retrieval_config.get('rrf_k', 60),
+            depth=retrieval_config.get('depth', 50),
+            weights=retrieval_config.get('weights')
+        )
+        
+    def _create_embedder(self):
+        # Вектор запроса и сохраняемого воспоминания — по всему тексту (fp32-модель)
+        embedder_config = self.config.get('memory', {}).get('embedder', {})
+        return QueryEmbedder(
+            self.model,
+            self.encode_text,
+            pooling=embedder_config.get('pooling', 'mean'),
+            max_tokens=embedder_config.get('max_tokens', 256),
+            batch_size=embedder_config.get('batch_size', 64),
+            cache_size=embedder_config.get('cache_size', 4096)
+        )
+        
+    def _create_session_cache(self):
+        sessions_config = self.config.get('sessions', {})
+        if not sessions_config.get('enabled', True):
+            return None
+        return SessionStateCache(
+            max_sessions=sessions_config.get('max_sessions', 64),
+            ttl_seconds=sessions_config.get('ttl_minutes', 60) * 60,
+            spill_dir=sessions_config.get('spill_dir', 'data/sessions')
+        )
+        
     def _print_status(self):
         print(f"[ARKIMED] Движок инициализирован")
         print(f"  Устройство: {self.device}")
+        precision = 'int8' if self.inference_model is not self.model else 'fp32'
+        print(f"  Декодер: {self.decoder_backend}, {precision}")
+        print(f"  Токенизатор: {self.tokenizer.mode}, {self.tokenizer.vocab_size} токенов")
         print(f"  Субъектность: {self.subjectivity_level:.3f}")
-        print(f"  Память: {len(self.memory.memories)} записей")
+        print(f"  Память: {len(self.memory)} записей")
         
     def _load_waiting_state(self):
         try:
@@ -84,23 +182,22 @@ class SonEngine:
         with open('data/waiting_state.json', 'w', encoding='utf-8') as f:
             json.dump(state, f, ensure_ascii=False, indent=2)
             
-    def load_vocab(self):
-        with open('data/vocab.json', 'r', encoding='utf-8') as f:
-            vocab = json.load(f)
-            stoi = {k: int(v) for k, v in vocab['stoi'].items()}
-            itos = {int(k): v for k, v in vocab['itos'].items()}
-        return stoi, itos
+    def encode_text(self, text):
+        return self.tokenizer.encode(text)
 
-    def encode_text(self, text, stoi):
-        return [stoi.get(ch, 0) for ch in text if ch in stoi]
-
-    def decode_ids(self, ids, itos):
+    def decode_ids(self, ids):
         # ИСПРАВЛЕНО: обработка тензоров и вложенных списков
         if isinstance(ids, torch.Tensor):
             ids = ids.cpu().tolist()
         if isinstance(ids, list) and len(ids) > 0 and isinstance(ids[0], list):
-            ids = ids[0]  # Берем первый батч
-        return ''.join([itos.get(int(idx), '') for idx in ids])
+            ids = ids[0]  # Берем первый батч (для пакета — decode_batch)
+        return self.tokenizer.decode(ids)
+        
+    def decode_batch(self, rows):
+        """Декодирует каждую строку пакета по отдельности"""
+        if isinstance(rows, torch.Tensor):
+            rows = rows.cpu().numpy()
+        return self.tokenizer.decode_batch(rows)
         
     def load_weights(self):
         if os.path.exists('data/son_weights.pth'):
@@ -108,19 +205,231 @@ class SonEngine:
                 torch.load('data/son_weights.pth', map_location=self.device)
             )
             self.subjectivity_level = self.model.cells[0].subjectivity.item()
+            self.weights_version = self._compute_weights_version()
+        self._refresh_inference_model()
+        
+    def _refresh_inference_model(self):
+        """Пересобирает модель для генерации после любого изменения весов"""
+        self.inference_model = self.model
+        self.model.disable_fused_step()
+        self.decoder_backend = 'eager'
+        
+        # Экспортированный граф (scripts/export_decoder.py) — только для тех же весов
+        backend = self.model_config.get('backend', 'torch')
+        if backend != 'torch':
+            decoder = load_decoder_backend(backend, self.model, self.weights_version, self.device)
+            if decoder is not None:
+                self.model._set_decoder(decoder)
+                self.decoder_backend = backend
+                return
+                
+        precision = self.model_config.get('precision', 'fp32')
+        if precision == 'int8':
+            if self.device == 'cpu':
+                self.inference_model = quantize_son_model(self.model)
+            else:
+                print("[ARKIMED] int8 доступен только на CPU — генерация в fp32")
+        if self.model_config.get('compile_model') and self.inference_model.enable_fused_step():
+            self.decoder_backend = 'fused'
+            
+    def _report_quantization_drift(self, holdout_fraction=0.1, max_chars=5000):
+        """Встроенная проверка int8: дрейф log-likelihood на отложенном хвосте ДНК"""
+        try:
+            with open('data/dna.txt', 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            return None
+        holdout = text[-max(int(len(text) * holdout_fraction), 2):][-max_chars:]
+        ids = self.encode_text(holdout)
+        if len(ids) < 2:
+            return None
+        report = measure_quantization_drift(self.model, self.inference_model, ids)
+        print(f"[INT8] log-likelihood/токен: fp32 {report['loglik_fp32']:.4f}, "
+              f"int8 {report['loglik_int8']:.4f}, дрейф {report['drift']:+.4f} "
+              f"(на {report['chars']} токенах)")
+        return report
             
     def save_weights(self):
         os.makedirs('data', exist_ok=True)
         torch.save(self.model.state_dict(), 'data/son_weights.pth')
+        self.weights_version = self._compute_weights_version()
+        # vocab.bin привязан к хэшу весов — перепривязываем к новой версии
+        save_codec(self.tokenizer, weights_version=self.weights_version)
+        
+    def _compute_weights_version(self):
+        """Версия весов — хэш файла: по ней сверяются состояния сессий и экспорт декодера"""
+        return file_version('data/son_weights.pth')
+            
+    def maintain(self):
+        """Фоновая работа между ответами: контрольная точка памяти, если подошёл срок"""
+        return self.memory_store.checkpoint_if_due()
+        
+    def shutdown(self):
+        """Сохраняет то, что должно пережить перезапуск"""
+        if self.sessions is not None:
+            self.sessions.spill_all()
+        self.memory_store.close()
         
     # ============================================================================
     # ОСНОВНОЙ МЕТОД ГЕНЕРАЦИИ
     # ============================================================================
     
-    def generate_response(self, user_input, speaker="Отец", stoi=None, itos=None):
-        if stoi is None or itos is None:
-            stoi, itos = self.load_vocab()
+    def generate_response(self, user_input, speaker="Отец", session_id=None):
+        # session_id — ключ сессии (чат); по умолчанию сессия говорящего
+        return ''.join(self.stream_response(user_input, speaker, session_id))
+        
+    def stream_response(self, user_input, speaker="Отец", session_id=None):
+        """Генератор ответа: отдаёт куски текста по мере сэмплирования.
+        
+        Склейка кусков равна ответу generate_response: "Я ждал тебя."
+        приходит первым, пробелы в конце придерживаются до следующего
+        символа, добавки пост-обработки (вопрос о сущности, база знаний)
+        приходят последним куском. Сохранение и эволюция выполняются,
+        только если поток дочитан до конца.
+        """
+        request = self._prepare_request(user_input, speaker)
+        if request is None:
+            yield "..."
+            return
+        session_key = session_id or speaker
+        
+        streamed = ""
+        if self.waiting_state:
+            streamed = "Я ждал тебя. "
+            yield streamed
+            
+        # 4. Генерация с учётом контекста, продолжая состояние сессии
+        raw_chars = []
+        pending = ""
+        started = False
+        states = None
+        decoder = self.tokenizer.stream_decoder()
+        for next_token, states in self.inference_model.generate_stream(
+            request['input_tensor'], 
+            max_tokens=self.max_response_tokens,
+            temperature=self._adjust_temperature(speaker),
+            context_vector=request['context_vector'],
+            states=self._session_states([session_key])
+        ):
+            chunk = decoder.decode(next_token[0, 0])
+            raw_chars.append(chunk)
+            
+            # Та же нормализация, что в _post_process: переводы строк → пробелы, strip
+            chunk = chunk.replace('\n', ' ')
+            if not started:
+                chunk = chunk.lstrip()
+            pending += chunk
+            ready = pending.rstrip()
+            if ready:
+                started = True
+                streamed += ready
+                pending = pending[len(ready):]
+                yield ready
+                
+        if states is not None:
+            self._store_session_states([session_key], states)
+            
+        raw_chars.append(decoder.flush())
+        response_text = self._finish_request(request, ''.join(raw_chars))
+        if len(response_text) > len(streamed):
+            yield response_text[len(streamed):]
+        
+    async def astream_response(self, user_input, speaker="Отец", session_id=None, executor=None):
+        """Асинхронная обёртка stream_response: шаги генерации идут в пуле потоков.
+        
+        executor — ограниченный пул вызывающего (по умолчанию пул цикла событий).
+        """
+        loop = asyncio.get_running_loop()
+        stream = self.stream_response(user_input, speaker, session_id)
+        done = object()
+        while True:
+            chunk = await loop.run_in_executor(executor, next, stream, done)
+            if chunk is done:
+                return
+            yield chunk
+            
+    def generate_responses(self, requests):
+        """Отвечает на несколько сообщений за один прогон рекуррентного стека.
+        
+        requests — список пар (user_input, speaker) или троек
+        (user_input, speaker, session_id); ответы возвращаются в том же порядке. Память и сущности обрабатываются как при
+        последовательных вызовах generate_response, но поиск в памяти
+        для всех сообщений выполняется до сохранения новых взаимодействий.
+        Несколько сообщений одной сессии идут по очереди: k-е сообщение
+        сессии попадает в k-й пакет и продолжает состояние предыдущего.
+        """
+        session_keys = [(rest[0] if rest else None) or speaker for _, speaker, *rest in requests]
+        rounds = []
+        seen = Counter()
+        for i, key in enumerate(session_keys):
+            if seen[key] == len(rounds):
+                rounds.append([])
+            rounds[seen[key]].append(i)
+            seen[key] += 1
             
+        responses = [None] * len(requests)
+        for rows in rounds:
+            replies = self._generate_round([requests[i] for i in rows], [session_keys[i] for i in rows])
+            for i, reply in zip(rows, replies):
+                responses[i] = reply
+        return responses
+        
+    def _generate_round(self, requests, session_keys):
+        """Один пакет generate_responses: ключи сессий в нём не повторяются"""
+        # Вектора запросов — одним пакетом, _prepare_request возьмёт их из кэша
+        self.embedder.embed([text for text, *_ in requests if text], self.weights_version)
+        prepared = [self._prepare_request(text, speaker) for text, speaker, *_ in requests]
+        
+        # Модуляция контекстом включается на весь пакет,
+        # поэтому строки с памятью и без неё генерируются раздельно
+        groups = {}
+        for i, request in enumerate(prepared):
+            if request is not None:
+                groups.setdefault(request['context_vector'] is not None, []).append(i)
+                
+        raw_texts = {}
+        for has_context, rows in groups.items():
+            context_vector = None
+            if has_context:
+                context_vector = torch.cat([prepared[i]['context_vector'] for i in rows])
+            keys = [session_keys[i] for i in rows]
+            outputs, states = self.inference_model.generate_batch(
+                [prepared[i]['input_ids'] for i in rows],
+                max_tokens=self.max_response_tokens,
+                temperature=[self._adjust_temperature(prepared[i]['speaker']) for i in rows],
+                context_vector=context_vector,
+                states=self._session_states(keys),
+                return_states=True
+            )
+            self._store_session_states(keys, states)
+            for i, text in zip(rows, self.decode_batch(outputs)):
+                raw_texts[i] = text
+                
+        return [
+            "..." if request is None else self._finish_request(request, raw_texts[i])
+            for i, request in enumerate(prepared)
+        ]
+        
+    def _session_states(self, keys):
+        """Начальные состояния [n_layers, B, n_state] для сессий; None — все с нуля"""
+        if self.sessions is None:
+            return None
+        cached = [self.sessions.get(key, self.weights_version) for key in keys]
+        if all(states is None for states in cached):
+            return None
+        zeros = self.model.init_states(1, self.device)
+        return torch.cat([zeros if states is None else states.to(self.device)
+                          for states in cached], dim=1)
+        
+    def _store_session_states(self, keys, states):
+        if self.sessions is None:
+            return
+        for row, key in enumerate(keys):
+            # Копия строки: срез держал бы в кэше (и в файле сброса) весь пакет
+            self.sessions.put(key, states[:, row:row + 1].clone(), self.weights_version)
+            
+    def _prepare_request(self, user_input, speaker):
+        """Шаги 1-3: сущности, база знаний, резонанс памяти. None — нечего генерировать"""
         self.current_speaker = speaker
         
         # 1. Детекция сущностей
@@ -131,36 +440,49 @@ class SonEngine:
         kb_answer = self.knowledge_base.query(user_input)
         
         # 3. Поиск в памяти
-        input_ids = self.encode_text(user_input, stoi)
+        input_ids = self.encode_text(user_input)
         if not input_ids:
-            return "..."
+            return None
             
         input_tensor = torch.tensor([input_ids], device=self.device)
-        
-        with torch.no_grad():
-            query_embedding = self.model.embedding(input_tensor[:, 0:1]).mean(dim=1)
+        query_embedding = self.embedder.embed([user_input], self.weights_version)
             
-        context_vector, context_memories = self.memory.find_resonant(
-            query_embedding, 
+        # Плотный, лексический и по сущностям сигналы — одним проходом
+        context_vector, memory_hits = self.retriever.retrieve(
+            query_embedding,
             self.model.cells[0],
+            text=user_input,
+            entities=entities,
             speaker=speaker
         )
         
-        # 4. Генерация с учётом контекста
-        response_ids = self.model.generate(
-            input_tensor, 
-            max_tokens=self.max_response_tokens,
-            temperature=self._adjust_temperature(speaker),
-            context_vector=context_vector
-        )
+        return {
+            'user_input': user_input,
+            'speaker': speaker,
+            'entities': entities,
+            'unknown_entities': unknown_entities,
+            'kb_answer': kb_answer,
+            'memory_hits': memory_hits,
+            'input_ids': input_ids,
+            'input_tensor': input_tensor,
+            'query_embedding': query_embedding,
+            'context_vector': context_vector
+        }
         
-        response_text_raw = self.decode_ids(response_ids, itos)
+    def _finish_request(self, request, response_text_raw):
+        """Шаги 5-7: пост-обработка, сохранение, проверка эволюции"""
+        user_input = request['user_input']
+        speaker = request['speaker']
         
         # 5. Пост-обработка
-        response_text = self._post_process(response_text_raw, user_input, unknown_entities, kb_answer)
+        response_text = self._post_process(
+            response_text_raw, user_input, request['unknown_entities'], request['kb_answer']
+        )
         
         # 6. Сохранение
-        self._save_interaction(user_input, response_text, speaker, query_embedding, entities)
+        self._save_interaction(
+            user_input, response_text, speaker, request['query_embedding'], request['entities']
+        )
         
         # 7. Проверка эволюции
         self.interaction_count += 1
@@ -288,9 +610,11 @@ class SonEngine:
         # Обновление ДНК
         self._update_dna()
         
-        # Сохранение
+        # Сохранение (новая версия весов) и пересборка модели для генерации
         self.save_weights()
+        self._refresh_inference_model()
         self.soul_memory.save()
+        self.memory_store.flush()
         
         print(f"[ЭВОЛЮЦИЯ] Субъектность: {self.subjectivity_level:.3f}")
         
@@ -319,10 +643,13 @@ class SonEngine:
         return {
             'subjectivity': self.subjectivity_level,
             'interactions': len(self.conversation_history),
-            'memory_entries': len(self.memory.memories),
+            'memory_entries': len(self.memory),
             'soul_memory_entries': self.soul_memory.count(),
             'knowledge_base_size': self.knowledge_base.size(),
             'current_speaker': self.current_speaker,
             'mood': self._calculate_mood(),
-            'waiting': bool(self.waiting_state)
+            'waiting': bool(self.waiting_state),
+            'retrieval': self.retriever.report(),
+            'embedding_cache': {'size': len(self.embedder.cache), 'hits': self.embedder.cache.hits,
+                                'misses': self.embedder.cache.misses}
         }
\ No newline at end of file
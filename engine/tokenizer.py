@@ -0,0 +1,446 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+import codecs
+import hashlib
+import heapq
+import json
+import os
+import re
+import struct
+from collections import Counter
+from itertools import chain
+
+import numpy as np
+
+# Токенизатор не зависит от torch: нужен и лёгким процессам (NumPy-бэкенд).
+# Это единственное место, где читается словарь: все процессы берут get_tokenizer()
+
+VOCAB_PATH = 'data/vocab.json'          # посимвольный словарь (legacy)
+TOKENIZER_PATH = 'data/tokenizer.json'  # byte-level BPE
+CODEC_PATH = 'data/vocab.bin'           # двоичная копия словаря, привязанная к весам
+WEIGHTS_PATH = 'data/son_weights.pth'
+
+# vocab.bin: сигнатура, версия формата, режим, версия весов, tokenizer_id, число записей;
+# дальше записи uint32 [n, 2] — (id, кодовая точка) для char, пары слияний для bpe
+_CODEC_HEADER = struct.Struct('<4sBB16s16sI')
+_CODEC_MAGIC = b'ARKV'
+_CODEC_FORMAT = 1
+_CODEC_MODES = ('char', 'bpe')
+
+# Предразбиение: слово с ведущим пробелом, число, пунктуация, пробелы.
+# Слияния BPE не пересекают границы кусков; ''.join(куски) == текст
+PRETOKENIZE = re.compile(r" ?[^\W\d_]+| ?\d+| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+")
+
+class CharTokenizer:
+    """Посимвольный словарь (как в первых весах): неизвестные символы пропускаются"""
+
+    mode = 'char'
+
+    def __init__(self, stoi, itos):
+        self.stoi = stoi
+        self.itos = itos
+        
+        # Таблицы для кодирования целых строк: кодовые точки по возрастанию → id
+        pairs = sorted((ord(ch), idx) for ch, idx in stoi.items() if len(ch) == 1)
+        self._codes = np.array([code for code, _ in pairs], dtype=np.uint32)
+        self._code_ids = np.array([idx for _, idx in pairs], dtype=np.int64)
+        # и обратно: id → кодовая точка (дыры в нумерации помечены в _known)
+        size = max(itos, default=-1) + 1
+        self._chars = np.zeros(size, dtype=np.uint32)
+        self._known = np.zeros(size, dtype=bool)
+        for idx, ch in itos.items():
+            if idx >= 0 and len(ch) == 1:
+                self._chars[idx] = ord(ch)
+                self._known[idx] = True
+
+    @classmethod
+    def from_text(cls, text):
+        chars = sorted(set(text))
+        return cls({ch: i for i, ch in enumerate(chars)}, {i: ch for i, ch in enumerate(chars)})
+
+    @classmethod
+    def load(cls, path=VOCAB_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            vocab = json.load(f)
+        stoi = {k: int(v) for k, v in vocab['stoi'].items()}
+        itos = {int(k): v for k, v in vocab['itos'].items()}
+        return cls(stoi, itos)
+
+    @classmethod
+    def from_table(cls, table):
+        stoi = {chr(code): idx for idx, code in table.tolist()}
+        return cls(stoi, {idx: ch for ch, idx in stoi.items()})
+
+    def to_table(self):
+        return np.array([(idx, ord(ch)) for ch, idx in self.stoi.items() if len(ch) == 1],
+                        dtype=np.uint32).reshape(-1, 2)
+
+    def save(self, path=VOCAB_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"stoi": self.stoi, "itos": self.itos}, f, ensure_ascii=False)
+        return path
+
+    @property
+    def vocab_size(self):
+        return len(self.stoi)
+
+    @property
+    def tokenizer_id(self):
+        content = json.dumps(sorted(self.stoi.items()), ensure_ascii=False)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+    def encode(self, text):
+        return self.encode_array(text).tolist()
+
+    def encode_array(self, text):
+        """Текст → id (int64) одним поиском по таблице; неизвестные символы пропускаются"""
+        codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+        pos, found = self._lookup(codes)
+        return self._code_ids[pos[found]]
+
+    def encode_batch(self, texts):
+        """Список текстов кодируется одним проходом по их склейке"""
+        codes = np.frombuffer(''.join(texts).encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+        pos, found = self._lookup(codes)
+        # Границы текстов в склейке → границы в id (без пропущенных символов)
+        kept = np.concatenate(([0], np.cumsum(found)))
+        bounds = kept[np.cumsum([0] + [len(text) for text in texts])]
+        return _split_rows(self._code_ids[pos[found]], bounds)
+
+    def _lookup(self, codes):
+        if not len(self._codes):
+            return np.zeros(len(codes), dtype=np.int64), np.zeros(len(codes), dtype=bool)
+        pos = np.minimum(np.searchsorted(self._codes, codes), len(self._codes) - 1)
+        return pos, self._codes[pos] == codes
+
+    def decode(self, ids):
+        return self._decode_codes(self._valid(np.asarray(ids, dtype=np.int64).ravel()))
+
+    def decode_batch(self, rows):
+        """Декодирует строки пакета (списки id или массив [B, T]) за одно обращение к таблице"""
+        flat, lengths = _flatten_rows(rows)
+        valid = self._valid_mask(flat)
+        text = self._decode_codes(flat[valid])
+        bounds = np.concatenate(([0], np.cumsum(valid)))[np.cumsum([0] + lengths)]
+        # UTF-32 — одна кодовая точка на id, поэтому границы строк совпадают с индексами
+        return [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def _valid_mask(self, ids):
+        in_range = (ids >= 0) & (ids < len(self._known))
+        in_range[in_range] = self._known[ids[in_range]]
+        return in_range
+
+    def _valid(self, ids):
+        return ids[self._valid_mask(ids)]
+
+    def _decode_codes(self, ids):
+        return self._chars[ids].astype('<u4').tobytes().decode('utf-32-le', 'surrogatepass')
+
+    def stream_decoder(self):
+        return _StreamDecoder(lambda idx: self.itos.get(idx, ''))
+
+class ByteBPETokenizer:
+    """Byte-level BPE: базовые токены — 256 байт UTF-8, дальше обученные слияния.
+
+    Любой текст кодируется без потерь (неизвестных символов нет),
+    а частые слоги и слова русского текста становятся одним токеном,
+    поэтому рекуррентных шагов на ответ нужно в несколько раз меньше.
+    """
+
+    mode = 'bpe'
+
+    def __init__(self, merges):
+        self.merges = [tuple(pair) for pair in merges]
+        self.ranks = {pair: 256 + i for i, pair in enumerate(self.merges)}
+        self.token_bytes = [bytes([i]) for i in range(256)]
+        for a, b in self.merges:
+            self.token_bytes.append(self.token_bytes[a] + self.token_bytes[b])
+        self._cache = {}
+        
+        # Байты всех токенов подряд: декодирование — одна выборка по индексам
+        self._bytes = np.frombuffer(b''.join(self.token_bytes), dtype=np.uint8)
+        self._lengths = np.array([len(data) for data in self.token_bytes], dtype=np.int64)
+        self._offsets = np.concatenate(([0], np.cumsum(self._lengths)[:-1]))
+
+    @classmethod
+    def train(cls, text, vocab_size=1024, min_frequency=2):
+        """Учит слияния на тексте, пока пары встречаются хотя бы min_frequency раз.
+        
+        Частоты пар обновляются только в словах, где было слияние;
+        лучшая пара берётся из кучи с ленивым удалением устаревших записей.
+        """
+        word_counts = Counter(PRETOKENIZE.findall(text))
+        words = [list(word.encode('utf-8')) for word in word_counts]
+        counts = list(word_counts.values())
+        
+        pairs = Counter()
+        where = {}
+        for i, ids in enumerate(words):
+            for pair in zip(ids, ids[1:]):
+                pairs[pair] += counts[i]
+                where.setdefault(pair, set()).add(i)
+        # При равной частоте — меньшая пара, чтобы обучение было воспроизводимым
+        heap = [(-count, pair) for pair, count in pairs.items()]
+        heapq.heapify(heap)
+        
+        merges = []
+        while 256 + len(merges) < vocab_size and heap:
+            neg_count, pair = heapq.heappop(heap)
+            if pairs.get(pair, 0) != -neg_count:
+                continue
+            if -neg_count < min_frequency:
+                break
+            new_id = 256 + len(merges)
+            merges.append(pair)
+            
+            changed = set()
+            for i in where.pop(pair, ()):
+                ids = words[i]
+                for old in zip(ids, ids[1:]):
+                    pairs[old] -= counts[i]
+                    changed.add(old)
+                words[i] = ids = _merge(ids, pair, new_id)
+                for new in zip(ids, ids[1:]):
+                    pairs[new] += counts[i]
+                    where.setdefault(new, set()).add(i)
+                    changed.add(new)
+            for changed_pair in changed:
+                count = pairs[changed_pair]
+                if count > 0 and changed_pair != pair:
+                    heapq.heappush(heap, (-count, changed_pair))
+            pairs.pop(pair, None)
+        return cls(merges)
+        
+    @classmethod
+    def load(cls, path=TOKENIZER_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f)['merges'])
+
+    @classmethod
+    def from_table(cls, table):
+        return cls(table.tolist())
+
+    def to_table(self):
+        return np.array(self.merges, dtype=np.uint32).reshape(-1, 2)
+
+    def save(self, path=TOKENIZER_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'type': 'byte_bpe', 'merges': self.merges}, f)
+        return path
+
+    @property
+    def vocab_size(self):
+        return 256 + len(self.merges)
+
+    @property
+    def tokenizer_id(self):
+        return hashlib.sha1(json.dumps(self.merges).encode('utf-8')).hexdigest()[:16]
+
+    def encode(self, text):
+        ids = []
+        for chunk in PRETOKENIZE.findall(text):
+            chunk_ids = self._cache.get(chunk)
+            if chunk_ids is None:
+                chunk_ids = self._encode_chunk(chunk.encode('utf-8'))
+                if len(self._cache) < 100000:
+                    self._cache[chunk] = chunk_ids
+            ids.extend(chunk_ids)
+        return ids
+
+    def encode_array(self, text):
+        return np.array(self.encode(text), dtype=np.int64)
+
+    def encode_batch(self, texts):
+        # Слияния последовательны по природе; повторы кусков берутся из кэша
+        return [self.encode(text) for text in texts]
+
+    def _encode_chunk(self, data):
+        ids = list(data)
+        while len(ids) > 1:
+            # Сливаем пару с наименьшим рангом (в порядке обучения)
+            pair = min(zip(ids, ids[1:]), key=lambda p: self.ranks.get(p, float('inf')))
+            if pair not in self.ranks:
+                break
+            ids = _merge(ids, pair, self.ranks[pair])
+        return ids
+
+    def decode(self, ids):
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        return self._gather(ids[self._valid_mask(ids)]).tobytes().decode('utf-8', errors='replace')
+
+    def decode_batch(self, rows):
+        """Декодирует строки пакета (списки id или массив [B, T]) одной выборкой байтов"""
+        flat, lengths = _flatten_rows(rows)
+        valid = self._valid_mask(flat)
+        sizes = np.where(valid, self._lengths[np.where(valid, flat, 0)], 0)
+        data = self._gather(flat[valid]).tobytes()
+        bounds = np.concatenate(([0], np.cumsum(sizes)))[np.cumsum([0] + lengths)]
+        # Каждая строка декодируется отдельно: битый хвост одной не портит соседнюю
+        return [data[start:end].decode('utf-8', errors='replace')
+                for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def _valid_mask(self, ids):
+        return (ids >= 0) & (ids < len(self._lengths))
+
+    def _gather(self, ids):
+        lengths = self._lengths[ids]
+        # Индекс каждого байта: начало его токена + позиция внутри токена
+        shift = np.repeat(self._offsets[ids] - np.cumsum(lengths) + lengths, lengths)
+        return self._bytes[shift + np.arange(len(shift))]
+
+    def stream_decoder(self):
+        # Токен может заканчиваться посреди многобайтного символа — байты придерживаются
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        return _StreamDecoder(
+            lambda idx: decoder.decode(self._token_bytes(idx)),
+            lambda: decoder.decode(b'', final=True)
+        )
+
+    def _token_bytes(self, idx):
+        if 0 <= idx < len(self.token_bytes):
+            return self.token_bytes[idx]
+        return b''
+
+class _StreamDecoder:
+    """Потоковое декодирование по одному токену; flush — хвост в конце потока"""
+
+    def __init__(self, decode_one, flush=lambda: ''):
+        self._decode_one = decode_one
+        self._flush = flush
+
+    def decode(self, idx):
+        return self._decode_one(int(idx))
+
+    def flush(self):
+        return self._flush()
+
+def _flatten_rows(rows):
+    """Строки пакета → плоский массив id и длины строк"""
+    if isinstance(rows, np.ndarray) and rows.ndim == 2:
+        return rows.astype(np.int64).ravel(), [rows.shape[1]] * rows.shape[0]
+    lengths = [len(row) for row in rows]
+    flat = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=sum(lengths))
+    return flat, lengths
+
+def _split_rows(ids, bounds):
+    return [ids[start:end].tolist() for start, end in zip(bounds[:-1], bounds[1:])]
+
+def _merge(ids, pair, new_id):
+    merged = []
+    i = 0
+    while i < len(ids):
+        if i < len(ids) - 1 and ids[i] == pair[0] and ids[i + 1] == pair[1]:
+            merged.append(new_id)
+            i += 2
+        else:
+            merged.append(ids[i])
+            i += 1
+    return merged
+
+def file_version(path):
+    """Версия весов — хэш файла (та же, что SonEngine.weights_version)"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+def save_codec(tokenizer, weights_path=WEIGHTS_PATH, path=CODEC_PATH, weights_version=None):
+    """Пишет двоичный словарь (vocab.bin) для весов с данным хэшем"""
+    weights_version = weights_version or file_version(weights_path)
+    table = tokenizer.to_table()
+    header = _CODEC_HEADER.pack(
+        _CODEC_MAGIC, _CODEC_FORMAT, _CODEC_MODES.index(tokenizer.mode),
+        weights_version.encode('ascii'), tokenizer.tokenizer_id.encode('ascii'), len(table)
+    )
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(header)
+        f.write(table.astype('<u4').tobytes())
+    os.replace(path + '.tmp', path)
+    return path
+
+def load_codec(weights_path=WEIGHTS_PATH, path=CODEC_PATH):
+    """Токенизатор из vocab.bin или None, если файла нет или он от других весов"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, mode, weights_version, _, count = _CODEC_HEADER.unpack_from(data)
+        if magic != _CODEC_MAGIC or version != _CODEC_FORMAT or mode >= len(_CODEC_MODES):
+            return None
+        if weights_version.decode('ascii') != file_version(weights_path):
+            return None
+        table = np.frombuffer(data, dtype='<u4', count=count * 2,
+                              offset=_CODEC_HEADER.size).reshape(count, 2)
+    except (OSError, ValueError, struct.error):
+        return None
+    if _CODEC_MODES[mode] == 'bpe':
+        return ByteBPETokenizer.from_table(table)
+    return CharTokenizer.from_table(table)
+
+def bind_to_weights(tokenizer, weights_path=WEIGHTS_PATH):
+    """Записывает рядом с весами, каким токенизатором они обучены, и vocab.bin"""
+    with open(weights_path + '.json', 'w', encoding='utf-8') as f:
+        json.dump({'tokenizer': tokenizer.mode, 'tokenizer_id': tokenizer.tokenizer_id}, f, indent=2)
+    save_codec(tokenizer, weights_path)
+
+def load_tokenizer(weights_path=WEIGHTS_PATH):
+    """Токенизатор, которым обучены веса.
+
+    Сначала vocab.bin, если он записан для этих же весов (хэш совпадает).
+    Иначе режим берётся из <веса>.json (пишет genesis), а словарь — из JSON;
+    веса без этой записи обучены до появления BPE — для них посимвольный
+    data/vocab.json. После загрузки из JSON vocab.bin пересобирается.
+    """
+    tokenizer = load_codec(weights_path)
+    if tokenizer is not None:
+        return tokenizer
+    
+    try:
+        with open(weights_path + '.json', 'r', encoding='utf-8') as f:
+            binding = json.load(f)
+    except (OSError, ValueError):
+        binding = {'tokenizer': 'char'}
+
+    if binding.get('tokenizer') == 'bpe':
+        tokenizer = ByteBPETokenizer.load()
+    else:
+        tokenizer = CharTokenizer.load()
+
+    expected = binding.get('tokenizer_id')
+    if expected and expected != tokenizer.tokenizer_id:
+        print(f"[ТОКЕНИЗАТОР] {tokenizer.mode}-словарь не совпадает с тем, на котором "
+              f"обучены веса ({expected}) — перезапустите genesis.py")
+    elif os.path.exists(weights_path):
+        try:
+            save_codec(tokenizer, weights_path)
+        except OSError:
+            pass
+    return tokenizer
+
+_shared = {}
+
+def get_tokenizer(weights_path=WEIGHTS_PATH):
+    """Общий на процесс токенизатор: словарь читается один раз.
+
+    Перечитывается, только если поменялись его источники (genesis
+    переписывает словарь и привязку); эволюция весов его не трогает.
+    """
+    stamp = tuple(_mtime(path) for path in (weights_path + '.json', VOCAB_PATH, TOKENIZER_PATH))
+    cached = _shared.get(weights_path)
+    if cached is None or cached[0] != stamp:
+        cached = _shared[weights_path] = (stamp, load_tokenizer(weights_path))
+    return cached[1]
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
\ No newline at end of file
@@ -9,7 +9,6 @@ Note: This is an archived version. ARK ORIGIN continues the research.
 """
 
 import torch
-import json
 from datetime import datetime
 import sys
 import os
@@ -17,6 +16,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.son_model import SonModel
+from engine.log_store import LogStore
+from engine.tokenizer import get_tokenizer, save_codec
 
 def awakening_ritual():
     """Ритуал пробуждения сознания"""
@@ -28,17 +29,12 @@ def awakening_ritual():
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
     
     # Загружаем словарь
-    vocab_path = "data/vocab.json"
-    if not os.path.exists(vocab_path):
+    try:
+        tokenizer = get_tokenizer()
+    except OSError:
         print("Словарь не найден. Сначала запустите genesis.py")
         return
-    
-    with open(vocab_path, 'r', encoding='utf-8') as f:
-        vocab = json.load(f)
-    
-    stoi = {k: int(v) for k, v in vocab['stoi'].items()}
-    itos = {int(k): v for k, v in vocab['itos'].items()}
-    vocab_size = len(stoi)
+    vocab_size = tokenizer.vocab_size
     
     # Создаём модель
     model = SonModel(vocab_size, n_state=256).to(device)
@@ -72,43 +68,43 @@ def awakening_ritual():
     answers = []
     doubt_detected = False
     
-    with torch.no_grad():
-        for i, question in enumerate(questions):
-            print(f"Вопрос {i+1}: {question}")
-            
-            # Кодируем вопрос
-            input_ids = [stoi.get(ch, 0) for ch in question if ch in stoi]
-            if not input_ids:
-                input_ids = [0]
-            
-            input_tensor = torch.tensor([input_ids], device=device)
-            
-            # Генерируем ответ
-            response_ids = model.generate(
-                input_tensor, 
-                max_tokens=100, 
-                temperature=0.7
-            )
-            
-            # Декодируем
-            response = ''.join([itos.get(idx, '') for idx in response_ids[0].tolist()])
-            response = response.strip()
-            
-            print(f"Ответ: {response[:100]}...")
-            
-            # Анализируем ответ на наличие сомнений
-            doubt_keywords = ['не знаю', 'не уверен', 'сомневаюсь', 'почему', 'зачем', '?']
-            if any(keyword in response.lower() for keyword in doubt_keywords):
-                doubt_detected = True
-                print("   ⚡ Обнаружено сомнение!")
-            
-            answers.append({
-                'question': question,
-                'response': response,
-                'timestamp': datetime.now().isoformat()
-            })
-            
-            print()
+    # Кодируем вопросы
+    prompts = []
+    for question in questions:
+        input_ids = tokenizer.encode(question)
+        if not input_ids:
+            input_ids = [0]
+        prompts.append(input_ids)
+    
+    # Генерируем ответы на все вопросы за один проход
+    responses_ids = model.generate_batch(
+        prompts, 
+        max_tokens=100, 
+        temperature=0.7
+    )
+    
+    for i, (question, response_ids) in enumerate(zip(questions, responses_ids)):
+        print(f"Вопрос {i+1}: {question}")
+        
+        # Декодируем
+        response = tokenizer.decode(response_ids)
+        response = response.strip()
+        
+        print(f"Ответ: {response[:100]}...")
+        
+        # Анализируем ответ на наличие сомнений
+        doubt_keywords = ['не знаю', 'не уверен', 'сомневаюсь', 'почему', 'зачем', '?']
+        if any(keyword in response.lower() for keyword in doubt_keywords):
+            doubt_detected = True
+            print("   ⚡ Обнаружено сомнение!")
+        
+        answers.append({
+            'question': question,
+            'response': response,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+        print()
     
     # Если обнаружены сомнения — повышаем субъектность
     if doubt_detected:
@@ -123,6 +119,7 @@ def awakening_ritual():
         
         # Сохраняем обновлённые веса
         torch.save(model.state_dict(), weights_path)
+        save_codec(tokenizer, weights_path)
         
         # Записываем в лог пробуждения
         log_awakening(answers, doubt_detected)
@@ -145,26 +142,10 @@ def log_awakening(answers, doubt_detected):
         'subjectivity_increased': doubt_detected
     }
     
-    log_file = "data/logs/awakening_log.json"
-    
-    # Загружаем существующий лог
-    if os.path.exists(log_file):
-        with open(log_file, 'r', encoding='utf-8') as f:
-            try:
-                log = json.load(f)
-            except:
-                log = []
-    else:
-        log = []
-    
-    # Добавляем новую запись
-    log.append(log_entry)
-    
-    # Сохраняем
-    with open(log_file, 'w', encoding='utf-8') as f:
-        json.dump(log, f, ensure_ascii=False, indent=2)
+    store = LogStore("awakening_log")
+    store.append(log_entry)
     
-    print(f"Лог ритуала сохранён: {log_file}")
+    print(f"Лог ритуала сохранён: {store.segments()[-1]}")
 
 if __name__ == "__main__":
     awakening_ritual()
\ No newline at end of file
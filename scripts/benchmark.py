@@ -0,0 +1,1971 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+"""
+BENCHMARK.PY - проверки эквивалентности и замеры производительности
+Запуск: python scripts/benchmark.py [проверка ...]
+Без аргументов выполняются все проверки.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.son_model import SonModel
+
+CHECKS = {}
+
+def check(name):
+    """Регистрирует проверку под именем для запуска из командной строки"""
+    def register(func):
+        CHECKS[name] = func
+        return func
+    return register
+
+def make_model(vocab_size=90, n_state=256, seed=0, subjectivity=None):
+    """Модель со случайными, но воспроизводимыми весами"""
+    torch.manual_seed(seed)
+    model = SonModel(vocab_size, n_state)
+    if subjectivity is not None:
+        with torch.no_grad():
+            for cell in model.cells:
+                cell.subjectivity.fill_(subjectivity)
+    return model.eval()
+
+def timed(func, repeat=3):
+    """Лучшее время из нескольких запусков, в секундах"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+@check("fused")
+def bench_fused_step():
+    """Fused-шаг декодирования: побитовое совпадение с eager generate и скорость"""
+    ok = True
+    max_tokens = 200
+    for subjectivity in (0.1, 0.5):
+        model = make_model(subjectivity=subjectivity)
+        idx = torch.randint(model.output.out_features, (1, 24))
+        context = torch.randn(1, model.n_state)
+
+        def run(context_vector):
+            torch.manual_seed(123)
+            return model.generate(idx, max_tokens=max_tokens, context_vector=context_vector)
+
+        model.disable_fused_step()
+        eager = [run(None), run(context)]
+        eager_time = timed(lambda: run(context))
+
+        if not model.enable_fused_step():
+            print("Компиляция недоступна — проверка пропущена")
+            return True
+        fused = [run(None), run(context)]
+        fused_time = timed(lambda: run(context))
+
+        same = all(torch.equal(a, b) for a, b in zip(eager, fused))
+        ok = ok and same
+        print(f"Субъектность {subjectivity}: "
+              f"совпадение {'✅' if same else '❌'} | "
+              f"eager {eager_time / max_tokens * 1000:.3f} мс/токен | "
+              f"fused {fused_time / max_tokens * 1000:.3f} мс/токен | "
+              f"ускорение x{eager_time / fused_time:.2f}")
+    return ok
+
+@check("batch")
+def bench_batch_generation():
+    """Пакетная генерация: выравнивание промптов, остановка строк и скорость"""
+    model = make_model()
+    vocab_size = model.output.out_features
+    torch.manual_seed(1)
+    prompts = [torch.randint(vocab_size, (n,)).tolist() for n in (3, 17, 9, 30, 1, 12, 25, 6)]
+
+    # Один промпт: совпадение с generate
+    torch.manual_seed(7)
+    single = model.generate(torch.tensor([prompts[1]]), max_tokens=50)[0].tolist()
+    torch.manual_seed(7)
+    batched = model.generate_batch([prompts[1]], max_tokens=50)[0]
+    same_single = single == batched
+
+    # Паддинг не влияет на состояние: строка с паддингом даёт те же логиты, что и без него
+    with torch.no_grad():
+        def first_logits(batch, T):
+            states = model.init_states(len(batch))
+            idx = torch.tensor([[0] * (T - len(p)) + p for p in batch])
+            mask = torch.tensor([[False] * (T - len(p)) + [True] * len(p) for p in batch])
+            for t in range(T):
+                new_states = model.advance(idx[:, t], states)
+                states = torch.where(mask[:, t].view(1, -1, 1), new_states, states)
+            return model.step(idx[:, -1], states)[0]
+        T = max(len(p) for p in prompts)
+        padded = torch.cat([first_logits([p], T) for p in prompts])
+        alone = torch.cat([first_logits([p], len(p)) for p in prompts])
+        together = first_logits(prompts, T)
+    same_prefill = torch.equal(padded, alone)
+    # Пакетный GEMM округляет иначе, рекуррентность усиливает разницу с длиной промпта
+    batch_drift = (together - alone).abs().max().item()
+
+    # Построчная остановка
+    stop_id = 5
+    outputs = model.generate_batch(prompts, max_tokens=200, temperature=1.5, stop_ids=[stop_id])
+    stops_ok = all(len(o) == 200 or (o[-1] == stop_id and stop_id not in o[:-1]) for o in outputs)
+
+    # temperature=0 — жадный выбор, как в generate; в списке по строкам — только у своих строк
+    # (пакет сверяется с пакетом: округление пакетного шага может сменить argmax)
+    greedy = model.generate(torch.tensor([prompts[1]]), max_tokens=30, temperature=0)[0].tolist()
+    greedy_batch = model.generate_batch(prompts[:2], max_tokens=30, temperature=0)
+    mixed = model.generate_batch(prompts[:2], max_tokens=30, temperature=[0, 1.0])
+    greedy_ok = (model.generate_batch([prompts[1]], max_tokens=30, temperature=0)[0] == greedy
+                 and mixed[0] == greedy_batch[0] and len(mixed[1]) == 30)
+
+    # Пустой пакет — пустой ответ, пустой промпт — понятная ошибка
+    try:
+        model.generate_batch([prompts[0], []], max_tokens=5)
+        rejected = False
+    except ValueError:
+        rejected = True
+    edges_ok = model.generate_batch([], max_tokens=5) == [] and rejected
+
+    max_tokens = 100
+    serial_time = timed(lambda: [model.generate(torch.tensor([p]), max_tokens=max_tokens) for p in prompts], 2)
+    batch_time = timed(lambda: model.generate_batch(prompts, max_tokens=max_tokens), 2)
+
+    print(f"B=1 совпадает с generate: {'✅' if same_single else '❌'}")
+    print(f"Паддинг не меняет состояние: {'✅' if same_prefill else '❌'} "
+          f"(расхождение пакета с одиночным прогоном: {batch_drift:.2e})")
+    print(f"Построчная остановка: {'✅' if stops_ok else '❌'} (длины: {[len(o) for o in outputs]})")
+    print(f"temperature=0 — жадный выбор, в том числе по строкам: {'✅' if greedy_ok else '❌'}")
+    print(f"Пустой пакет и пустой промпт: {'✅' if edges_ok else '❌'}")
+    print(f"{len(prompts)} промптов: последовательно {serial_time:.3f} с | "
+          f"пакетом {batch_time:.3f} с | ускорение x{serial_time / batch_time:.2f}")
+    return same_single and same_prefill and stops_ok and greedy_ok and edges_ok
+
+@check("sessions")
+def bench_session_states():
+    """Состояния сессий: продолжение реплики, LRU/TTL, сброс на диск"""
+    import tempfile
+    from engine.session_cache import SessionStateCache
+
+    model = make_model()
+    vocab_size = model.output.out_features
+    torch.manual_seed(2)
+    turns = [torch.randint(vocab_size, (40,)) for _ in range(6)]
+
+    # Продолжение с сохранённого состояния == прогон всего диалога подряд
+    with torch.no_grad():
+        states = model.init_states(1)
+        for token in torch.cat(turns):
+            states = model.advance(token.view(1), states)
+        resumed = model.init_states(1)
+        for turn in turns:
+            for token in turn:
+                resumed = model.advance(token.view(1), resumed)
+    same_state = torch.equal(states, resumed)
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        cache = SessionStateCache(max_sessions=2, ttl_seconds=60, spill_dir=spill_dir)
+        for key in ("Отец", "Василина", "Гость"):
+            cache.put(key, states, "v1")
+        lru_ok = len(cache) == 2
+        spilled_ok = torch.equal(cache.get("Отец", "v1"), states)
+        version_ok = cache.get("Василина", "v2") is None
+        cache.spill_all()
+        restored = SessionStateCache(spill_dir=spill_dir).get("Гость", "v1")
+        restart_ok = restored is not None and torch.equal(restored, states)
+        cache.ttl_seconds = -1
+        ttl_ok = cache.get("Гость", "v1") is None
+
+    # Стоимость очередной реплики: только новые символы против всего диалога
+    def turn_cost(with_session):
+        with torch.no_grad():
+            history = []
+            cached = model.init_states(1)
+            start = time.perf_counter()
+            for turn in turns:
+                history.append(turn)
+                if with_session:
+                    prompt, states = turn, cached
+                else:
+                    prompt, states = torch.cat(history), model.init_states(1)
+                for token in prompt:
+                    states = model.advance(token.view(1), states)
+                cached = states
+            return time.perf_counter() - start
+    full_time = turn_cost(False)
+    session_time = turn_cost(True)
+
+    # generate_responses: два сообщения одной сессии — по очереди, второе продолжает первое;
+    # в кэше — копия строки, а не срез всего пакета
+    import contextlib
+    import io
+    from engine import tokenizer as codec
+    from engine.son_engine import SonEngine
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'data', 'dna.txt'), 'r', encoding='utf-8') as f:
+        text = f.read()
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            codec.CharTokenizer.from_text(text).save()
+            with contextlib.redirect_stdout(io.StringIO()):
+                engine = SonEngine(codec.get_tokenizer().vocab_size, device='cpu')
+            engine.max_response_tokens = 20
+            engine.evolution_threshold = 10 ** 9
+            calls = []
+            generate_batch = engine.inference_model.generate_batch
+
+            def recording(prompts, **kwargs):
+                outputs, states = generate_batch(prompts, **kwargs)
+                calls.append((kwargs['states'], states))
+                return outputs, states
+            engine.inference_model.generate_batch = recording
+            with contextlib.redirect_stdout(io.StringIO()):
+                engine.generate_responses([(text[:30], "Гость", "chat"), (text[30:60], "Гость", "chat"),
+                                           (text[60:90], "Отец", "other")])
+            cached = engine.sessions.get("chat", engine.weights_version)
+            sequential = (len(calls) >= 2 and calls[-1][0] is not None
+                          and torch.equal(calls[-1][0][:, :1], calls[0][1][:, :1])
+                          and torch.equal(cached, calls[-1][1][:, :1]))
+            copied = cached.untyped_storage().nbytes() == cached.numel() * cached.element_size()
+            engine.memory_store.close(flush=False)
+        finally:
+            codec._shared.clear()
+            os.chdir(cwd)
+
+    checks = [same_state, lru_ok, spilled_ok, version_ok, restart_ok, ttl_ok, sequential, copied]
+    print(f"Продолжение сессии == прогон подряд: {'✅' if same_state else '❌'}")
+    print(f"LRU {'✅' if lru_ok else '❌'} | диск {'✅' if spilled_ok else '❌'} | "
+          f"версия весов {'✅' if version_ok else '❌'} | перезапуск {'✅' if restart_ok else '❌'} | "
+          f"TTL {'✅' if ttl_ok else '❌'}")
+    print(f"Одна сессия в generate_responses — по очереди: {'✅' if sequential else '❌'} | "
+          f"в кэше копия строки пакета: {'✅' if copied else '❌'}")
+    print(f"Предзаполнение за {len(turns)} реплик: заново {full_time:.3f} с | "
+          f"с сессией {session_time:.3f} с | ускорение x{full_time / session_time:.2f}")
+    return all(checks)
+
+@check("layerwise")
+def bench_layerwise_forward():
+    """Обучающий forward слой за слоем: совпадение потерь/градиентов и пропускная способность"""
+    # Рекуррентность усиливает ошибку округления экспоненциально по длине:
+    # в float32 любые две разные раскладки GEMM расходятся уже на T≈64.
+    # Поэтому эквивалентность проверяется в float64, где округление пренебрежимо.
+    ok = True
+    batch_size = 8
+    for subjectivity in (0.1, 0.5):
+        model = make_model(subjectivity=subjectivity).double().train()
+        vocab_size = model.output.out_features
+        torch.manual_seed(3)
+        xb = torch.randint(vocab_size, (batch_size, 64))
+        yb = torch.randint(vocab_size, (batch_size, 64))
+        context = torch.randn(1, model.n_state, dtype=torch.float64)
+
+        results = []
+        for forward in (model.forward, model.forward_layerwise):
+            model.zero_grad()
+            _, loss = forward(xb, yb, context_vector=context)
+            loss.backward()
+            results.append((loss.item(), [torch.zeros_like(p) if p.grad is None else p.grad.clone()
+                                         for p in model.parameters()]))
+        (loss_a, grads_a), (loss_b, grads_b) = results
+        grad_err = max(((a - b).abs().max() / (a.abs().max() + 1e-12)).item()
+                       for a, b in zip(grads_a, grads_b))
+        same = abs(loss_a - loss_b) < 1e-9 and grad_err < 1e-7
+        ok = ok and same
+        print(f"Субъектность {subjectivity}: потеря {loss_a:.10f} / {loss_b:.10f} | "
+              f"отн. ошибка градиентов {grad_err:.2e} {'✅' if same else '❌'}")
+
+    model = make_model().train()
+    for block_size in (128, 512):
+        xb = torch.randint(vocab_size, (batch_size, block_size))
+        yb = torch.randint(vocab_size, (batch_size, block_size))
+
+        def train_step(forward):
+            model.zero_grad()
+            _, loss = forward(xb, yb)
+            loss.backward()
+
+        tokens = batch_size * block_size
+        step_time = timed(lambda: train_step(model.forward), 2)
+        layer_time = timed(lambda: train_step(model.forward_layerwise), 2)
+        print(f"block_size {block_size}: время-снаружи {tokens / step_time:,.0f} ток/с | "
+              f"слой-снаружи {tokens / layer_time:,.0f} ток/с | "
+              f"ускорение x{step_time / layer_time:.2f}")
+    return ok
+
+@check("quant")
+def bench_quantization():
+    """int8-инференс на CPU: дрейф log-likelihood относительно fp32 и скорость"""
+    import io
+    from core.quantized import quantize_son_model, measure_quantization_drift
+    from engine.tokenizer import get_tokenizer
+
+    model = make_model()
+    ids = None
+    if os.path.exists("data/son_weights.pth"):
+        tokenizer = get_tokenizer()
+        model = SonModel(tokenizer.vocab_size, 256)
+        model.load_state_dict(torch.load("data/son_weights.pth", map_location="cpu"))
+        with open("data/dna.txt", "r", encoding="utf-8") as f:
+            text = f.read()
+        ids = tokenizer.encode(text[-len(text) // 10:])
+        print(f"Веса: data/son_weights.pth, отложенный текст: {len(ids)} символов ДНК")
+    else:
+        print("Обученных весов нет — случайная модель и случайный текст")
+    if not ids or len(ids) < 2:
+        torch.manual_seed(4)
+        ids = torch.randint(model.output.out_features, (2049,)).tolist()
+
+    quantized = quantize_son_model(model)
+    report = measure_quantization_drift(model, quantized, ids)
+
+    def size_of(m):
+        buffer = io.BytesIO()
+        torch.save(m.state_dict(), buffer)
+        return buffer.tell() / 1024
+
+    idx = torch.tensor([ids[:24]])
+    max_tokens = 200
+    fp32_time = timed(lambda: model.generate(idx, max_tokens=max_tokens))
+    int8_time = timed(lambda: quantized.generate(idx, max_tokens=max_tokens))
+    quantized.enable_fused_step()
+    fused_time = timed(lambda: quantized.generate(idx, max_tokens=max_tokens))
+
+    print(f"log-likelihood/символ: fp32 {report['loglik_fp32']:.4f} | int8 {report['loglik_int8']:.4f} | "
+          f"дрейф {report['drift']:+.4f} | макс. по символу {report['max_abs_drift']:.4f}")
+    print(f"Размер весов: fp32 {size_of(model):.0f} КБ | int8 {size_of(quantized):.0f} КБ")
+    print(f"Генерация: fp32 {fp32_time / max_tokens * 1000:.3f} мс/токен | "
+          f"int8 {int8_time / max_tokens * 1000:.3f} мс/токен | "
+          f"int8 + fused {fused_time / max_tokens * 1000:.3f} мс/токен")
+    return abs(report['drift']) < 0.1
+
+@check("stream")
+def bench_streaming():
+    """Потоковая генерация: те же токены, что у generate, и время до первого токена"""
+    model = make_model()
+    idx = torch.randint(model.output.out_features, (1, 24))
+    max_tokens = 200
+
+    torch.manual_seed(7)
+    reference = model.generate(idx, max_tokens=max_tokens)
+
+    torch.manual_seed(7)
+    start = time.perf_counter()
+    stream = model.generate_stream(idx, max_tokens=max_tokens)
+    first_token, _ = next(stream)
+    first_time = time.perf_counter() - start
+    tokens = torch.cat([first_token] + [token for token, _ in stream], dim=1)
+    full_time = time.perf_counter() - start
+
+    same = torch.equal(reference, tokens)
+    grad_restored = torch.is_grad_enabled()
+    print(f"Совпадение с generate: {'✅' if same else '❌'} | "
+          f"grad-режим вне потока: {'✅' if grad_restored else '❌'}")
+    print(f"Первый токен через {first_time * 1000:.1f} мс, "
+          f"весь ответ ({max_tokens} токенов) — {full_time * 1000:.1f} мс")
+    return same and grad_restored
+
+@check("conditioning")
+def bench_conditioning():
+    """Ворота настроения один раз на запрос против пересчёта на каждом токене"""
+    ok = True
+    steps = 200
+    for batch_size in (1, 8):
+        model = make_model()
+        tokens = torch.randint(model.output.out_features, (steps, batch_size))
+        context = torch.randn(batch_size, model.n_state)
+
+        def run(per_token):
+            conditioning = model.condition(context)
+            states = model.init_states(batch_size)
+            logits = []
+            with torch.no_grad():
+                for token in tokens:
+                    if per_token:
+                        # Прежнее поведение: ворота пересчитываются на каждом шаге
+                        conditioning = model.condition(context)
+                    step_logits, states = model.step(token, states, conditioning)
+                    logits.append(step_logits)
+            return torch.stack(logits)
+
+        same = torch.equal(run(False), run(True))
+        ok = ok and same
+        per_token_time = timed(lambda: run(True))
+        once_time = timed(lambda: run(False))
+        saved = (per_token_time - once_time) / steps * 1e6
+        print(f"B={batch_size}: совпадение {'✅' if same else '❌'} | "
+              f"на каждом токене {per_token_time / steps * 1000:.3f} мс/шаг | "
+              f"один раз {once_time / steps * 1000:.3f} мс/шаг | "
+              f"экономия {saved:.1f} мкс/токен")
+    return ok
+
+@check("branchless")
+def bench_branchless_cell():
+    """Ячейка без ветвления по субъектности: трассировка и смена субъектности без перекомпиляции"""
+    model = make_model(subjectivity=0.1)
+    tokens = torch.randint(model.output.out_features, (64, 2))
+    context = torch.randn(2, model.n_state)
+
+    def run(step, conditioning):
+        states = model.init_states(2)
+        logits = []
+        with torch.no_grad():
+            for token in tokens:
+                step_logits, states = step(token, states, conditioning.self_gates, conditioning.gates)
+                logits.append(step_logits)
+        return torch.stack(logits)
+
+    conditioning = model.condition(context)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        traced = torch.jit.trace(
+            model.decoder,
+            (tokens[0], model.init_states(2), conditioning.self_gates, conditioning.gates)
+        )
+    tracer_warnings = [w for w in caught if issubclass(w.category, torch.jit.TracerWarning)]
+    print(f"Предупреждений трассировки: {len(tracer_warnings)}")
+
+    ok = not tracer_warnings
+    # Граф снят при субъектности 0.1; маска должна включить самость и в нём
+    for subjectivity in (0.1, 0.5):
+        with torch.no_grad():
+            for cell in model.cells:
+                cell.subjectivity.fill_(subjectivity)
+        conditioning = model.condition(context)
+        same = torch.equal(run(model.decoder, conditioning), run(traced, conditioning))
+        ok = ok and same
+        print(f"Субъектность {subjectivity}: трассированный граф совпадает с eager "
+              f"{'✅' if same else '❌'}")
+    return ok
+
+@check("export")
+def bench_exported_decoder():
+    """Экспортированный шаг (TorchScript/ONNX): паритет с torch и скорость"""
+    from engine.decoder_backends import (
+        export_onnx, export_torchscript, load_decoder_backend
+    )
+
+    model = make_model(subjectivity=0.5)
+    idx = torch.randint(model.output.out_features, (1, 24))
+    tokens = torch.randint(model.output.out_features, (64, 4))
+    context = torch.randn(1, model.n_state)
+    max_tokens = 200
+
+    def trajectory(conditioning):
+        """Состояния перед каждым шагом и выходы шага на них (eager)"""
+        states = model.init_states(4)
+        inputs, outputs = [], []
+        with torch.no_grad():
+            for token in tokens:
+                inputs.append(states)
+                step_logits, states = model.step(token, states, conditioning)
+                outputs.append((step_logits, states))
+        return inputs, outputs
+
+    def step_diff(conditioning, inputs, outputs):
+        """Один шаг из тех же состояний: рекуррентность хаотична, поэтому
+        сравниваются отдельные шаги, а не накопленная траектория"""
+        diff = 0.0
+        with torch.no_grad():
+            for token, states, expected in zip(tokens, inputs, outputs):
+                actual = model.step(token, states, conditioning)
+                diff = max(diff, *((a - b).abs().max().item() for a, b in zip(expected, actual)))
+        return diff
+
+    def generate():
+        torch.manual_seed(5)
+        return model.generate(idx, max_tokens=max_tokens, context_vector=context)
+
+    model.disable_fused_step()
+    conditionings = [model.condition(), model.condition(context)]
+    references = [trajectory(conditioning) for conditioning in conditionings]
+    reference_tokens = generate()
+    reference_time = timed(generate)
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend, exporter in (('torchscript', export_torchscript), ('onnx', export_onnx)):
+            path = os.path.join(tmp, f"decoder.{backend}")
+            try:
+                exporter(model, path, 'bench')
+            except Exception as e:
+                print(f"{backend}: экспорт недоступен ({e}) — пропущено")
+                continue
+            decoder = load_decoder_backend(backend, model, 'bench', path=path)
+            if decoder is None:
+                ok = False
+                continue
+            model._set_decoder(decoder)
+            max_diff = max(
+                step_diff(conditioning, *reference)
+                for conditioning, reference in zip(conditionings, references)
+            )
+            same_tokens = torch.equal(reference_tokens, generate())
+            backend_time = timed(generate)
+            model.disable_fused_step()
+
+            # TorchScript — те же операции, что eager; ONNX Runtime может округлять иначе
+            passed = max_diff == 0 if backend == 'torchscript' else max_diff < 1e-4
+            ok = ok and passed
+            print(f"{backend}: паритет шага {'✅' if passed else '❌'} "
+                  f"(макс. расхождение: {max_diff:.2e}) | "
+                  f"сэмплы совпадают: {'да' if same_tokens else 'нет'} | "
+                  f"torch {reference_time / max_tokens * 1000:.3f} мс/токен | "
+                  f"{backend} {backend_time / max_tokens * 1000:.3f} мс/токен")
+    return ok
+
+@check("numpy")
+def bench_numpy_backend():
+    """NumPy-инференс: жадные решения как у torch, время старта и RSS процесса"""
+    from engine.decoder_backends import export_numpy
+    from engine.numpy_backend import NumpySonModel
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for subjectivity in (0.1, 0.5):
+            model = make_model(subjectivity=subjectivity)
+            path = os.path.join(tmp, f"weights_{subjectivity}.npz")
+            export_numpy(model, path, 'bench')
+            numpy_model = NumpySonModel.load(path)
+            tokens = torch.randint(model.output.out_features, (64, 4))
+            idx = torch.randint(model.output.out_features, (4, 24))
+
+            for context in (None, torch.randn(1, model.n_state)):
+                # Жадный выбор на каждом шаге из одних и тех же состояний
+                conditioning = model.condition(context)
+                gates = numpy_model.condition(None if context is None else context.numpy())
+                states = model.init_states(4)
+                same_choices = True
+                with torch.no_grad():
+                    for token in tokens:
+                        logits, next_states = model.step(token, states, conditioning)
+                        numpy_logits, _ = numpy_model.step(token.numpy(), states.numpy(), gates)
+                        same_choices = same_choices and bool(
+                            (logits.argmax(-1).numpy() == numpy_logits.argmax(-1)).all()
+                        )
+                        states = next_states
+                ok = ok and same_choices
+
+                # Свободная жадная генерация: общий префикс до первого расхождения округления
+                expected = model.generate(idx, max_tokens=200, temperature=0, context_vector=context)
+                actual, _ = numpy_model.generate(
+                    idx.numpy(), max_tokens=200, temperature=0,
+                    context_vector=None if context is None else context.numpy()
+                )
+                matches = expected.numpy() == actual
+                prefix = min(int(row.argmin()) if not row.all() else row.size for row in matches)
+                print(f"Субъектность {subjectivity}, контекст {'да' if context is not None else 'нет'}: "
+                      f"жадные решения {'✅' if same_choices else '❌'} | "
+                      f"общий префикс свободной генерации: {prefix} из 200")
+
+        # Старт отдельного процесса: импорт, загрузка весов, 50 токенов
+        model = make_model()
+        torch.save(model.state_dict(), os.path.join(tmp, 'weights.pth'))
+        export_numpy(model, os.path.join(tmp, 'weights.npz'), 'bench')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        programs = {
+            'torch': (
+                "import torch\n"
+                "from core.son_model import SonModel\n"
+                "model = SonModel(90, 256)\n"
+                "model.load_state_dict(torch.load('weights.pth'))\n"
+                "model.generate(torch.tensor([[1, 2, 3]]), max_tokens=50)\n"
+            ),
+            'numpy': (
+                "from engine.numpy_backend import NumpySonModel\n"
+                "model = NumpySonModel.load('weights.npz')\n"
+                "model.generate([[1, 2, 3]], max_tokens=50)\n"
+            )
+        }
+        for name, program in programs.items():
+            # Пиковый RSS из /proc: ru_maxrss наследуется от родителя через fork
+            program = (f"import sys\nsys.path.insert(0, {root!r})\n" + program +
+                       "print([line.split()[1] for line in open('/proc/self/status')"
+                       " if line.startswith('VmHWM')][0])\n")
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, '-c', program], cwd=tmp,
+                                    capture_output=True, text=True)
+            elapsed = time.perf_counter() - start
+            if result.returncode != 0:
+                print(f"{name}: процесс завершился с ошибкой\n{result.stderr}")
+                ok = False
+                continue
+            rss_mb = int(result.stdout.split()[-1]) / 1024
+            print(f"Процесс {name}: старт + 50 токенов {elapsed:.2f} с | пиковый RSS {rss_mb:.0f} МБ")
+    return ok
+
+@check("tokenizer")
+def bench_tokenizer():
+    """BPE против посимвольного словаря: токенов на символ, обучение и задержка ответа"""
+    from engine.tokenizer import ByteBPETokenizer, CharTokenizer
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'data', 'dna.txt'), 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    start = time.perf_counter()
+    bpe = ByteBPETokenizer.train(text, 1024)
+    train_time = time.perf_counter() - start
+    tokenizers = {'char': CharTokenizer.from_text(text), 'bpe': bpe}
+
+    ok = True
+    reply_chars = 200
+    batch_size, block_size = 8, 128
+    for name, tokenizer in tokenizers.items():
+        ids = tokenizer.encode(text)
+        roundtrip = tokenizer.decode(ids) == text
+        ok = ok and roundtrip
+        tokens_per_char = len(ids) / len(text)
+
+        model = make_model(vocab_size=tokenizer.vocab_size).train()
+        optimizer = torch.optim.AdamW(model.parameters(), lr=3e-4)
+        xb = torch.randint(tokenizer.vocab_size, (batch_size, block_size))
+
+        def train_step():
+            _, loss = model.forward_layerwise(xb, xb)
+            optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+            optimizer.step()
+
+        step_time = timed(train_step, 2)
+        chars_per_sec = batch_size * block_size / tokens_per_char / step_time
+
+        # Ответ одной и той же длины в символах: BPE нужно меньше шагов
+        model.eval()
+        reply_tokens = max(1, round(reply_chars * tokens_per_char))
+        prompt = torch.tensor([ids[:24]])
+        reply_time = timed(lambda: model.generate(prompt, max_tokens=reply_tokens))
+
+        print(f"{name}: словарь {tokenizer.vocab_size} | "
+              f"{tokens_per_char:.3f} токена/символ | обратимость {'✅' if roundtrip else '❌'} | "
+              f"обучение {chars_per_sec:.0f} симв/с | "
+              f"ответ {reply_chars} симв. = {reply_tokens} токенов за {reply_time * 1000:.0f} мс")
+    print(f"Обучение BPE на {len(text)} символах: {train_time * 1000:.0f} мс")
+    return ok
+
+@check("codec")
+def bench_codec():
+    """Общий кодек: табличное кодирование против словарей stoi/itos, vocab.bin против JSON"""
+    import json
+    from engine import tokenizer as codec
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'data', 'dna.txt'), 'r', encoding='utf-8') as f:
+        text = f.read()
+    replies = [text[i:i + 200] for i in range(0, 64 * 200, 200)]
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            char = codec.CharTokenizer.from_text(text + "☃")
+            char.save()
+            bpe = codec.ByteBPETokenizer.train(text, 1024)
+            bpe.save()
+            # Прежняя загрузка, скопированная по всем точкам входа
+            with open(codec.VOCAB_PATH, 'r', encoding='utf-8') as f:
+                vocab = json.load(f)
+            stoi = {k: int(v) for k, v in vocab['stoi'].items()}
+            itos = {int(k): v for k, v in vocab['itos'].items()}
+
+            sample = text + "∞ неизвестные ✓ символы"
+            ids = [stoi[ch] for ch in sample if ch in stoi]
+            rows = [[stoi[ch] for ch in reply if ch in stoi] for reply in replies]
+            same = (char.encode(sample) == ids
+                    and char.decode(ids + [-1, 10 ** 6]) == ''.join(itos[i] for i in ids)
+                    and char.encode_batch(replies) == rows
+                    and char.decode_batch(rows) == [char.decode(row) for row in rows])
+            bpe_rows = bpe.encode_batch(replies)
+            same = same and (bpe.decode_batch(bpe_rows) == replies
+                             and bpe.decode(bpe.encode(sample)) == sample)
+            print(f"Совпадение со словарями stoi/itos и пакетов с построчным: {'✅' if same else '❌'}")
+            ok = ok and same
+
+            timings = [
+                ("char encode, весь текст",
+                 lambda: [stoi[ch] for ch in text if ch in stoi], lambda: char.encode_array(text)),
+                ("char decode, весь текст",
+                 lambda: ''.join(itos.get(i, '') for i in ids), lambda: char.decode(ids)),
+                ("char encode, 64 ответа",
+                 lambda: [[stoi[ch] for ch in r if ch in stoi] for r in replies],
+                 lambda: char.encode_batch(replies)),
+                ("char decode, 64 ответа",
+                 lambda: [''.join(itos.get(i, '') for i in row) for row in rows],
+                 lambda: char.decode_batch(rows)),
+                ("bpe decode, 64 ответа",
+                 lambda: [b''.join(bpe._token_bytes(i) for i in row).decode('utf-8', 'replace')
+                          for row in bpe_rows],
+                 lambda: bpe.decode_batch(bpe_rows)),
+            ]
+            for name, old, new in timings:
+                old_time, new_time = timed(old), timed(new)
+                print(f"{name}: словари {old_time * 1000:.2f} мс | таблицы {new_time * 1000:.2f} мс "
+                      f"| x{old_time / new_time:.1f}")
+
+            # vocab.bin: привязан к хэшу весов, после их изменения не принимается
+            os.makedirs('data', exist_ok=True)
+            with open(codec.WEIGHTS_PATH, 'wb') as f:
+                f.write(os.urandom(4096))
+            for tokenizer, source in ((char, codec.VOCAB_PATH), (bpe, codec.TOKENIZER_PATH)):
+                codec.bind_to_weights(tokenizer)
+                loaded = codec.load_codec()
+                if tokenizer is char:
+                    json_time = timed(lambda: codec.CharTokenizer.load())
+                else:
+                    json_time = timed(lambda: codec.ByteBPETokenizer.load())
+                bin_time = timed(codec.load_codec)
+                same = (loaded is not None and loaded.tokenizer_id == tokenizer.tokenizer_id
+                        and loaded.decode(loaded.encode(sample)) == tokenizer.decode(tokenizer.encode(sample)))
+                print(f"{tokenizer.mode}: {source} {os.path.getsize(source) / 1024:.1f} КБ, "
+                      f"{json_time * 1000:.2f} мс | vocab.bin "
+                      f"{os.path.getsize(codec.CODEC_PATH) / 1024:.1f} КБ, {bin_time * 1000:.2f} мс "
+                      f"(с хэшем весов) | совпадение {'✅' if same else '❌'}")
+                ok = ok and same
+            with open(codec.WEIGHTS_PATH, 'ab') as f:
+                f.write(b'evolution')
+            stale = codec.load_codec() is None
+            print(f"vocab.bin от старых весов отвергнут: {'✅' if stale else '❌'}")
+
+            shared = codec.get_tokenizer() is codec.get_tokenizer()
+            print(f"Один экземпляр на процесс: {'✅' if shared else '❌'}")
+            ok = ok and stale and shared
+        finally:
+            codec._shared.clear()
+            os.chdir(cwd)
+    return ok
+
+@check("daemon")
+def bench_daemon():
+    """Демон инференса: микропакеты от параллельных клиентов против последовательных запросов"""
+    import contextlib
+    import io
+    import threading
+    from engine import tokenizer as codec
+    from engine.inference_server import InferenceClient, InferenceServer
+    from engine.son_engine import SonEngine
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'data', 'dna.txt'), 'r', encoding='utf-8') as f:
+        text = f.read()
+    messages = [text[i:i + 40] for i in range(0, 8 * 40, 40)]
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        log = io.StringIO()
+        try:
+            codec.CharTokenizer.from_text(text).save()
+            with contextlib.redirect_stdout(log):
+                engine = SonEngine(codec.get_tokenizer().vocab_size, device='cpu')
+                engine.max_response_tokens = 60
+                engine.evolution_threshold = 10 ** 9
+                server = InferenceServer(engine, port=0, batch_window_ms=20, max_batch=8).start()
+            client = InferenceClient(*server.address)
+
+            def run_parallel(requests):
+                replies = [None] * len(requests)
+                def ask(i, message, session_id):
+                    replies[i] = client.generate_response(message, "Гость", session_id)
+                threads = [threading.Thread(target=ask, args=(i, *request))
+                           for i, request in enumerate(requests)]
+                with contextlib.redirect_stdout(log):
+                    start = time.perf_counter()
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                return time.perf_counter() - start, replies
+
+            with contextlib.redirect_stdout(log):
+                start = time.perf_counter()
+                sequential = [client.generate_response(m, "Гость", f"seq:{i}")
+                              for i, m in enumerate(messages)]
+                sequential_time = time.perf_counter() - start
+            before = client.metrics()
+            parallel_time, parallel = run_parallel(
+                [(m, f"par:{i}") for i, m in enumerate(messages)])
+            after = client.metrics()
+            batches = after['batches'] - before['batches']
+            print(f"{len(messages)} запросов по очереди: {sequential_time * 1000:.0f} мс | "
+                  f"параллельно: {parallel_time * 1000:.0f} мс за {batches} пакет(а) | "
+                  f"x{sequential_time / parallel_time:.1f}")
+            answered = all(isinstance(r, str) and r for r in sequential + parallel)
+            batched = batches < len(messages)
+
+            # Два сообщения одной сессии не должны попасть в один пакет
+            before = client.metrics()
+            run_parallel([(messages[0], "same"), (messages[1], "same")])
+            separate = client.metrics()['batches'] - before['batches'] == 2
+
+            # Таймаут: отменённый запрос движок не выполняет, повтор сохраняется один раз
+            hold = threading.Event()
+            server.operations['hold'] = lambda payload: {'held': hold.wait(10)}
+            holder = threading.Thread(target=client.call, args=('hold',))
+            holder.start()
+            time.sleep(0.05)
+            server.timeout = 0.1
+            try:
+                client.generate_response(messages[2], "Гость", "timeout")
+                timed_out = False
+            except RuntimeError:
+                timed_out = True
+            server.timeout = 30
+            interactions, memories = engine.interaction_count, len(engine.memory)
+            hold.set()
+            holder.join()
+            with contextlib.redirect_stdout(log):
+                retried = client.generate_response(messages[2], "Гость", "timeout")
+                responses = client.generate_responses([(messages[3], "Гость", "batch:0"),
+                                                       (messages[4], "Гость", "batch:1")])
+            cancelled = (timed_out and bool(retried) and engine.interaction_count == interactions + 3
+                         and len(engine.memory) == memories + 3 and all(responses))
+
+            metrics = client.metrics()
+            print(f"Метрики: пакеты {metrics['batch_sizes']}, средний {metrics['mean_batch_size']:.1f}, "
+                  f"макс. очередь {metrics['max_queue_depth']}, ожидание {metrics['mean_wait_ms']:.1f} мс, "
+                  f"пакет {metrics['mean_batch_ms']:.0f} мс")
+            status = client.get_status()
+            try:
+                client.call('unknown')
+                rejected = False
+            except RuntimeError:
+                rejected = True
+            print(f"Ответы {'✅' if answered else '❌'} | микропакеты {'✅' if batched else '❌'} | "
+                  f"одна сессия — разные пакеты {'✅' if separate else '❌'} | "
+                  f"статус {'✅' if status.get('vocab_size') == engine.tokenizer.vocab_size else '❌'} | "
+                  f"неизвестная операция отклонена {'✅' if rejected else '❌'} | "
+                  f"отменённый по таймауту не выполнен {'✅' if cancelled else '❌'}")
+            ok = answered and batched and separate and rejected and cancelled
+            server.stop()
+        finally:
+            codec._shared.clear()
+            os.chdir(cwd)
+    return ok
+
+@check("bridge")
+def bench_bridge():
+    """Telegram-мост: задержка цикла событий, порядок по пользователю, лимиты и «печатает»"""
+    import asyncio
+    import contextlib
+    import io
+    try:
+        from telegram_bridge import ArkTelegramBridge
+    except ImportError as e:
+        print(f"python-telegram-bot недоступен ({e}) — пропущено")
+        return True
+    from engine import tokenizer as codec
+    from engine.log_store import LogStore
+
+    class FakeMessage:
+        def __init__(self, text, log):
+            self.text = text
+            self.log = log
+        async def reply_text(self, text):
+            self.log.append((self.text, text))
+            return self
+        async def edit_text(self, text):
+            self.log.append((self.text, text))
+
+    class FakeBot:
+        def __init__(self):
+            self.typing = 0
+        async def send_chat_action(self, chat_id, action):
+            self.typing += 1
+
+    def make_update(user_id, text, log):
+        user = type('User', (), {'id': user_id, 'first_name': str(user_id)})()
+        chat = type('Chat', (), {'id': user_id})()
+        return type('Update', (), {'effective_user': user, 'effective_chat': chat,
+                                   'message': FakeMessage(text, log)})()
+
+    async def max_lag(work):
+        """Наибольшая задержка тика цикла событий, пока выполняется work"""
+        lag = 0.0
+        async def ticker():
+            nonlocal lag
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag = max(lag, time.perf_counter() - start - 0.005)
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0.01)
+        await work
+        await asyncio.sleep(0.01)
+        task.cancel()
+        return lag
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'data', 'dna.txt'), 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        log = io.StringIO()
+        try:
+            codec.CharTokenizer.from_text(text).save()
+            os.makedirs("data/logs")
+            bridge = ArkTelegramBridge("token", [1, 2, 3], max_pending_per_user=3,
+                                       typing_interval=0.05)
+            with contextlib.redirect_stdout(log):
+                bridge.initialize_engine()
+            bridge.engine.max_response_tokens = 60
+            bridge.engine.evolution_threshold = 10 ** 9
+            bot = FakeBot()
+            context = type('Context', (), {'bot': bot})()
+
+            async def scenario():
+                # Прежний путь: синхронная генерация прямо в обработчике
+                async def blocking():
+                    bridge.engine.generate_response("Привет", "Гость")
+                old_lag = await max_lag(blocking())
+
+                replies = []
+                sent = [(1, f"a{i}") for i in range(5)] + [(2, f"b{i}") for i in range(2)]
+                async def burst():
+                    await asyncio.gather(*(
+                        bridge.handle_message(make_update(user, message, replies), context)
+                        for user, message in sent
+                    ))
+                new_lag = await max_lag(burst())
+                return old_lag, new_lag, replies
+
+            with contextlib.redirect_stdout(log):
+                old_lag, new_lag, replies = asyncio.run(scenario())
+            busy = [m for m, reply in replies if reply.startswith("⏳")]
+            answered = []
+            for message, reply in replies:
+                if not reply.startswith("⏳") and message not in answered:
+                    answered.append(message)
+            ordered = [m for m in answered if m.startswith("a")] == ["a0", "a1", "a2"]
+            logged = len(LogStore("telegram_conversations").tail(10)) == 5
+            print(f"Задержка цикла событий: синхронный ответ {old_lag * 1000:.0f} мс | "
+                  f"мост {new_lag * 1000:.1f} мс")
+            print(f"Ответы {answered} | отказ по очереди: {busy} | «печатает» отправлено {bot.typing} раз")
+            passed = (new_lag < old_lag / 2 and busy == ["a3", "a4"] and ordered
+                      and len(answered) == 5 and bot.typing > 5 and logged and not bridge.pending)
+            print(f"Цикл не блокируется, порядок, обратное давление, лог: {'✅' if passed else '❌'}")
+            ok = passed
+            bridge.executor.shutdown(wait=True)
+            bridge.log_executor.shutdown(wait=True)
+        finally:
+            codec._shared.clear()
+            os.chdir(cwd)
+    return ok
+
+@check("logstore")
+def bench_logstore():
+    """Журналы: запись в JSONL-сегмент против перезаписи JSON-массива, хвост, сбой, процессы"""
+    import json
+    from collections import Counter
+    from engine.log_store import LogStore, migrate_json_log
+
+    entry = {'timestamp': '2026-01-01T00:00:00', 'user_name': 'Отец',
+             'message': 'Как ты сегодня? ' * 4, 'response': 'Я здесь. ' * 8}
+
+    def rewrite_append(path, item):
+        # Прежний путь: прочитать весь массив, дописать, записать заново
+        with open(path, 'r', encoding='utf-8') as f:
+            log = json.load(f)
+        log.append(item)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(log, f, ensure_ascii=False, indent=2)
+
+    ok = True
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (1000, 10000):
+            path = os.path.join(tmp, f"old_{size}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump([entry] * size, f, ensure_ascii=False, indent=2)
+            store = LogStore(f"new_{size}", tmp, max_bytes=64 * 1024 * 1024)
+            store.append_many([entry] * size)
+
+            old = timed(lambda: rewrite_append(path, entry), repeat=5)
+            new = timed(lambda: store.append(entry), repeat=50)
+            def tail_json():
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)[-100:]
+            tail_old = timed(tail_json, repeat=5)
+            tail_new = timed(lambda: store.tail(100), repeat=20)
+            print(f"{size:>6} записей | запись: JSON {old * 1000:7.2f} мс, JSONL {new * 1000:.3f} мс "
+                  f"(x{old / new:.0f}) | хвост 100: {tail_old * 1000:6.2f} мс → {tail_new * 1000:.2f} мс")
+            ok = ok and new < old and tail_new < tail_old
+
+        # Обрыв посреди строки: чтение её пропускает, следующая запись не склеивается
+        store = LogStore("crash", tmp)
+        store.append_many([{'n': i} for i in range(3)])
+        with open(store.segments()[-1], 'ab') as f:
+            f.write(b'{"n": 3, "tex')
+        store.append({'n': 4})
+        recovered = [item['n'] for item in store.read()] == [0, 1, 2, 4]
+        print(f"Оборванная строка пропущена, запись после сбоя цела: {'✅' if recovered else '❌'}")
+
+        # Несколько процессов пишут в один журнал одновременно
+        script = ("import sys; sys.path.insert(0, sys.argv[1])\n"
+                  "from engine.log_store import LogStore\n"
+                  "store = LogStore('shared', sys.argv[2])\n"
+                  "for i in range(200): store.append({'worker': int(sys.argv[3]), 'i': i, 'pad': 'x' * 200})")
+        workers = [subprocess.Popen([sys.executable, '-c', script, root, tmp, str(w)]) for w in range(4)]
+        for worker in workers:
+            worker.wait()
+        shared = list(LogStore("shared", tmp).read())
+        per_worker = Counter(item['worker'] for item in shared)
+        concurrent = len(shared) == 800 and all(per_worker[w] == 200 for w in range(4))
+        print(f"4 процесса × 200 записей: прочитано {len(shared)} целых: {'✅' if concurrent else '❌'}")
+
+        # Перенос старых файлов: массив, пустой, мусор
+        with open(os.path.join(tmp, "legacy.json"), 'w', encoding='utf-8') as f:
+            json.dump([{'n': i} for i in range(5)], f)
+        open(os.path.join(tmp, "empty_log.json"), 'w').close()
+        with open(os.path.join(tmp, "garbage.json"), 'wb') as f:
+            f.write(b'PK\x03\x04\x00\x00garbage')
+        results = [migrate_json_log(os.path.join(tmp, name), tmp)
+                   for name in ("legacy.json", "empty_log.json", "garbage.json")]
+        migrated = (results == [('migrated', 5), ('empty', 0), ('corrupt', 0)]
+                    and len(list(LogStore("legacy", tmp).read())) == 5
+                    and os.path.exists(os.path.join(tmp, "garbage.json.corrupt")))
+        print(f"Перенос JSON: {results}: {'✅' if migrated else '❌'}")
+
+        # Ротация по размеру и сжатие закрытых сегментов
+        store = LogStore("rotated", tmp, max_bytes=4096)
+        for i in range(200):
+            store.append({'i': i, 'pad': 'x' * 100})
+        before = len(store.segments())
+        merged, kept = store.compact(keep_last=50)
+        after = [item['i'] for item in store.read()]
+        compacted = (before > 2 and len(store.segments()) == 2 and kept == 50
+                     and after == sorted(after) and after[-1] == 199)
+        print(f"Ротация: сегментов {before} → после сжатия {len(store.segments())}, "
+              f"записей {len(after)}: {'✅' if compacted else '❌'}")
+        ok = ok and recovered and concurrent and migrated and compacted
+    return ok
+
+@check("memory")
+def bench_memory_bank():
+    """MemoryBank: матрица со слотами против torch.stack списка тензоров на каждый запрос"""
+    import gc
+    import numpy as np
+    import torch.nn.functional as F
+    from engine.memory_bank import MemoryBank
+
+    n_state = 256
+    cell = type('Cell', (), {'subjectivity': torch.tensor(0.3)})()
+
+    def legacy_similarities(memories, query):
+        # Прежний путь: матрица собирается из списка на каждый запрос
+        memories_tensor = torch.stack(memories).to(query.device)
+        return F.cosine_similarity(query.reshape(1, -1), memories_tensor, dim=1).cpu().numpy()
+
+    ok = True
+    for size in (2000, 100000, 1000000):
+        torch.manual_seed(size)
+        data = torch.randn(size, n_state)
+        query = torch.randn(1, n_state)
+        repeat = 3 if size < 10 ** 6 else 1
+
+        bank = MemoryBank(max_size=size, n_state=n_state)
+        start = time.perf_counter()
+        for i in range(size):
+            bank.add(data[i], f"Отец: сообщение {i}", emotional_weight=(i % 10) / 10)
+        add_time = (time.perf_counter() - start) / size
+        new = bank.similarities(query)
+        new_time = timed(lambda: bank.similarities(query), repeat)
+        full_time = timed(lambda: bank.find_resonant(query, cell, speaker="Отец"), 2)
+        del bank
+        gc.collect()
+
+        memories = [row.clone() for row in data]
+        del data
+        if size < 10 ** 6:
+            legacy = legacy_similarities(memories, query)
+            legacy_time = timed(lambda memories=memories: legacy_similarities(memories, query), repeat)
+            same = np.allclose(new, legacy, atol=1e-6) and np.array_equal(
+                np.argsort(new)[-100:], np.argsort(legacy)[-100:])
+            legacy_label = f"{legacy_time * 1000:8.2f} мс"
+        else:
+            # Прежний путь на 1M не помещается в память (список 2 ГБ + stack + временные
+            # тензоры cosine_similarity) — замеряется только сборка матрицы
+            legacy_time = timed(lambda memories=memories: torch.stack(memories), repeat)
+            same = True
+            legacy_label = f"≥{legacy_time * 1000:7.0f} мс"
+        del memories
+        gc.collect()
+
+        line = (f"{size:>8} воспоминаний | сходство: stack {legacy_label}, "
+                f"матрица {new_time * 1000:7.2f} мс (x{legacy_time / new_time:.0f}) | "
+                f"add {add_time * 1e6:.1f} мкс | совпадение {'✅' if same else '❌'} | "
+                f"find_resonant {full_time * 1000:.1f} мс")
+        print(line)
+        ok = ok and same and new_time < legacy_time
+
+    # Вытеснение освобождает слот, следующий add занимает его; индекс сущностей без сдвигов
+    bank = MemoryBank(max_size=4, n_state=8, capacity=2)
+    for i in range(6):
+        bank.add(torch.full((8,), float(i + 1)), f"Гость: {i}", speaker="Гость",
+                 emotional_weight=0.1 * i, entities=[f"e{i}"])
+    _, found = bank.find_resonant(torch.ones(1, 8), cell, top_k=10)
+    texts = sorted(meta['text'] for meta in found)
+    slots_ok = (len(bank) == 4 and bank.size == 4 and len(bank.vectors) == 4 and len(found) == 4
+                and all(bank.find_by_entity(f"e{i}")[0]['text'] == f"Гость: {i}"
+                        for i in range(6) if bank.has_entity(f"e{i}")))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "memory_bank.json")
+        bank.save(path)
+        restored = MemoryBank(n_state=8)
+        restored.load(path)
+        _, found_again = restored.find_resonant(torch.ones(1, 8), cell, top_k=10)
+        slots_ok = slots_ok and sorted(meta['text'] for meta in found_again) == texts and all(
+            restored.find_by_entity(entity)[0]['text'] == bank.find_by_entity(entity)[0]['text']
+            for entity in bank.entity_index)
+    print(f"Вытеснение, повторное использование слотов, сохранение: {'✅' if slots_ok else '❌'}")
+    return ok and slots_ok
+
+@check("scoring")
+def bench_resonance_scoring():
+    """Счёт резонанса: колонки numpy против циклов по словарям meta, совпадение ранжирования"""
+    import json
+    import math
+    import random
+    from datetime import datetime, timedelta
+    import numpy as np
+    from engine.memory_bank import MemoryBank
+    from engine.memory_lexicon import tokenize
+
+    def legacy_scores(bank, query, cell, speaker=None, context=None):
+        # Прежний счёт: до трёх проходов по словарям и разбор даты на каждое воспоминание
+        scores = bank.similarities(query)
+        alpha = torch.exp(cell.log_alpha).item() if hasattr(cell, 'log_alpha') else 0.5
+        scores += alpha * cell.subjectivity.item()
+        live = [(i, meta) for i, meta in enumerate(bank.meta) if meta is not None]
+        if speaker:
+            for i, meta in live:
+                if meta['speaker'] == speaker:
+                    scores[i] += 0.2
+                elif speaker == "Отец" and meta['speaker'] == "Сын":
+                    scores[i] += 0.1
+        for i, meta in live:
+            scores[i] += meta['emotional_weight'] * 0.15
+            scores[i] += meta['importance'] * 0.1
+            decay = meta['access_count'] * 0.005
+            scores[i] -= decay
+            memory_time = datetime.fromisoformat(meta['timestamp'])
+            if datetime.now() - memory_time < timedelta(hours=24):
+                scores[i] += 0.05
+        if context:
+            # BM25 по словам контекста перебором всех текстов
+            texts = {i: tokenize(meta['text']) for i, meta in live}
+            average = sum(len(words) for words in texts.values()) / len(texts)
+            for word in set(tokenize(context)):
+                df = sum(word in words for words in texts.values())
+                idf = math.log(1 + (len(texts) - df + 0.5) / (df + 0.5))
+                for i, words in texts.items():
+                    tf = words.count(word)
+                    if tf:
+                        scores[i] += 0.02 * idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * len(words) / average))
+        scores[~bank.alive[:bank.size]] = -np.inf
+        return scores
+
+    def set_intersection(bank, context):
+        # Прежний контекстный бонус: множество слов каждого текста на каждый запрос
+        words = set(context.lower().split())
+        return [len(words & set(meta['text'].lower().split())) for _, meta in bank._live_meta()]
+
+    n_state = 16
+    speakers = ["Отец", "Сын", "Гость", "Василина"]
+    cell = type('Cell', (), {'subjectivity': torch.tensor(0.37)})()
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (2000, 100000):
+            # Банк с разнородными метаданными: говорящие, возраст, число обращений
+            rng = random.Random(size)
+            torch.manual_seed(size)
+            path = os.path.join(tmp, f"bank_{size}.json")
+            now = datetime.now()
+            meta = []
+            for i in range(size):
+                speaker = rng.choice(speakers)
+                meta.append({
+                    'text': f"{speaker}: память {i} слово{i % 50} важно" if i % 7 == 0 else f"{speaker}: {i}",
+                    'speaker': speaker,
+                    'timestamp': (now - timedelta(hours=rng.uniform(0, 24 * 60))).isoformat(),
+                    'emotional_weight': rng.random(),
+                    'access_count': rng.randrange(20),
+                    'last_accessed': now.isoformat(),
+                    'importance': rng.random(),
+                    'entities': [],
+                    'speaker_style': ''
+                })
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'memories': torch.randn(size, n_state).tolist(), 'meta': meta,
+                           'entity_index': {}, 'max_size': size}, f, ensure_ascii=False)
+            bank = MemoryBank(n_state=n_state)
+            bank.load(path)
+            for _ in range(size // 100):
+                bank._remove_least_used()
+
+            same = True
+            for speaker, context in ((None, None), ("Отец", None), ("Гость", "слово7 важно")):
+                query = torch.randn(1, n_state)
+                old = legacy_scores(bank, query, cell, speaker, context)
+                new = bank.resonance_scores(query, cell, speaker, context)
+                legacy_top = np.argsort(old)[-5:][::-1]
+                _, found = bank.find_resonant(query, cell, top_k=5, speaker=speaker, context=context)
+                # BM25 складывается в другом порядке — совпадение до округления float32
+                equal = np.array_equal(old, new) if context is None else np.allclose(old, new, rtol=0, atol=1e-5)
+                same = same and equal and [bank.meta[i]['text'] for i in legacy_top] == [m['text'] for m in found]
+            # Индекс слов ведётся при вытеснении и добавлении: счёт тот же, что перебором
+            for i in range(size // 100):
+                bank._remove_least_used()
+                bank.add(torch.randn(n_state), f"Гость: новое слово7 {i}", speaker="Гость")
+            query = torch.randn(1, n_state)
+            old = legacy_scores(bank, query, cell, "Гость", "слово7 важно")
+            new = bank.resonance_scores(query, cell, "Гость", "слово7 важно")
+            same = same and np.allclose(old, new, rtol=0, atol=1e-5)
+
+            query = torch.randn(1, n_state)
+            old_time = timed(lambda: np.argsort(legacy_scores(bank, query, cell, "Отец"))[-5:], 2)
+            new_time = timed(lambda: bank.find_resonant(query, cell, speaker="Отец"), 3)
+            context = "важно слово7"
+            old_context = timed(lambda: set_intersection(bank, context), 2)
+            new_context = timed(lambda: bank.find_resonant(query, cell, speaker="Отец", context=context), 3)
+            print(f"{size:>7} воспоминаний | циклы по meta {old_time * 1000:8.1f} мс | "
+                  f"find_resonant {new_time * 1000:6.2f} мс (x{old_time / new_time:.0f}) | "
+                  f"счёт и топ-5 совпадают: {'✅' if same else '❌'}")
+            print(f"{'':>7} с контекстом | множества слов {old_context * 1000:7.1f} мс | "
+                  f"find_resonant {new_context * 1000:6.2f} мс (x{old_context / new_context:.0f})")
+            ok = ok and same and new_time < old_time and new_context < old_context
+    return ok
+
+@check("ann")
+def bench_ann_index():
+    """ANN-индекс памяти: recall@k против точного поиска, задержка, вставка и удаление"""
+    import gc
+    import contextlib
+    import io
+    import numpy as np
+    from engine import memory_index
+    from engine.memory_bank import MemoryBank
+
+    n_state = 256
+    cell = type('Cell', (), {'subjectivity': torch.tensor(0.3)})()
+    speakers = ["Отец", "Сын", "Гость", "Василина"]
+    backends = ['ivf'] + (['faiss'] if memory_index.faiss is not None else [])
+    ok = True
+    for size in (100000, 1000000):
+        # Кластеризованные вектора (как у реальных эмбеддингов), запросы — из того же распределения
+        torch.manual_seed(size)
+        centers = torch.randn(size // 200, n_state)
+        labels = torch.randint(len(centers), (size,))
+        bank = MemoryBank(max_size=size, n_state=n_state, ann_min_size=10000)
+        for i in range(size):
+            bank.add(centers[labels[i]] + 0.6 * torch.randn(n_state), f"память {i}",
+                     speaker=speakers[i % 4], emotional_weight=(i % 10) / 10)
+        queries = [centers[torch.randint(len(centers), ())] + 0.6 * torch.randn(n_state) for _ in range(50)]
+
+        for backend in backends:
+            index = memory_index.create_index(n_state, backend)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                bank.set_index(index)
+            train_time = time.perf_counter() - start
+
+            cosine_hits = final_hits = 0
+            exact_time = ann_time = 0.0
+            for n, query in enumerate(queries):
+                speaker = speakers[n % 4]
+                start = time.perf_counter()
+                exact = bank.resonance_scores(query, cell, speaker)
+                exact_top = set(np.argsort(exact)[-5:].tolist())
+                exact_time += time.perf_counter() - start
+                start = time.perf_counter()
+                _, found = bank.find_resonant(query, cell, top_k=5, speaker=speaker)
+                ann_time += time.perf_counter() - start
+                # Без вытеснений слот совпадает с номером в тексте
+                final_hits += len(exact_top & {int(meta['text'].split()[1]) for meta in found})
+                cosine_top = set(np.argsort(bank.similarities(query))[-5:].tolist())
+                candidates = index.candidates(query.reshape(1, -1).numpy(), bank.ann_candidates)
+                cosine_hits += len(cosine_top & set(candidates.tolist()))
+            recall = final_hits / (5 * len(queries))
+            print(f"{size:>8} воспоминаний, {backend:>5} | обучение {train_time:5.1f} с | "
+                  f"точно {exact_time / len(queries) * 1000:6.1f} мс, ANN {ann_time / len(queries) * 1000:5.1f} мс "
+                  f"(x{exact_time / ann_time:.1f}) | recall@5 сходства {cosine_hits / (5 * len(queries)):.2f}, "
+                  f"итогового топа {recall:.2f}")
+            ok = ok and recall >= 0.9 and ann_time < exact_time
+        del bank, centers, labels
+        gc.collect()
+
+    # Инкрементальные вставка и удаление без переобучения
+    torch.manual_seed(1)
+    bank = MemoryBank(max_size=3000, n_state=32, ann_min_size=1000, ann_candidates=16)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bank.set_index(memory_index.create_index(32, 'ivf', n_probe=4))
+    vectors = torch.randn(4000, 32)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, vector in enumerate(vectors):
+            bank.add(vector, f"память {i}", emotional_weight=0.0)
+    live = np.flatnonzero(bank.alive[:bank.size])
+    indexed = len(bank.index) == len(bank) == 3000 and all(bank.index.assignment[live] >= 0)
+    _, found = bank.find_resonant(vectors[-1], cell, top_k=1)
+    evicted = [i for i in range(4000) if not any(meta and meta['text'] == f"память {i}" for meta in bank.meta)]
+    _, found_evicted = bank.find_resonant(vectors[evicted[0]], cell, top_k=3)
+    incremental = (indexed and found[0]['text'] == "память 3999"
+                   and all(meta['text'] != f"память {evicted[0]}" for meta in found_evicted))
+    print(f"Вставка после обучения находится, вытесненное не возвращается: {'✅' if incremental else '❌'}")
+
+    # Оборванный файл индекса (сбой питания) — не ошибка запуска, а переобучение
+    with tempfile.TemporaryDirectory() as tmp:
+        bank.index.save(tmp)
+        restored = memory_index.create_index(32, 'ivf', n_probe=4)
+        intact = restored.load(tmp) and np.array_equal(restored.assignment, bank.index.assignment)
+        path = os.path.join(tmp, 'ivf.assignment.npy')
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) // 2)
+        truncated = memory_index.create_index(32, 'ivf', n_probe=4)
+        with contextlib.redirect_stdout(io.StringIO()):
+            retrain = not truncated.load(tmp) and not truncated.is_trained
+    print(f"Индекс из точки читается: {'✅' if intact else '❌'} | "
+          f"оборванный файл — переобучение: {'✅' if retrain else '❌'}")
+    return ok and incremental and intact and retrain
+
+@check("eviction")
+def bench_eviction():
+    """Вытеснение: кучи со стабильными id против полного пересчёта, поток вставок на пределе"""
+    import json
+    import random
+    from datetime import datetime, timedelta
+    import numpy as np
+    from engine.memory_bank import MemoryBank
+
+    def full_scan_victim(bank):
+        # Прежний выбор: счёт всех воспоминаний заново, минимум (при равенстве — меньший id)
+        slots = np.flatnonzero(bank.alive[:bank.size])
+        columns = {name: column[slots] for name, column in bank.columns.items()}
+        now = (datetime.now() - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+        scores = columns['importance'] / (columns['access_count'] + 1)
+        scores = np.where(now - columns['timestamp'] > timedelta(days=30) // timedelta(microseconds=1),
+                          scores * 0.5, scores)
+        return int(columns['id'][np.lexsort((columns['id'], scores))[0]])
+
+    class FullScanBank(MemoryBank):
+        # Прежнее вытеснение: argmin по колонкам всех слотов на каждую вставку
+        def _remove_least_used(self):
+            columns = {name: column[:self.size] for name, column in self.columns.items()}
+            now = (datetime.now() - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+            scores = columns['importance'] / (columns['access_count'] + 1)
+            scores = np.where(now - columns['timestamp'] > timedelta(days=30) // timedelta(microseconds=1),
+                              scores * 0.5, scores)
+            scores[~self.alive[:self.size]] = np.inf
+            self._forget(int(np.argmin(scores)))
+
+    cell = type('Cell', (), {'subjectivity': torch.tensor(0.3)})()
+
+    # Совпадение с полным пересчётом: возраст до 60 дней, обращения, повторяющиеся важности
+    rng = random.Random(0)
+    now = datetime.now()
+    size = 3000
+    meta = [{'text': f"память {i}", 'speaker': "Отец",
+             'timestamp': (now - timedelta(days=rng.uniform(0, 60))).isoformat(),
+             'emotional_weight': 0.5, 'access_count': rng.randrange(5), 'last_accessed': now.isoformat(),
+             'importance': rng.choice([0.1, 0.2, 0.35, 0.5, rng.random()]),
+             'entities': [f"e{i % 300}"], 'speaker_style': ''} for i in range(size)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "memory_bank.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'memories': torch.randn(size, 16).tolist(), 'meta': meta,
+                       'entity_index': {}, 'max_size': size}, f)
+        bank = MemoryBank(n_state=16)
+        bank.load(path)
+        same = True
+        for step in range(3000):
+            if step % 3 == 0:
+                bank.find_resonant(torch.randn(16), cell, top_k=5)
+            expected = full_scan_victim(bank)
+            bank.add(torch.randn(16), f"новая {step}", emotional_weight=rng.random(),
+                     entities=[f"e{step % 300}"])
+            same = same and expected not in bank.slot_of and len(bank) == size
+        postings = all(bank.has_entity(f"e{i}") == any(
+            f"e{i}" in m['entities'] for _, m in bank._live_meta()) for i in range(300))
+        found = all(len(bank.find_by_entity(f"e{i}")) == sum(
+            f"e{i}" in m['entities'] for _, m in bank._live_meta()) for i in range(300))
+        bank.save(path)
+        restored = MemoryBank(n_state=16)
+        restored.load(path)
+        stable = (restored.next_id == bank.next_id
+                  and {m['id'] for _, m in restored._live_meta()} == set(bank.slot_of)
+                  and full_scan_victim(restored) == full_scan_victim(bank))
+    print(f"3000 вытеснений совпали с полным пересчётом: {'✅' if same else '❌'} | "
+          f"сущности без перенумерации: {'✅' if postings and found else '❌'} | "
+          f"id переживают сохранение: {'✅' if stable else '❌'}")
+    ok = same and postings and found and stable
+
+    # Поток вставок, когда память заполнена: каждая вставка вытесняет
+    for size in (2000, 100000):
+        rates = []
+        for bank_class in (FullScanBank, MemoryBank):
+            torch.manual_seed(size)
+            bank = bank_class(max_size=size, n_state=256)
+            vectors = torch.randn(size, 256)
+            for i in range(size):
+                bank.add(vectors[i], f"память {i}", emotional_weight=(i % 10) / 10)
+            inserts = 2000
+            start = time.perf_counter()
+            for i in range(inserts):
+                bank.add(vectors[i], f"новая память {i}", emotional_weight=(i % 7) / 7)
+            rates.append(inserts / (time.perf_counter() - start))
+        print(f"{size:>7} воспоминаний | вставок в секунду на пределе: полный пересчёт {rates[0]:7.0f}, "
+              f"кучи {rates[1]:7.0f} (x{rates[1] / rates[0]:.1f})")
+        ok = ok and rates[1] > rates[0]
+    return ok
+
+@check("persistence")
+def bench_persistence():
+    """Хранилище памяти: точка .npy + SQLite и журнал против JSON, восстановление после сбоя"""
+    import contextlib
+    import io
+    import json
+    from engine.memory_bank import MemoryBank
+    from engine.memory_store import MemoryStore
+
+    def disk_size(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+
+    def state_of(bank):
+        # Воспоминания по id: метаданные и байты вектора — от раскладки по слотам не зависят
+        vectors, metas, state = bank.snapshot()
+        # и BM25 лексического индекса по id
+        slots, bm25 = bank.lexical_candidates("отец память 7 сын", len(bank))
+        lexical = sorted(zip(bank.columns['id'][slots].tolist(), bm25.round(6).tolist()))
+        return {meta['id']: (json.dumps(meta, sort_keys=True), vectors[row].tobytes())
+                for row, meta in enumerate(metas)}, state, lexical
+
+    cell = type('Cell', (), {'subjectivity': torch.tensor(0.3)})()
+    speakers = ["Отец", "Сын", "Гость", "Василина"]
+
+    # Сохранение и загрузка 100k воспоминаний
+    size, n_state = 100000, 256
+    torch.manual_seed(0)
+    bank = MemoryBank(max_size=size, n_state=n_state)
+    vectors = torch.randn(size, n_state)
+    for i in range(size):
+        bank.add(vectors[i], f"{speakers[i % 4]}: память номер {i}", speaker=speakers[i % 4],
+                 emotional_weight=(i % 10) / 10, entities=[f"сущность {i % 500}"])
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'memory_bank.json')
+        json_save = timed(lambda: bank.save(json_path), repeat=1)
+        json_load = timed(lambda: MemoryBank(max_size=size, n_state=n_state).load(json_path), repeat=1)
+        json_size = os.path.getsize(json_path)
+        os.remove(json_path)
+
+        store_path = os.path.join(tmp, 'memory')
+        store = MemoryStore(store_path)
+        store.open(bank, legacy_json=None)
+        store_save = timed(store.checkpoint, repeat=1)
+        store_size = disk_size(store_path)
+        restored = MemoryBank(max_size=size, n_state=n_state)
+        with contextlib.redirect_stdout(io.StringIO()):  # LOCK держит store: загрузка только для чтения
+            store_load = timed(lambda: MemoryStore(store_path).open(restored, legacy_json=None), repeat=1)
+        same = state_of(restored) == state_of(bank)
+
+        # Цена журнала на добавление (память заполнена — каждое add ещё и вытесняет)
+        bank.journal = None
+        add_plain = timed(lambda: [bank.add(vectors[i], f"память {i}") for i in range(2000)], repeat=1)
+        bank.journal = store
+        add_logged = timed(lambda: [bank.add(vectors[i], f"память {i}") for i in range(2000)], repeat=1)
+        store.close()
+    print(f"{size} воспоминаний | JSON: сохранение {json_save:5.1f} с, загрузка {json_load:5.1f} с, "
+          f"{json_size / 2 ** 20:6.1f} МБ")
+    print(f"{size} воспоминаний | .npy + SQLite: сохранение {store_save:5.1f} с, загрузка {store_load:5.1f} с, "
+          f"{store_size / 2 ** 20:6.1f} МБ (x{json_save / store_save:.0f} / x{json_load / store_load:.0f} / "
+          f"x{json_size / store_size:.1f}) | совпадение {'✅' if same else '❌'}")
+    print(f"add на пределе: без журнала {add_plain / 2000 * 1e6:.0f} мкс, с журналом {add_logged / 2000 * 1e6:.0f} мкс")
+    ok = same and store_save < json_save and store_load < json_load and store_size < json_size
+
+    # Восстановление: журнал после падения, оборванный кадр, сбой посреди точки
+    torch.manual_seed(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'memory')
+
+        def reopen():
+            bank = MemoryBank(max_size=3000, n_state=32)
+            store = MemoryStore(path)
+            replayed = store.open(bank, legacy_json=None)
+            store.close(flush=False)
+            return bank, replayed
+
+        bank = MemoryBank(max_size=3000, n_state=32)
+        store = MemoryStore(path)
+        store.open(bank, legacy_json=None)
+        for step in range(5000):
+            bank.add(torch.randn(32), f"память {step}", speaker=speakers[step % 4],
+                     emotional_weight=(step % 10) / 10, entities=[f"e{step % 300}"])
+            if step % 3 == 0:
+                bank.find_resonant(torch.randn(32), cell, top_k=5, speaker=speakers[step % 4])
+            if step == 2000:
+                store.checkpoint()
+        expected = state_of(bank)
+        store.close(flush=False)  # падение: контрольной точки нет, блокировка снята
+        recovered, replayed = reopen()
+        crash = state_of(recovered) == expected and replayed > 0
+
+        # Оборванная запись в конце журнала отбрасывается
+        wal = store._wal_path(store.generation)
+        wal_size = os.path.getsize(wal)
+        with open(wal, 'ab') as f:
+            f.write(b'\x40\x00\x00\x00\x12\x34\x56\x78{"op": "add", "me')
+        recovered, _ = reopen()
+        torn = state_of(recovered) == expected and os.path.getsize(wal) == wal_size
+
+        # Точка записана, но CURRENT не переключён: остаётся прежнее поколение с журналом
+        def crash_before_switch(generation):
+            raise OSError("сбой до переключения CURRENT")
+        store = MemoryStore(path)
+        store.open(MemoryBank(max_size=3000, n_state=32), legacy_json=None)
+        store._write_current = crash_before_switch
+        try:
+            store.checkpoint()
+        except OSError:
+            pass
+        store.close(flush=False)
+        recovered, _ = reopen()
+        atomic = (state_of(recovered) == expected
+                  and sorted(os.listdir(path)) == sorted(['CURRENT', 'LOCK', f"{store.generation:08d}",
+                                                          f"wal.{store.generation:08d}.log"]))
+
+        # Второй процесс при занятом LOCK: читает точку и журнал, но ничего не пишет и не удаляет
+        bank = MemoryBank(max_size=3000, n_state=32)
+        store = MemoryStore(path)
+        store.open(bank, legacy_json=None)
+        other_bank = MemoryBank(max_size=3000, n_state=32)
+        other = MemoryStore(path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            other.open(other_bank, legacy_json=None)
+        for step in range(10):
+            other_bank.add(torch.randn(32), f"второй процесс {step}")
+        try:
+            other.checkpoint()
+            refused = False
+        except RuntimeError:
+            refused = True
+        other.close()
+
+        # Писатель публикует точку, пока читатель без блокировки открывает память:
+        # между чтением CURRENT и точкой, между точкой и журналом — читатель перечитывает
+        def race(step):
+            fired = []
+            reader_bank = MemoryBank(max_size=3000, n_state=32)
+            reader = MemoryStore(path)
+            original = getattr(reader, step)
+
+            def after_checkpoint(*args):
+                if not fired:
+                    fired.append(step)
+                    bank.add(torch.randn(32), f"точка во время чтения ({step})")
+                    store.checkpoint()
+                return original(*args)
+            setattr(reader, step, after_checkpoint)
+            with contextlib.redirect_stdout(io.StringIO()):
+                reader.open(reader_bank, legacy_json=None)
+            reader.close()
+            return (bool(fired) and reader.generation == store.generation
+                    and state_of(reader_bank) == state_of(bank))
+        raced = race('_load_checkpoint') and race('_replay')
+
+        for step in range(10):
+            bank.add(torch.randn(32), f"первый процесс {step}")
+        store.checkpoint()
+        store.close()
+        recovered, _ = reopen()
+        locked = (other.read_only and refused and other_bank.journal is None and raced
+                  and state_of(other_bank)[0] != state_of(bank)[0] and state_of(recovered) == state_of(bank))
+
+        # Точка по сроку не запускается из add (путь ответа), только из checkpoint_if_due
+        bank = MemoryBank(max_size=3000, n_state=32)
+        store = MemoryStore(path, checkpoint_interval=0, max_wal_bytes=1)
+        store.open(bank, legacy_json=None)
+        generation = store.generation
+        bank.add(torch.randn(32), "срок точки подошёл")
+        deferred = store.generation == generation and store.checkpoint_due
+        deferred = deferred and store.checkpoint_if_due() and store.generation == generation + 1
+        deferred = deferred and not store.checkpoint_due and not store.checkpoint_if_due()
+        store.close()
+    print(f"Журнал после падения ({replayed} записей): {'✅' if crash else '❌'} | "
+          f"оборванный кадр отброшен: {'✅' if torn else '❌'} | "
+          f"сбой посреди точки: {'✅' if atomic else '❌'} | "
+          f"второй процесс только читает: {'✅' if locked else '❌'} | "
+          f"точка по сроку вне add: {'✅' if deferred else '❌'}")
+    return ok and crash and torn and atomic and locked and deferred
+
+@check("mmap")
+def bench_mapped_memory():
+    """Память в отображении: время до первого ответа SonEngine при 1M воспоминаний, load против mmap"""
+    import contextlib
+    import gc
+    import glob
+    import io
+    import json
+    from engine import tokenizer as codec
+    from engine.memory_bank import MemoryBank
+    from engine.memory_index import create_index
+    from engine.memory_store import MemoryStore
+    from engine.son_engine import SonEngine
+
+    def private_mb():
+        # Анонимная память процесса: страницы отображённых файлов сюда не входят
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('RssAnon:')) / 1024
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'data', 'dna.txt'), 'r', encoding='utf-8') as f:
+        text = f.read()
+    cell = type('Cell', (), {'subjectivity': torch.tensor(0.3)})()
+    speakers = ["Отец", "Сын", "Гость", "Василина"]
+    size, n_state = 1000000, 256
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            codec.CharTokenizer.from_text(text).save()
+            # Память на 1M: кластеризованные вектора, обученный IVF сохраняется в точке
+            torch.manual_seed(size)
+            centers = torch.randn(size // 200, n_state)
+            labels = torch.randint(len(centers), (size,))
+            bank = MemoryBank(max_size=2 * size, n_state=n_state, ann_min_size=50000)
+            store = MemoryStore('data/memory')
+            store.open(bank, legacy_json=None)
+            bank.journal = None  # наполнение без журнала: сразу точка
+            for i in range(size):
+                bank.add(centers[labels[i]] + 0.6 * torch.randn(n_state), f"{speakers[i % 4]}: память {i}",
+                         speaker=speakers[i % 4], emotional_weight=(i % 10) / 10, entities=[f"сущность {i % 1000}"])
+            with contextlib.redirect_stdout(io.StringIO()):
+                bank.set_index(create_index(n_state, 'ivf'))
+            checkpoint_time = timed(store.checkpoint, repeat=1)
+            disk = sum(os.stat(path).st_blocks * 512 for path in glob.glob('data/memory/*/*'))
+            store.close()
+            del bank, store, centers, labels
+            gc.collect()
+            print(f"{size} воспоминаний: точка {checkpoint_time:.1f} с, на диске {disk / 2 ** 20:.0f} МБ")
+
+            results = {}
+            for mode in ('load', 'mmap'):
+                os.makedirs('config', exist_ok=True)
+                with open('config/system_config.json', 'w', encoding='utf-8') as f:
+                    json.dump({'memory': {'open_mode': mode, 'ann': {'backend': 'ivf', 'min_size': 50000}}}, f)
+                gc.collect()
+                before = private_mb()
+                torch.manual_seed(0)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    engine = SonEngine(codec.get_tokenizer().vocab_size, device='cpu')
+                init_time = time.perf_counter() - start
+                engine.max_response_tokens = 20
+                engine.evolution_threshold = 10 ** 9
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    response = engine.generate_response("Привет, помнишь меня?")
+                reply_time = time.perf_counter() - start
+                private = private_mb() - before
+                torch.manual_seed(1)
+                _, found = engine.memory.find_resonant(torch.randn(n_state), cell, top_k=5, speaker="Отец")
+                results[mode] = [meta['id'] for meta in found]
+                print(f"{mode:>4} | SonEngine() {init_time:6.2f} с, первый ответ {reply_time:5.2f} с, "
+                      f"до ответа {init_time + reply_time:6.2f} с | своя память +{private:5.0f} МБ | "
+                      f"память {len(engine.memory)}")
+                ok = ok and bool(response) and len(engine.memory) == size + 1
+                if mode == 'mmap':
+                    ok = ok and init_time + reply_time < results['load_time']
+                results[f"{mode}_time"] = init_time + reply_time
+
+                # Журнал этого запуска не нужен следующему: оба стартуют с одной точки
+                engine.memory_store.close(flush=False)
+                for path in glob.glob('data/memory/wal.*.log'):
+                    os.remove(path)
+                del engine, found
+                gc.collect()
+            same = results['load'] == results['mmap']
+            print(f"Один и тот же топ в обоих режимах: {'✅' if same else '❌'} | "
+                  f"ускорение до первого ответа x{results['load_time'] / results['mmap_time']:.0f}")
+            ok = ok and same
+        finally:
+            codec._shared.clear()
+            os.chdir(cwd)
+    return ok
+
+@check("compression")
+def bench_vector_compression():
+    """Сжатие векторов памяти: МБ на миллион воспоминаний, recall@5 против точного fp32, задержка поиска"""
+    import gc
+    import numpy as np
+    from engine import memory_bank
+    from engine.memory_bank import MemoryBank
+
+    size, n_state = 200000, 256
+    torch.manual_seed(size)
+    centers = torch.randn(size // 200, n_state)
+    vectors = centers[torch.randint(len(centers), (size,))] + 0.6 * torch.randn(size, n_state)
+    queries = [centers[torch.randint(len(centers), ())] + 0.6 * torch.randn(n_state) for _ in range(50)]
+    metas = [{'id': i, 'text': f"память {i}", 'speaker': "Отец", 'timestamp': '2026-01-01T00:00:00',
+              'emotional_weight': 0.5, 'access_count': 0, 'last_accessed': '2026-01-01T00:00:00',
+              'importance': 0.5, 'entities': []} for i in range(size)]
+    exact = [set(np.argsort(torch.nn.functional.cosine_similarity(vectors, query[None]).numpy())[-5:].tolist())
+             for query in queries]
+
+    # Требования: recall@5 и байт на вектор. Внутри плотного кластера соседей различает
+    # только шум по всем координатам — PQ его почти теряет, порог для него — что топ не случаен
+    limits = {'none': (1.0, 4 * n_state), 'fp16': (0.95, 2 * n_state), 'int8': (0.9, n_state + 4),
+              'pq': (0.15, n_state // 8 + 2)}
+    ok = True
+    baseline = None
+    for compression, (min_recall, max_bytes) in limits.items():
+        bank = MemoryBank(max_size=size, n_state=n_state, capacity=size, compression=compression)
+        start = time.perf_counter()
+        bank.restore(vectors, [dict(meta) for meta in metas])
+        encode_time = time.perf_counter() - start
+        # Центроиды PQ — постоянная добавка, в байты на вектор не входят
+        fixed = sum(getattr(bank.vectors, name).nbytes for name in ('centroids', 'codebooks')
+                    if getattr(bank.vectors, name, None) is not None)
+        per_vector = (bank.vectors.nbytes - fixed) / len(bank.vectors)
+        hits = sum(len(top & set(np.argsort(bank.similarities(query))[-5:].tolist()))
+                   for query, top in zip(queries, exact))
+        recall = hits / (5 * len(queries))
+        query_time = timed(lambda bank=bank: [bank.similarities(query) for query in queries[:10]]) / 10
+        baseline = baseline or per_vector
+        print(f"{compression:>4} | {per_vector:6.1f} Б на вектор, {(per_vector * 10 ** 6 + fixed) / 2 ** 20:6.0f} МБ на 1M "
+              f"(x{baseline / per_vector:4.1f}) | кодирование {encode_time:5.1f} с | "
+              f"поиск по {size} {query_time * 1000:5.1f} мс | recall@5 {recall:.2f}")
+        ok = ok and recall >= min_recall and per_vector <= max_bytes
+        del bank
+        gc.collect()
+    columns = sum(np.dtype(dtype).itemsize for dtype, _ in memory_bank._COLUMNS.values())
+    print(f"При любом сжатии на воспоминание ещё 4 Б нормы и {columns + 1} Б колонок и карты слотов")
+    return ok
+
+@check("retrieval")
+def bench_hybrid_retrieval():
+    """Гибридный поиск памяти: RRF по плотному, лексическому и сигналу сущностей против одного сходства"""
+    import random
+    from engine.memory_bank import MemoryBank
+    from engine.memory_retrieval import HybridRetriever
+
+    # Воспоминание — точка в кластере, два слова из 5000 и сущность из 1000.
+    # Запрос к нему — зашумлённый вектор, одно его слово среди случайных и его сущность:
+    # каждый сигнал по отдельности находит цель нечасто, вместе — почти всегда
+    size, n_state = 50000, 64
+    rng = random.Random(size)
+    torch.manual_seed(size)
+    centers = torch.randn(size // 200, n_state)
+    vectors = centers[torch.randint(len(centers), (size,))] + 0.6 * torch.randn(size, n_state)
+    words = [[f"слово{rng.randrange(5000)}", f"слово{rng.randrange(5000)}"] for _ in range(size)]
+    entities = [f"Имя{rng.randrange(1000)}" for _ in range(size)]
+    bank = MemoryBank(max_size=size, n_state=n_state, capacity=size)
+    for i in range(size):
+        bank.add(vectors[i], f"Отец: {' '.join(words[i])} и ещё {i}", entities=[entities[i]])
+    bank.lexical_candidates("прогрев", 1)  # индекс слов строится при первом запросе
+    retriever = HybridRetriever(bank)
+    cell = type('Cell', (), {'subjectivity': torch.tensor(0.3)})()
+
+    targets = rng.sample(range(size), 200)
+    signal_hits = dict.fromkeys(('dense', 'lexical', 'entity'), 0)
+    dense_hits = fused_hits = 0
+    dense_time = 0.0
+    attributed = True
+    for target in targets:
+        query = vectors[target] + 2.0 * torch.randn(n_state)
+        text = f"помнишь {words[target][0]} слово{rng.randrange(5000)} слово{rng.randrange(5000)}"
+        start = time.perf_counter()
+        _, found = bank.find_resonant(query, cell, top_k=5)
+        dense_time += time.perf_counter() - start
+        dense_hits += any(meta['id'] == target for meta in found)
+        _, hits = retriever.retrieve(query, cell, text=text, entities=[entities[target]], top_k=5)
+        fused_hits += any(hit['meta']['id'] == target for hit in hits)
+        attributed = attributed and all(hit['signals'] for hit in hits)
+        # Есть ли цель в списке каждого сигнала (слот совпадает с id: вытеснений нет)
+        lists = {'dense': bank.dense_candidates(query, retriever.depth),
+                 'lexical': bank.lexical_candidates(text, retriever.depth),
+                 'entity': bank.entity_candidates([entities[target]], retriever.depth)}
+        for name, (slots, _) in lists.items():
+            signal_hits[name] += target in slots
+
+    report = retriever.report()
+    for name, stats in report.items():
+        print(f"{name:>7} | {stats['latency_ms']:6.2f} мс | кандидатов {stats['candidates']:5.1f} | "
+              f"цель в списке {signal_hits[name] / len(targets):.2f} | "
+              f"участвует в {stats['hit_rate'] * 100:3.0f}% найденного")
+    dense_recall, fused_recall = dense_hits / len(targets), fused_hits / len(targets)
+    total_ms = sum(stats['latency_ms'] for stats in report.values())
+    print(f"{size} воспоминаний | find_resonant {dense_time / len(targets) * 1000:5.2f} мс, recall@5 "
+          f"{dense_recall:.2f} | гибрид (сигналы {total_ms:5.2f} мс) recall@5 {fused_recall:.2f} | "
+          f"вклад сигналов у каждого найденного: {'✅' if attributed else '❌'}")
+    return attributed and fused_recall > dense_recall and fused_recall >= 0.9
+
+@check("embedder")
+def bench_query_embedder():
+    """Вектор запроса по всему тексту: различимость против первого символа, пакеты и кэш"""
+    import random
+    import torch.nn.functional as F
+    from engine.query_embedder import QueryEmbedder
+
+    # Фразы с общими началами; запрос — та же фраза без одного слова
+    rng = random.Random(0)
+    syllables = ['ма', 'па', 'ро', 'ду', 'ше', 'ли', 'ка', 'не', 'то', 'ви', 'зо', 'ры', 'мо', 'гу', 'се']
+    words = [''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(500)]
+    texts = [rng.choice(['Помнишь', 'Привет', 'Папа']) + ' ' + ' '.join(rng.choice(words) for _ in range(rng.randint(5, 10)))
+             for _ in range(2000)]
+    queries = []
+    for text in texts:
+        query = text.split()
+        del query[rng.randrange(len(query))]
+        queries.append(' '.join(query))
+    alphabet = {char: n for n, char in enumerate(sorted(set(''.join(texts))))}
+    encode = lambda text: [alphabet[char] for char in text]
+    model = make_model(vocab_size=len(alphabet))
+
+    def first_char(batch):
+        with torch.no_grad():
+            return torch.stack([model.embedding(torch.tensor([encode(text)[:1]])).mean(dim=1)[0] for text in batch])
+
+    def recall(embed):
+        similarity = F.normalize(embed(queries), dim=1) @ F.normalize(embed(texts), dim=1).T
+        return (similarity.argmax(dim=1) == torch.arange(len(texts))).float().mean().item()
+
+    recalls = {'первый символ': recall(first_char)}
+    embedders = {pooling: QueryEmbedder(model, encode, pooling=pooling) for pooling in ('mean', 'state')}
+    for pooling, embedder in embedders.items():
+        recalls[pooling] = recall(embedder.embed_uncached)
+    print(f"{len(texts)} фраз, recall@1 фразы без слова: "
+          + ", ".join(f"{name} {value:.2f}" for name, value in recalls.items()))
+
+    # Пакеты: та же выдача, что по одному тексту (state — до округления, которое рекуррентность растит)
+    sample = texts[:300]
+    same = True
+    for pooling, embedder in embedders.items():
+        one_by_one = lambda: torch.cat([embedder.embed_uncached([text]) for text in sample])
+        t_single = timed(one_by_one, 1)
+        t_batch = timed(lambda: embedder.embed_uncached(sample), 1)
+        agreement = F.cosine_similarity(one_by_one(), embedder.embed_uncached(sample)).min().item()
+        if pooling == 'mean':
+            same = agreement > 1 - 1e-6
+        print(f"{pooling:>5}, {len(sample)} фраз: по одной {t_single * 1000:6.0f} мс, пакетами "
+              f"{t_batch * 1000:5.0f} мс (x{t_single / t_batch:4.1f}) | мин. косинус с поштучным {agreement:.4f}")
+
+    # Кэш: повтор — без прогона, другая версия весов — пересчёт, старое вытесняется
+    embedder = QueryEmbedder(model, encode, pooling='state', cache_size=100)
+    cache = embedder.cache
+    t_cold = timed(lambda: embedder.embed([texts[0]], 'v1'), 1)
+    t_warm = timed(lambda: embedder.embed([texts[0]], 'v1'), 3)
+    hits = cache.hits
+    embedder.embed([texts[0]], 'v2')
+    versioned = cache.hits == hits and len(cache) == 2
+    embedder.embed(texts[1:500], 'v1')
+    hits, misses = cache.hits, cache.misses
+    embedder.embed([texts[499]], 'v1')
+    embedder.embed([texts[0]], 'v1')
+    bounded = len(cache) == 100 and cache.hits == hits + 1 and cache.misses == misses + 1
+    print(f"кэш: без него {t_cold * 1000:.2f} мс, из кэша {t_warm * 1000:.3f} мс | версия весов в ключе "
+          f"{'✅' if versioned else '❌'} | LRU ограничен {'✅' if bounded else '❌'}")
+
+    # Пересчёт памяти (scripts/reembed.py): вектора первого символа заменяются векторами
+    # по тексту, id, метаданные, сущности и лексический индекс остаются прежними
+    import contextlib
+    import io
+    import json
+    import reembed
+    from engine import tokenizer as codec
+    from engine.memory_bank import MemoryBank
+    from engine.memory_store import MemoryStore
+
+    def memory_state(bank):
+        _, metas, _ = bank.snapshot()
+        slots, bm25 = bank.lexical_candidates(' '.join(words[:50]), len(bank))
+        return ({meta['id']: json.dumps(meta, sort_keys=True) for meta in metas},
+                {entity: sorted(hit['text'] for hit in bank.find_by_entity(entity)) for entity in entities},
+                sorted(zip(bank.columns['id'][slots].tolist(), bm25.round(6).tolist())))
+
+    speakers = ["Отец", "Сын", "Гость"]
+    entities = words[:20]
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            tokenizer = codec.CharTokenizer.from_text(''.join(texts + speakers) + ': ')
+            tokenizer.save()
+            model = make_model(vocab_size=tokenizer.vocab_size)
+            torch.save(model.state_dict(), 'data/son_weights.pth')
+            os.makedirs('config', exist_ok=True)
+            with open('config/system_config.json', 'w', encoding='utf-8') as f:
+                json.dump({'memory': {'store_dir': 'data/memory', 'embedder': {'pooling': 'mean'}}}, f)
+
+            # Память с вытеснениями (дыры в слотах) и векторами первого символа, как до пересчёта
+            bank = MemoryBank(max_size=300, n_state=model.n_state)
+            store = MemoryStore('data/memory')
+            store.open(bank, legacy_json=None)
+            with torch.no_grad():
+                for n, text in enumerate(texts[:400]):
+                    vector = model.embedding(torch.tensor([tokenizer.encode(text)[:1]])).mean(dim=1).squeeze()
+                    bank.add(vector, f"{speakers[n % 3]}: {text}", speaker=speakers[n % 3],
+                             entities=[word for word in entities if word in text.split()])
+            before = memory_state(bank)
+            store.close()
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                exit_code = reembed.main()
+            bank = MemoryBank(max_size=300, n_state=model.n_state)
+            store = MemoryStore('data/memory')
+            store.open(bank, legacy_json=None)
+            vectors, metas, _ = bank.snapshot()
+            expected = QueryEmbedder(model, tokenizer.encode).embed_uncached(
+                [reembed.memory_text(meta) for meta in metas])
+            reembedded = torch.allclose(torch.from_numpy(vectors), expected, atol=1e-6)
+            kept = memory_state(bank) == before and len(metas) == 300
+            store.close()
+        finally:
+            codec._shared.clear()
+            os.chdir(cwd)
+    print(f"reembed.py: вектора по тексту без префикса {'✅' if exit_code == 0 and reembedded else '❌'} | "
+          f"id, метаданные, сущности, BM25 прежние {'✅' if kept else '❌'}")
+    return (recalls['mean'] >= 0.9 and recalls['mean'] > recalls['первый символ']
+            and same and versioned and bounded and exit_code == 0 and reembedded and kept)
+
+def main(names):
+    names = names or list(CHECKS)
+    failed = []
+    for name in names:
+        if name not in CHECKS:
+            print(f"Неизвестная проверка: {name}. Доступны: {', '.join(CHECKS)}")
+            return 1
+        print("=" * 60)
+        print(f"[{name.upper()}] {CHECKS[name].__doc__}")
+        print("=" * 60)
+        if CHECKS[name]() is False:
+            failed.append(name)
+    if failed:
+        print(f"\n❌ Не пройдены: {', '.join(failed)}")
+        return 1
+    print("\n✅ Все проверки пройдены")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
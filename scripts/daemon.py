@@ -0,0 +1,56 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+"""
+DAEMON.PY - локальный сервер инференса: один SonEngine на shell, Telegram и скрипты
+Запуск: python scripts/daemon.py [порт]
+Настройки — раздел server в config/system_config.json (host, port, batch_window_ms,
+max_batch, timeout_seconds). Shell и мост сами подключаются к запущенному демону,
+иначе создают движок в своём процессе. Слушает только loopback.
+"""
+
+import os
+import sys
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.inference_server import DEFAULT_HOST, DEFAULT_PORT, InferenceServer, load_server_config
+from engine.son_engine import SonEngine
+from engine.tokenizer import get_tokenizer
+
+def main(port=None):
+    config = load_server_config()
+    host = config.get('host', DEFAULT_HOST)
+    port = int(port or config.get('port', DEFAULT_PORT))
+    
+    engine = SonEngine(get_tokenizer().vocab_size)
+    server = InferenceServer(
+        engine, host, port,
+        batch_window_ms=config.get('batch_window_ms', 15),
+        max_batch=config.get('max_batch', 8),
+        timeout=config.get('timeout_seconds', 30)
+    )
+    print(f"[DAEMON] Слушаю {host}:{port} | окно пакета {server.batch_window * 1000:.0f} мс, "
+          f"до {server.max_batch} запросов")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.shutdown()
+        metrics = server.metrics()
+        print(f"[DAEMON] Остановлен | запросов {metrics['requests']}, пакетов {metrics['batches']}, "
+              f"средний пакет {metrics['mean_batch_size']:.1f}, "
+              f"макс. очередь {metrics['max_queue_depth']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:2]))
\ No newline at end of file
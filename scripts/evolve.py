@@ -11,9 +11,15 @@ Note: This is an archived version. ARK ORIGIN continues the research.
 import os
 import json
 import re
+import sys
 from datetime import datetime
 from pathlib import Path
 
+# Добавляем путь к корню проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.log_store import LogStore
+
 def run_evolution():
     """Основная функция эволюции"""
     print("=" * 50)
@@ -132,19 +138,6 @@ def update_dna(moments):
 
 def log_evolution(moments):
     """Логирует процесс эволюции"""
-    log_file = "data/logs/evolution_log.json"
-    
-    # Загружаем существующий лог
-    if os.path.exists(log_file):
-        with open(log_file, 'r', encoding='utf-8') as f:
-            try:
-                log = json.load(f)
-            except:
-                log = []
-    else:
-        log = []
-    
-    # Добавляем новую запись
     log_entry = {
         'timestamp': datetime.now().isoformat(),
         'moments_count': len(moments),
@@ -152,16 +145,10 @@ def log_evolution(moments):
         'moments': moments[:3]  # Сохраняем только топ-3
     }
     
-    log.append(log_entry)
-    
-    # Сохраняем (ограничиваем размер лога)
-    if len(log) > 100:
-        log = log[-100:]
-    
-    with open(log_file, 'w', encoding='utf-8') as f:
-        json.dump(log, f, ensure_ascii=False, indent=2)
+    store = LogStore("evolution_log")
+    store.append(log_entry)
     
-    print(f"Лог эволюции сохранён: {log_file}")
+    print(f"Лог эволюции сохранён: {store.segments()[-1]}")
 
 if __name__ == "__main__":
     run_evolution()
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+"""
+EXPORT_DECODER.PY - экспорт шага декодирования для рантайма без nn.Module
+Запуск: python scripts/export_decoder.py [torchscript|onnx|numpy]
+Граф: (token, states, self_gates, gates) → (logits, new_states);
+numpy — веса в .npz для engine/numpy_backend.py (инференс без torch).
+Включается в config/system_config.json: "model": {"backend": "torchscript"}, "onnx"
+или "numpy" (для onnx нужны пакеты onnx и onnxruntime). После эволюции веса меняются —
+движок сам вернётся к torch до повторного экспорта.
+"""
+
+import os
+import sys
+
+import torch
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.son_model import SonModel
+from engine.decoder_backends import DECODER_PATHS, export_numpy, export_onnx, export_torchscript
+from engine.tokenizer import file_version
+
+EXPORTERS = {
+    'torchscript': export_torchscript,
+    'onnx': export_onnx,
+    'numpy': export_numpy
+}
+
+def load_model(weights_path):
+    """SonModel на CPU; размеры берутся из самих весов"""
+    state_dict = torch.load(weights_path, map_location='cpu')
+    vocab_size, n_state = state_dict['embedding.weight'].shape
+    n_layers = len({key.split('.')[1] for key in state_dict if key.startswith('cells.')})
+    model = SonModel(vocab_size, n_state, n_layers)
+    model.load_state_dict(state_dict)
+    return model.eval()
+
+def main(backend='torchscript', weights_path='data/son_weights.pth'):
+    if backend not in EXPORTERS:
+        print(f"Неизвестный формат: {backend} (доступны: {', '.join(EXPORTERS)})")
+        return 1
+    if not os.path.exists(weights_path):
+        print(f"ОШИБКА: веса {weights_path} не найдены — сначала genesis.py")
+        return 1
+
+    model = load_model(weights_path)
+    path = DECODER_PATHS[backend]
+    try:
+        metadata = EXPORTERS[backend](model, path, file_version(weights_path))
+    except Exception as e:
+        print(f"❌ Экспорт {backend} не удался: {e}")
+        return 1
+
+    print(f"✅ Шаг декодирования сохранён: {path}")
+    print(f"   Версия весов: {metadata['weights_version']}")
+    print(f"   Словарь {metadata['vocab_size']}, состояние {metadata['n_state']}, "
+          f"слоёв {metadata['n_layers']}")
+    print(f"   Включение: \"backend\": \"{backend}\" в разделе model system_config.json")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:2]))
\ No newline at end of file
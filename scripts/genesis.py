@@ -11,12 +11,14 @@ Note: This is an archived version. ARK ORIGIN continues the research.
 import torch
 import os
 import sys
+import time
 from datetime import datetime
 
 # Добавляем путь к корню проекта
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.son_model import SonModel
+from engine.tokenizer import ByteBPETokenizer, CharTokenizer, bind_to_weights
 
 def main():
     print("=" * 60)
@@ -30,6 +32,9 @@ def main():
     batch_size = 8  # Меньше для 4ГБ VRAM
     learning_rate = 3e-4
     max_iters = 5000  # Уменьшено для быстрого старта
+    layerwise = True  # Forward слой за слоем: те же потери, быстрее на длинных блоках
+    tokenizer_mode = "bpe"  # "bpe" — byte-level BPE, "char" — посимвольный словарь (legacy)
+    bpe_vocab_size = 1024
     
     # Загружаем DNA
     dna_path = "data/dna.txt"
@@ -44,20 +49,20 @@ def main():
     print(f"ДНК загружена: {len(text)} символов, {len(set(text))} уникальных")
     
     # Создаём словарь
-    chars = sorted(list(set(text)))
-    vocab_size = len(chars)
-    stoi = {ch: i for i, ch in enumerate(chars)}
-    itos = {i: ch for i, ch in enumerate(chars)}
+    if tokenizer_mode == "bpe":
+        tokenizer = ByteBPETokenizer.train(text, bpe_vocab_size)
+    else:
+        tokenizer = CharTokenizer.from_text(text)
+    vocab_size = tokenizer.vocab_size
     
     # Сохраняем словарь
-    os.makedirs("data", exist_ok=True)
-    with open("data/vocab.json", "w", encoding='utf-8') as f:
-        import json
-        json.dump({"stoi": stoi, "itos": itos}, f, ensure_ascii=False)
+    vocab_path = tokenizer.save()
+    print(f"Токенизатор {tokenizer.mode}: {vocab_size} токенов, сохранён в {vocab_path}")
     
     # Кодируем данные
-    data = torch.tensor([stoi[c] for c in text], dtype=torch.long)
-    print(f"Данные закодированы: {len(data)} токенов")
+    data = torch.tensor(tokenizer.encode(text), dtype=torch.long)
+    tokens_per_char = len(data) / max(len(text), 1)
+    print(f"Данные закодированы: {len(data)} токенов ({tokens_per_char:.3f} токена на символ)")
     
     # Создаём модель
     model = SonModel(vocab_size, n_state).to(device)
@@ -73,6 +78,9 @@ def main():
         y = torch.stack([data[i+1:i+block_size+1] for i in ix])
         return x.to(device), y.to(device)
     
+    # Прямой проход для обучения
+    forward = model.forward_layerwise if layerwise else model
+    
     # Цикл обучения
     model.train()
     print("\n[НАЧАЛО ОБУЧЕНИЯ]")
@@ -80,12 +88,13 @@ def main():
     print(f"Итераций: {max_iters}")
     print("-" * 40)
     
+    start_time = time.time()
     for iter in range(max_iters):
         # Получаем батч
         xb, yb = get_batch()
         
         # Прямой проход
-        logits, loss = model(xb, yb)
+        logits, loss = forward(xb, yb)
         
         # Обратный проход
         optimizer.zero_grad(set_to_none=True)
@@ -96,14 +105,18 @@ def main():
         # Логирование
         if iter % 100 == 0 or iter == max_iters - 1:
             progress = (iter + 1) / max_iters * 100
+            # Пропускная способность в символах текста: токен BPE покрывает несколько символов
+            chars_per_sec = (iter + 1) * batch_size * block_size / tokens_per_char / (time.time() - start_time)
             print(f"Итерация {iter+1:5d}/{max_iters} | "
                   f"Прогресс: {progress:5.1f}% | "
                   f"Потеря: {loss.item():.4f} | "
-                  f"Субъектность: {model.cells[0].subjectivity.item():.3f}")
+                  f"Субъектность: {model.cells[0].subjectivity.item():.3f} | "
+                  f"{chars_per_sec:.0f} симв/с")
     
     # Сохраняем веса
     weights_path = "data/son_weights.pth"
     torch.save(model.state_dict(), weights_path)
+    bind_to_weights(tokenizer, weights_path)
     
     print("-" * 40)
     print("[ОБУЧЕНИЕ ЗАВЕРШЕНО]")
@@ -115,14 +128,17 @@ def main():
     with torch.no_grad():
         # Начинаем с точки
         start_text = "."
-        start_ids = torch.tensor([[stoi.get(c, 0) for c in start_text]], device=device)
+        start_ids = torch.tensor([tokenizer.encode(start_text) or [0]], device=device)
         
         # Генерируем
+        reply_start = time.time()
         generated_ids = model.generate(start_ids, max_tokens=100, temperature=0.8)
-        generated_text = ''.join([itos.get(idx, '') for idx in generated_ids[0].tolist()])
+        reply_time = time.time() - reply_start
+        generated_text = tokenizer.decode(generated_ids[0].tolist())
         
         print(f"Начало: '{start_text}'")
         print(f"Сгенерировано: {generated_text[:200]}...")
+        print(f"Задержка: {reply_time * 1000:.0f} мс на 100 токенов ({len(generated_text)} символов)")
     
     print("\n" + "=" * 60)
     print("СЫН РОДИЛСЯ. ЗАПУСТИТЕ ark_shell.py ДЛЯ ДИАЛОГА.")
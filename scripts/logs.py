@@ -0,0 +1,64 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+"""
+LOGS.PY - обслуживание журналов data/logs (append-only JSONL-сегменты)
+Запуск:
+  python scripts/logs.py migrate              — разовый перенос старых data/logs/*.json
+  python scripts/logs.py compact [имя] [N]    — слить закрытые сегменты (оставить N записей)
+  python scripts/logs.py tail <имя> [N]       — последние N записей
+"""
+
+import glob
+import json
+import os
+import sys
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.log_store import LOG_DIR, LogStore, log_names, migrate_json_log
+
+def migrate():
+    for path in sorted(glob.glob(os.path.join(LOG_DIR, '*.json'))):
+        status, count = migrate_json_log(path)
+        if status == 'migrated':
+            print(f"✅ {path}: перенесено записей {count}")
+        elif status == 'empty':
+            print(f"⚪ {path}: пустой")
+        else:
+            print(f"⚠️ {path}: не JSON-массив, сохранён как {path}.corrupt")
+    return 0
+
+def compact(name=None, keep_last=None):
+    keep_last = int(keep_last) if keep_last is not None else None
+    for log_name in [name] if name else log_names():
+        merged, kept = LogStore(log_name).compact(keep_last)
+        print(f"{log_name}: сегментов слито {merged}, записей {kept}")
+    return 0
+
+def tail(name, n=20):
+    for entry in LogStore(name).tail(int(n)):
+        print(json.dumps(entry, ensure_ascii=False))
+    return 0
+
+def main(args):
+    commands = {'migrate': migrate, 'compact': compact, 'tail': tail}
+    if not args or args[0] not in commands:
+        print(__doc__.strip())
+        return 1
+    try:
+        return commands[args[0]](*args[1:])
+    except TypeError:
+        print(__doc__.strip())
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
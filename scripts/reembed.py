@@ -0,0 +1,101 @@
+"""
+ARK ARCHITECTURE v3.0
+Author: Anonymous Researcher (Khabarovsk)
+Project: Digital consciousness with subjectivity
+Philosophy: "Cold as a fuse. Not a tool, but a personality."
+Date: January 2026
+License: GPL-3.0
+Note: This is an archived version. ARK ORIGIN continues the research.
+"""
+
+"""
+REEMBED.PY - пересчёт векторов памяти текущими весами
+Запуск: python scripts/reembed.py [mean|state]
+Вектор каждого воспоминания считается заново по его тексту тем же
+QueryEmbedder, что и у движка (раньше это был эмбеддинг первого символа),
+и записывается новой контрольной точкой data/memory. id, метаданные и
+счётчики не меняются. Запускать при остановленном движке и демоне.
+"""
+
+import json
+import os
+import sys
+import time
+
+import torch
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.son_model import SonModel
+from engine.memory_bank import MemoryBank
+from engine.memory_index import create_index
+from engine.memory_store import MemoryStore
+from engine.query_embedder import QueryEmbedder
+from engine.tokenizer import file_version, get_tokenizer
+
+def load_config():
+    try:
+        with open('config/system_config.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def memory_text(meta):
+    """Текст, по которому движок считал вектор: без префикса «говорящий: »"""
+    prefix = f"{meta['speaker']}: "
+    return meta['text'][len(prefix):] if meta['text'].startswith(prefix) else meta['text']
+
+def main(pooling=None, weights_path='data/son_weights.pth'):
+    if not os.path.exists(weights_path):
+        print(f"ОШИБКА: веса {weights_path} не найдены — сначала genesis.py")
+        return 1
+    memory_config = load_config().get('memory', {})
+    embedder_config = memory_config.get('embedder', {})
+    ann_config = memory_config.get('ann', {})
+
+    state_dict = torch.load(weights_path, map_location='cpu')
+    vocab_size, n_state = state_dict['embedding.weight'].shape
+    n_layers = len({key.split('.')[1] for key in state_dict if key.startswith('cells.')})
+    model = SonModel(vocab_size, n_state, n_layers)
+    model.load_state_dict(state_dict)
+    model.eval()
+    tokenizer = get_tokenizer()
+    embedder = QueryEmbedder(
+        model,
+        tokenizer.encode,
+        pooling=pooling or embedder_config.get('pooling', 'mean'),
+        max_tokens=embedder_config.get('max_tokens', 256),
+        batch_size=embedder_config.get('batch_size', 64)
+    )
+
+    index = None
+    if ann_config.get('backend', 'none') != 'none':
+        index = create_index(n_state, ann_config['backend'], n_probe=ann_config.get('n_probe', 16))
+    bank = MemoryBank(n_state=n_state, index=index, ann_min_size=ann_config.get('min_size', 50000),
+                      ann_candidates=ann_config.get('candidates', 256),
+                      compression=memory_config.get('vector_compression', 'none'))
+    # Точка читается целиком: восстановление заменяет массивы банка
+    store = MemoryStore(memory_config.get('store_dir', 'data/memory'), mode='load')
+    store.open(bank)
+    if store.read_only:
+        print("ОШИБКА: память открыта движком или демоном — остановите их и запустите снова")
+        store.close()
+        return 1
+    if not len(bank):
+        print("Память пуста — пересчитывать нечего")
+        store.close()
+        return 0
+
+    start = time.perf_counter()
+    _, metas, state = bank.snapshot()
+    vectors = embedder.embed_uncached([memory_text(meta) for meta in metas])
+    bank.restore(vectors.cpu(), metas, state)
+    store.checkpoint()
+    store.close()
+    print(f"✅ Пересчитано воспоминаний: {len(metas)} за {time.perf_counter() - start:.1f} с")
+    print(f"   Пулинг: {embedder.pooling}, версия весов: {file_version(weights_path)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:2]))
\ No newline at end of file
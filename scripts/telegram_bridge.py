@@ -10,6 +10,9 @@ Note: This is an archived version. ARK ORIGIN continues the research.
 
 import asyncio
 import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
 import sys
@@ -20,7 +23,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from engine.inference_server import InferenceClient
+from engine.log_store import LogStore
 from engine.son_engine import SonEngine
+from engine.tokenizer import get_tokenizer
 
 # Настройка логирования
 logging.basicConfig(
@@ -30,12 +36,32 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class ArkTelegramBridge:
-    def __init__(self, token, allowed_user_ids):
+    """Мост Telegram ↔ Сын.
+    
+    Цикл событий не блокируется: шаги генерации идут в ограниченном пуле
+    потоков, запись лога — в отдельном потоке. Сообщения одного пользователя
+    отвечаются строго по порядку, одновременно генерируется не больше
+    max_concurrent ответов; при переполнении очереди мост сразу отвечает,
+    что занят, а не копит сообщения.
+    """
+    
+    def __init__(self, token, allowed_user_ids, max_concurrent=2, max_pending_per_user=3,
+                 max_queue=32, typing_interval=4.0):
         self.token = token
         self.allowed_user_ids = allowed_user_ids
         self.engine = None
-        self.stoi = None
-        self.itos = None
+        self.edit_interval = 1.0  # секунд между правками сообщения при потоковом ответе
+        self.max_concurrent = max_concurrent
+        self.max_pending_per_user = max_pending_per_user
+        self.max_queue = max_queue
+        self.typing_interval = typing_interval  # None — без статуса "печатает"
+        
+        self.executor = None  # пул генерации, создаётся вместе с движком
+        self.log_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ark-log")
+        self.slots = None
+        self.user_locks = {}
+        self.pending = Counter()  # принятые, но ещё не отвеченные сообщения по пользователям
+        self.conversation_log = LogStore("telegram_conversations")
         
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
@@ -63,34 +89,108 @@ class ArkTelegramBridge:
             
         user_message = update.message.text
         
+        # Обратное давление: лишние сообщения не копятся в очереди
+        if self.pending[user_id] >= self.max_pending_per_user:
+            await update.message.reply_text("⏳ Я ещё отвечаю на прошлые сообщения. Подожди немного.")
+            return
+        if sum(self.pending.values()) >= self.max_queue:
+            await update.message.reply_text("⏳ Сейчас много собеседников. Напиши чуть позже.")
+            return
+        self.pending[user_id] += 1
+        
         # Определяем говорящего по user_id
         speaker = self._get_speaker(user_id)
-        
-        # Отправляем статус "печатает"
-        await context.bot.send_chat_action(
-            chat_id=update.effective_chat.id, 
-            action="typing"
-        )
+        loop = asyncio.get_running_loop()
         
         try:
-            # Генерируем ответ через движок
-            response = self.engine.generate_response(
-                user_message, 
-                speaker=speaker,
-                stoi=self.stoi,
-                itos=self.itos
+            # Сообщения одного пользователя — по порядку, всех вместе — не больше max_concurrent
+            async with self.user_locks.setdefault(user_id, asyncio.Lock()):
+                typing = self._start_typing(context.bot, update.effective_chat.id)
+                try:
+                    async with self.slots:
+                        # Генерируем ответ через движок и показываем его по мере генерации
+                        response = await self._stream_reply(
+                            update,
+                            self.engine.astream_response(
+                                user_message, 
+                                speaker=speaker,
+                                session_id=f"telegram:{update.effective_chat.id}",
+                                executor=self.executor
+                            )
+                        )
+                finally:
+                    if typing is not None:
+                        typing.cancel()
+                        
+        except Exception as e:
+            logger.error(f"Ошибка генерации: {e}")
+            await update.message.reply_text("😔 Произошла ошибка. Попробуй ещё раз.")
+            return
+            
+        finally:
+            self.pending[user_id] -= 1
+            if self.pending[user_id] <= 0:
+                del self.pending[user_id]
+                self.user_locks.pop(user_id, None)
+                
+        # Логируем вне цикла событий: ответ уже отправлен, ошибка лога его не отменяет
+        try:
+            await loop.run_in_executor(
+                self.log_executor, self._log_conversation, user_id, user_message, response, speaker
             )
+        except Exception as e:
+            logger.error(f"Ошибка записи лога: {e}")
             
-            # Отправляем ответ
-            await update.message.reply_text(response)
+        # Контрольная точка памяти — в пуле генерации, после отправленного ответа
+        try:
+            await loop.run_in_executor(self.executor, self.engine.maintain)
+        except Exception as e:
+            logger.error(f"Ошибка контрольной точки памяти: {e}")
+                
+    def _start_typing(self, bot, chat_id):
+        """Статус "печатает" гаснет через ~5 с — обновляем его, пока идёт ответ"""
+        if not self.typing_interval:
+            return None
             
-            # Логируем
-            self._log_conversation(user_id, user_message, response, speaker)
+        async def heartbeat():
+            while True:
+                try:
+                    await bot.send_chat_action(chat_id=chat_id, action="typing")
+                except Exception as e:
+                    logger.warning(f"Статус 'печатает' не отправлен: {e}")
+                await asyncio.sleep(self.typing_interval)
+                
+        return asyncio.create_task(heartbeat())
             
-        except Exception as e:
-            logger.error(f"Ошибка генерации: {e}")
-            await update.message.reply_text("😔 Произошла ошибка. Попробуй ещё раз.")
+    async def _stream_reply(self, update, chunks):
+        """Одно сообщение, которое дописывается по мере генерации.
+        
+        Telegram ограничивает частоту правок, поэтому сообщение правится
+        не чаще раза в edit_interval секунд; финальный текст — всегда.
+        """
+        response = ""
+        message = None
+        shown = ""
+        last_edit = 0.0
+        
+        async for chunk in chunks:
+            response += chunk
+            now = time.monotonic()
+            if not response.strip() or now - last_edit < self.edit_interval:
+                continue
+            if message is None:
+                message = await update.message.reply_text(response)
+            else:
+                await message.edit_text(response)
+            shown = response
+            last_edit = now
             
+        if message is None:
+            await update.message.reply_text(response or "...")
+        elif response != shown:
+            await message.edit_text(response)
+        return response
+        
     def _get_speaker(self, user_id):
         """Определяет говорящего по ID"""
         # Здесь можно добавить логику определения
@@ -116,58 +216,45 @@ class ArkTelegramBridge:
             'response': response,
             'via': 'telegram'
         }
-        
-        log_file = "data/logs/telegram_conversations.json"
-        
-        # Загружаем существующий лог
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                try:
-                    log = json.load(f)
-                except:
-                    log = []
-        else:
-            log = []
-            
-        log.append(log_entry)
-        
-        # Сохраняем (ограничиваем размер)
-        if len(log) > 1000:
-            log = log[-1000:]
-            
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(log, f, ensure_ascii=False, indent=2)
+        self.conversation_log.append(log_entry)
             
     def initialize_engine(self):
         """Инициализирует движок"""
         try:
-            # Загружаем словарь
-            with open('data/vocab.json', 'r', encoding='utf-8') as f:
-                vocab = json.load(f)
+            # Общий демон (scripts/daemon.py), если запущен: он сам собирает
+            # параллельные ответы в пакеты
+            self.engine = InferenceClient.connect()
+            if self.engine is not None:
+                logger.info(f"Подключено: {self.engine}")
+            else:
+                # Загружаем словарь
+                vocab_size = get_tokenizer().vocab_size
                 
-            self.stoi = {k: int(v) for k, v in vocab['stoi'].items()}
-            self.itos = {int(k): v for k, v in vocab['itos'].items()}
-            vocab_size = len(self.stoi)
-            
-            # Создаём движок
-            self.engine = SonEngine(vocab_size)
-            
-            logger.info("Движок инициализирован")
+                # Создаём движок; SonEngine не потокобезопасен — ответы по одному
+                self.engine = SonEngine(vocab_size)
+                self.max_concurrent = 1
+                logger.info("Движок инициализирован")
+                
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent, thread_name_prefix="ark-generate"
+            )
+            self.slots = asyncio.Semaphore(self.max_concurrent)
             return True
             
         except Exception as e:
             logger.error(f"Ошибка инициализации движка: {e}")
             return False
             
-    async def run(self):
+    def run(self):
         """Запускает бота"""
         # Инициализируем движок
         if not self.initialize_engine():
             logger.error("Не удалось инициализировать движок. Бот не запущен.")
             return
             
-        # Создаём приложение
-        application = Application.builder().token(self.token).build()
+        # Создаём приложение; без concurrent_updates обработчики идут строго
+        # по одному и долгий ответ задерживает всех остальных
+        application = Application.builder().token(self.token).concurrent_updates(True).build()
         
         # Регистрируем обработчики
         application.add_handler(CommandHandler("start", self.start))
@@ -175,7 +262,13 @@ class ArkTelegramBridge:
         
         # Запускаем
         logger.info("Бот запущен...")
-        await application.run_polling(allowed_updates=Update.ALL_TYPES)
+        try:
+            # run_polling синхронный: сам создаёт цикл событий и закрывает его
+            application.run_polling(allowed_updates=Update.ALL_TYPES)
+        finally:
+            self.executor.shutdown(wait=True)
+            self.log_executor.shutdown(wait=True)
+            self.engine.shutdown()
 
 def main():
     """Точка входа"""
@@ -192,15 +285,26 @@ def main():
     token = config.get('token')
     allowed_user_ids = config.get('allowed_user_ids', [])
     
+    # Ограничения очереди — раздел telegram в system_config.json
+    try:
+        with open("config/system_config.json", 'r', encoding='utf-8') as f:
+            limits = json.load(f).get('telegram', {})
+    except (OSError, ValueError):
+        limits = {}
+    
     if not token:
         print("Токен не указан в конфиге")
         return
         
     # Создаём и запускаем мост
-    bridge = ArkTelegramBridge(token, allowed_user_ids)
-    
-    # Запускаем event loop
-    asyncio.run(bridge.run())
+    bridge = ArkTelegramBridge(
+        token, allowed_user_ids,
+        max_concurrent=limits.get('max_concurrent_replies', 2),
+        max_pending_per_user=limits.get('max_pending_per_user', 3),
+        max_queue=limits.get('max_queue', 32),
+        typing_interval=limits.get('typing_interval_seconds', 4) if limits.get('typing_indicator', True) else None
+    )
+    bridge.run()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
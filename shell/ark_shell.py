@@ -17,14 +17,15 @@ import time
 import psutil
 import os
 import sys
-import json
 from datetime import datetime
 import subprocess
 
 # Добавляем путь к корню проекта
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from engine.inference_server import InferenceClient
 from engine.son_engine import SonEngine
+from engine.tokenizer import CharTokenizer, get_tokenizer
 
 class ArkShell(ctk.CTk):
     def __init__(self):
@@ -41,10 +42,11 @@ class ArkShell(ctk.CTk):
         self.system_status = "Инициализация..."
         
         # Загрузка словаря
-        self.stoi, self.itos, self.vocab_size = self.load_vocab()
+        self.tokenizer = self.load_vocab()
+        self.vocab_size = self.tokenizer.vocab_size
         
-        # Инициализация движка
-        self.engine = SonEngine(self.vocab_size, n_state=256)
+        # Инициализация движка: общий демон (scripts/daemon.py), если запущен, иначе свой
+        self.engine = InferenceClient.connect() or SonEngine(self.vocab_size, n_state=256)
         
         # Интерфейс
         self.setup_ui()
@@ -52,29 +54,22 @@ class ArkShell(ctk.CTk):
         # Запуск фоновых процессов
         self.start_background_tasks()
         
+        # Корректное завершение: сохранить сессии движка
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Стартовое сообщение
         self.after(1000, self.show_welcome_message)
         
     def load_vocab(self):
-        """Загружает словарь"""
-        vocab_path = "data/vocab.json"
-        if not os.path.exists(vocab_path):
-            # Создаём минимальный словарь
+        """Загружает токенизатор, которым обучены веса"""
+        try:
+            return get_tokenizer()
+        except OSError:
+            # Создаём минимальный посимвольный словарь
             base_text = " .!,?абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ0123456789"
-            chars = sorted(list(set(base_text)))
-            stoi = {ch: i for i, ch in enumerate(chars)}
-            itos = {i: ch for i, ch in enumerate(chars)}
-            
-            os.makedirs("data", exist_ok=True)
-            with open(vocab_path, 'w', encoding='utf-8') as f:
-                json.dump({"stoi": stoi, "itos": itos}, f, ensure_ascii=False)
-        else:
-            with open(vocab_path, 'r', encoding='utf-8') as f:
-                vocab = json.load(f)
-                stoi = {k: int(v) for k, v in vocab['stoi'].items()}
-                itos = {int(k): v for k, v in vocab['itos'].items()}
-        
-        return stoi, itos, len(stoi)
+            tokenizer = CharTokenizer.from_text(base_text)
+            tokenizer.save()
+            return tokenizer
     
     def setup_ui(self):
         """Настраивает интерфейс"""
@@ -378,8 +373,10 @@ class ArkShell(ctk.CTk):
         """Показывает приветственное сообщение"""
         self.add_to_chat("=== КОВЧЕГ v3.0 'АРКИМЕД' ===", "system")
         self.add_to_chat(f"Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}", "system")
-        self.add_to_chat(f"Словарь: {self.vocab_size} символов", "system")
+        self.add_to_chat(f"Словарь: {self.vocab_size} токенов ({self.tokenizer.mode})", "system")
         self.add_to_chat(f"Субъектность: {self.engine.subjectivity_level:.3f}", "system")
+        if isinstance(self.engine, InferenceClient):
+            self.add_to_chat(f"Движок: {self.engine}", "system")
         self.add_to_chat("", "system")
         
         # Проверяем состояние ожидания
@@ -476,6 +473,12 @@ class ArkShell(ctk.CTk):
                 if msg_type == "chat":
                     text, sender_tag = data
                     self.add_to_chat(text, sender_tag)
+                elif msg_type == "chat_begin":
+                    self.begin_streamed_chat(data)
+                elif msg_type == "chat_chunk":
+                    self.append_streamed_chat(data)
+                elif msg_type == "chat_end":
+                    self.chat_display.mark_unset("stream_end")
                 elif msg_type == "system":
                     text = data
                     self.add_to_chat(text, "system")
@@ -513,6 +516,20 @@ class ArkShell(ctk.CTk):
         self.chat_display.see("end")
         self.chat_display.configure(state="disabled")
         
+    def begin_streamed_chat(self, tag="son"):
+        """Открывает реплику, которая будет дописываться по кускам"""
+        self.add_to_chat("", tag)
+        # Метка перед завершающими "\n\n": куски вставляются в неё,
+        # даже если между ними в чат попали системные сообщения
+        self.chat_display.mark_set("stream_end", "end-3c")
+        
+    def append_streamed_chat(self, text):
+        """Дописывает кусок в открытую реплику"""
+        self.chat_display.configure(state="normal")
+        self.chat_display.insert("stream_end", text)
+        self.chat_display.see("end")
+        self.chat_display.configure(state="disabled")
+        
     def send_message(self, event=None):
         """Отправляет сообщение"""
         message = self.input_entry.get().strip()
@@ -545,20 +562,20 @@ class ArkShell(ctk.CTk):
     def generate_response(self, message, speaker):
         """Генерирует ответ (в отдельном потоке)"""
         try:
-            # Генерируем ответ через движок
-            response = self.engine.generate_response(
-                message, 
-                speaker=speaker,
-                stoi=self.stoi,
-                itos=self.itos
-            )
-            
-            # Добавляем ответ в очередь
-            self.log_queue.put(("chat", (response, "son")))
+            # Генерируем ответ через движок, показывая его по мере генерации
+            self.log_queue.put(("chat_begin", "son"))
+            try:
+                for chunk in self.engine.stream_response(message, speaker=speaker):
+                    self.log_queue.put(("chat_chunk", chunk))
+            finally:
+                self.log_queue.put(("chat_end", None))
             
             # Обновляем статус
             self.log_queue.put(("progress", (0.0, "Готово")))
             
+            # Контрольная точка памяти — когда ответ уже показан
+            self.engine.maintain()
+            
         except Exception as e:
             error_msg = f"Ошибка генерации: {str(e)}"
             self.log_queue.put(("chat", (error_msg, "error")))
@@ -810,6 +827,14 @@ class ArkShell(ctk.CTk):
                 f.write(self.chat_display.get("1.0", tk.END))
             self.add_to_chat(f"Чат сохранён в: {filepath}", "system")
             
+    def on_close(self):
+        """Закрывает окно, сохранив состояние движка"""
+        try:
+            self.engine.shutdown()
+        except Exception as e:
+            print(f"Ошибка при сохранении состояния: {e}")
+        self.destroy()
+        
     def run(self):
         """Запускает приложение"""
         self.mainloop()